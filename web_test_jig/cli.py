@@ -1,5 +1,5 @@
 from lib.I2C.I2C import *
-import board
+from lib.hal import board
 from lib.I2C.i2c_oled import I2C_OLED
 from lib.I2C.BH1750 import BH1750
 from lib.I2C.mlx90614 import MLX90614
@@ -13,6 +13,7 @@ from lib.PWM.rgb import RGBLED
 from lib.PWM.servo import ServoMotor
 from lib.SPI.spi_oled import SPI_OLED
 from lib.pin_details import PIN_CONNECTION
+from lib.selftest import cached, format_report, run_selftest
 from lib.ADC.pot import Pot
 from lib.ADC.ldr import LDRSensor
 from lib.ADC.tds import TDS_Sensor
@@ -402,6 +403,7 @@ def main():
     print("\n...........................")
     print("    **** TEST-JIG ****")
     print("""''''''''''''''''''''''''''""")
+    print(format_report(cached() or run_selftest()))  # instant when the boot self-test already ran
     
     while True:
         try:
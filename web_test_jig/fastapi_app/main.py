@@ -6,6 +6,12 @@ from .routes import router
 app = FastAPI()
 app.include_router(router)
 
+# Probe the jig's buses in the background; GET /readiness serves the result
+@app.on_event("startup")
+async def power_on_selftest():
+    from lib.selftest import start_background
+    start_background()
+
 # Mount static files if not already mounted
 app.mount("/static", StaticFiles(directory="fastapi_app/static"), name="static")
 
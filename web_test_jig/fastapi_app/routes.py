@@ -1,8 +1,13 @@
-import io, sys
+import io, os, sys
 import asyncio
+import base64
+import re
+import resource
+import threading
 import time
+import anyio
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse
+from fastapi.responses import HTMLResponse, StreamingResponse, FileResponse, Response
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from lib.pin_details import PIN_CONNECTION
@@ -45,6 +50,105 @@ PIN_MAPPING = {
 }
 
 TEST_STOP_FLAG = False
+ACTIVE_STREAMS = 0  # long-lived SSE streams currently open
+
+async def track_stream(generator):
+    """Count an SSE generator in ACTIVE_STREAMS for as long as it is open"""
+    global ACTIVE_STREAMS
+    ACTIVE_STREAMS += 1
+    try:
+        async for event in generator:
+            yield event
+    finally:
+        ACTIVE_STREAMS -= 1
+
+async def record_stream(generator, record, stream):
+    """Pass events through, saving them and the bus traffic behind them to a capture"""
+    if not record:
+        async for event in generator:
+            yield event
+        return
+    from lib.capture import CaptureSession, CaptureWriter, capture_path
+    writer = CaptureWriter(capture_path(record))
+    session = CaptureSession(writer, stream)
+    token = session.activate()
+    try:
+        async for event in generator:
+            if event.startswith("data: "):
+                session.event(event[6:].rstrip("\n"))
+            yield event
+    finally:
+        try:
+            session.deactivate(token)
+        except ValueError:
+            pass  # generator finalized outside the request context
+        writer.close()
+
+def macro_params(values, *controls):
+    """Route arguments to record in a macro: everything but the request and
+    the capture/replay controls"""
+    return {k: v for k, v in values.items() if k not in ("request", "record", "replay") + controls}
+
+async def macro_stream(generator, protocol, params):
+    """Pass events through, adding the operation and its response lines to the
+    macro being recorded (if any)"""
+    from lib.CUSTOM.macro import RECORDER
+    if not RECORDER.recording:
+        async for event in generator:
+            yield event
+        return
+    response = []
+    start = time.perf_counter()
+    async for event in generator:
+        if event.startswith("data: "):
+            response.append(event[6:].rstrip("\n"))
+        yield event
+    RECORDER.add(protocol, params, response, (time.perf_counter() - start) * 1000)
+
+async def history_stream(generator, prefix, log=False):
+    """Pass events through, keeping their numeric readings in the time-series store
+    and streaming statistics (and in the binary log store when log is set)"""
+    from lib.timeseries import STORE
+    from lib.stats import STATS
+    from lib import logstore
+    logging = log
+    try:
+        async for event in generator:
+            if event.startswith("data: "):
+                readings = STORE.record_text(prefix, event[6:])
+                STATS.add_readings(prefix, readings)
+                if logging and readings:
+                    try:
+                        logstore.STORE.append(prefix, readings)
+                    except Exception as e:
+                        logging = False  # keep streaming; only the log stops
+                        yield f"data: ⚠️ Logging stopped: {e}\n\n"
+            yield event
+    finally:
+        if log:
+            try:
+                logstore.STORE.flush(prefix)
+            except OSError:
+                pass
+
+async def replay_stream(replay, speed):
+    """Stream the events of a capture, paced by their recorded timestamps"""
+    from lib.capture import capture_path, read_events, replay_delays
+    global TEST_STOP_FLAG
+    try:
+        path = capture_path(replay)
+    except ValueError as e:
+        yield f"data: Error: {e}\n\n"
+        return
+    if not os.path.exists(path):
+        yield f"data: Error: capture '{replay}' not found\n\n"
+        return
+    for delay, stream, text in replay_delays(read_events(path), speed):
+        if TEST_STOP_FLAG:
+            break
+        if delay:
+            await asyncio.sleep(delay)
+        yield f"data: {text}\n\n"
 
 # Replace the existing root endpoint with homepage view
 @router.get("/", response_class=HTMLResponse)
@@ -81,9 +185,12 @@ async def get_pin_connection(protocol: str, device: str):
 SPIOLED_INSTANCE = None
 
 @router.get("/run-test/{protocol}/{device}")
-async def run_test(protocol: str, device: str):
+async def run_test(protocol: str, device: str, record: str = "", replay: str = "", speed: float = 1.0,
+                   log: bool = False):
     global TEST_STOP_FLAG, SPIOLED_INSTANCE
     TEST_STOP_FLAG = False
+    if replay:
+        return StreamingResponse(track_stream(replay_stream(replay, speed)), media_type="text/event-stream")
 
     async def event_generator():
         global SPIOLED_INSTANCE   # added global declaration
@@ -111,16 +218,10 @@ async def run_test(protocol: str, device: str):
         while not TEST_STOP_FLAG:
             if protocol_lower == "i2c":
                 if not scan_done:
+                    # only the device's own addresses, usually answered from the scan cache
                     try:
-                        from smbus2 import SMBus
-                        with SMBus(1) as bus:
-                            addresses = []
-                            for addr in range(0x03, 0x78):
-                                try:
-                                    bus.write_quick(addr)
-                                    addresses.append(hex(addr))
-                                except OSError:
-                                    pass
+                        from lib.I2C.scan import SCANNER
+                        addresses = [hex(addr) for addr in await run_in_threadpool(SCANNER.expected, device_lower)]
                         yield f"data: I2C devices found: {addresses}\n\n"
                     except Exception as e:
                         yield f"data: Error scanning I2C bus: {e}\n\n"
@@ -149,7 +250,7 @@ async def run_test(protocol: str, device: str):
             elif protocol_lower == "uart":
                 if device_lower == "pm sensor":
                     from lib.UART.PM_Sensor import SDS011
-                    result = await run_in_threadpool(SDS011().activate_cli)
+                    result = await run_in_threadpool(SDS011().activate_gui)
                     yield f"data: {result if result is not None else 'No connections present'}\n\n"
                 else:
                     yield "data: Unknown UART device\n\n"
@@ -204,28 +305,30 @@ async def run_test(protocol: str, device: str):
                     yield f"data: {result}\n\n"
                 elif device_lower == "button":
                     from lib.GPIO.button import ButtonController
-                    result = await run_in_threadpool(lambda: ButtonController(6).activate_cli())
+                    result = await run_in_threadpool(lambda: ButtonController(6).activate_gui())
                     yield f"data: {result}\n\n"
                 elif device_lower == "dht11":
-                    import board
+                    from lib.hal import board
                     from lib.GPIO.dht import DHTSensor
                     # Use activate_gui() to obtain a return value for streaming
                     result = await run_in_threadpool(lambda: DHTSensor(pin=board.D13).activate_gui())
                     yield f"data: {result if result is not None else 'No connections present'}\n\n"
                 elif device_lower == "ultrasonic sensor":
                     from lib.GPIO.ultrasonic import UltrasonicSensor
-                    result = await run_in_threadpool(lambda: UltrasonicSensor(trigger_pin=26, echo_pin=19).activate_cli())
+                    result = await run_in_threadpool(lambda: UltrasonicSensor(trigger_pin=26, echo_pin=19).activate_gui())
                     yield f"data: {result}\n\n"
                 elif device_lower == "ds18b20":
                     from lib.GPIO.DS18B20 import DS18B20
-                    result = await run_in_threadpool(DS18B20().activate_cli)
+                    result = await run_in_threadpool(DS18B20().activate_gui)
                     yield f"data: {result}\n\n"
                 else:
                     yield "data: Unknown GPIO device\n\n"
             else:
                 yield f"data: Error: Pin mapping not defined for protocol '{protocol}' and device '{device}'.\n\n"
             await asyncio.sleep(1)
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    name = f"{protocol.lower()}/{device.lower()}"
+    stream = record_stream(history_stream(event_generator(), name, log), record, name)
+    return StreamingResponse(track_stream(stream), media_type="text/event-stream")
 
 @router.post("/stop-test")
 async def stop_test():
@@ -294,7 +397,7 @@ async def run_rs485(request: Request, mode: str, baudRate: int, parity: str, sla
         # Close process if stop flag is set
         if RS485_PROCESS and RS485_PROCESS.poll() is None:
             RS485_PROCESS.terminate()
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(track_stream(event_generator()), media_type="text/event-stream")
 
 @router.post("/stop-rs485")
 async def stop_rs485():
@@ -305,6 +408,262 @@ async def stop_rs485():
         RS485_PROCESS = None
     return {"result": "RS485 test stopped"}
 
+# ==================== SERVER METRICS ====================
+
+@router.get("/metrics")
+async def metrics():
+    """Process, threadpool and stream counters for load testing"""
+    from lib.CUSTOM import pool
+    from lib.I2C.recovery import MONITOR
+    limiter = anyio.to_thread.current_default_thread_limiter()
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    try:
+        with open("/proc/self/statm") as f:
+            rss_bytes = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        rss_bytes = usage.ru_maxrss * 1024
+    return {
+        "timestamp": time.time(),
+        "process": {
+            "pid": os.getpid(),
+            "cpu_user_s": usage.ru_utime,
+            "cpu_system_s": usage.ru_stime,
+            "rss_bytes": rss_bytes,
+            "threads": threading.active_count()
+        },
+        "threadpool": {
+            "total": limiter.total_tokens,
+            "busy": limiter.borrowed_tokens,
+            "waiting": limiter.statistics().tasks_waiting
+        },
+        "streams": {"active": ACTIVE_STREAMS},
+        "i2c_recovery": MONITOR.stats(),
+        "sessions": pool.stats()
+    }
+
+# ==================== HISTORY ====================
+
+@router.get("/history")
+async def history(channel: str = "", start: float = 0, end: float = 0, seconds: float = 3600, points: int = 500):
+    """Decimated readings of one channel, or the list of channels when none is given"""
+    from lib.timeseries import STORE
+    if not channel:
+        return {"channels": STORE.summary()}
+    end = end or time.time()
+    start = start or end - seconds
+    try:
+        return STORE.history(channel, start, end, points)
+    except KeyError:
+        return {"error": f"No history for channel '{channel}'", "channels": STORE.names()}
+
+# ==================== I2C SCAN ====================
+
+@router.get("/i2c/scan")
+async def i2c_scan(bus: int = 1, device: str = "", refresh: bool = False):
+    """Present I2C addresses: a device's expected addresses, or the whole bus
+    (full scans are served from the cache unless refresh=true)"""
+    from lib.I2C.scan import DEVICE_ADDRESSES, SCANNER
+    try:
+        if device:
+            addresses = DEVICE_ADDRESSES.get(device.lower(), ())
+            found = await run_in_threadpool(lambda: SCANNER.scan(bus, addresses, refresh=refresh))
+        else:
+            found = await run_in_threadpool(lambda: SCANNER.scan(bus, refresh=refresh))
+        return {"bus": bus, "devices": [f"0x{addr:02X}" for addr in found], "probes": SCANNER.probes}
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.post("/i2c/recover")
+async def i2c_recover(bus: int = 1):
+    """Clock a stuck bus free from GPIO, send a STOP and rebind the controller"""
+    from lib.I2C.recovery import MONITOR, format_recovery
+    try:
+        result = await run_in_threadpool(MONITOR.recover, bus)
+        return dict(result, message=format_recovery(result))
+    except Exception as e:
+        return {"error": str(e)}
+
+# ==================== I2C MUX ====================
+
+def parse_channels(channels: str) -> list:
+    return [int(channel) for channel in re.split(r"[,\s]+", channels.strip()) if channel]
+
+
+@router.get("/i2c/mux/scan")
+async def i2c_mux_scan(bus: int = 1, address: str = "0x70", channels: str = "0,1,2,3,4,5,6,7"):
+    """Addresses found behind each channel of a TCA9548A"""
+    from lib.I2C.mux import get_mux
+    try:
+        mux = get_mux(bus, int(address, 0))
+        found = await run_in_threadpool(mux.scan_channels, parse_channels(channels))
+        return {"bus": bus, "mux": mux.stats(),
+                "channels": {"upstream" if channel is None else channel: [f"0x{addr:02X}" for addr in addresses]
+                             for channel, addresses in found.items()}}
+    except Exception as e:
+        return {"error": str(e)}
+
+
+@router.get("/i2c/mux/run")
+async def i2c_mux_run(request: Request, bus: int = 1, address: str = "0x70", channels: str = "0,1,2,3",
+                      devices: str = "bh1750,mlx90614", rounds: int = 1, interval: float = 0):
+    """Read the same devices on one DUT per mux channel, streaming per-DUT results each round"""
+    global TEST_STOP_FLAG
+    TEST_STOP_FLAG = False
+
+    async def event_generator():
+        from lib.I2C.mux import MuxScheduler, format_conflict, format_round, get_mux
+        try:
+            mux = get_mux(bus, int(address, 0))
+            duts = {f"DUT{channel}": channel for channel in parse_channels(channels)}
+            names = [name.strip().lower() for name in devices.split(",") if name.strip()]
+            scheduler = await run_in_threadpool(MuxScheduler, mux, duts, names)
+        except Exception as e:
+            yield f"data: Error: {e}\n\n"
+            return
+        if scheduler.conflicts:
+            yield f"data: ⚠️ Not scheduled: {format_conflict(scheduler.conflicts)}\n\n"
+        yield f"data: {len(duts)} DUT(s) behind mux 0x{mux.address:02X} on bus {bus}: {', '.join(scheduler.devices)}\n\n"
+        for number in range(1, rounds + 1):
+            if TEST_STOP_FLAG or await request.is_disconnected():
+                break
+            result = await run_in_threadpool(scheduler.run_round)
+            for line in format_round(number, result):
+                yield f"data: {line}\n\n"
+            if interval and number < rounds:
+                await asyncio.sleep(interval)
+    return StreamingResponse(track_stream(event_generator()), media_type="text/event-stream")
+
+# ==================== READINESS ====================
+
+@router.get("/readiness")
+async def readiness(refresh: bool = False):
+    """Cached power-on self-test report; refresh=true probes the buses again"""
+    from lib import selftest
+    if refresh:
+        return await run_in_threadpool(selftest.run_selftest)
+    report = selftest.cached()
+    return report if report is not None else {"ready": None, "probes": [], "detail": "Self-test running"}
+
+# ==================== STATISTICS ====================
+
+@router.get("/stats")
+async def channel_stats(channel: str = "", low: float = None, high: float = None):
+    """Cumulative and rolling-window statistics; with low/high, also check the window against them"""
+    from lib.stats import STATS
+    try:
+        stats = STATS.snapshot(channel or None)
+    except KeyError:
+        return {"error": f"No statistics for channel '{channel}'", "channels": STATS.names()}
+    if low is not None or high is not None:
+        for entry in stats.values():
+            window = entry["window"]
+            entry["within_limits"] = window["count"] > 0 and \
+                (low is None or window["min"] >= low) and (high is None or window["max"] <= high)
+    return {"channels": stats}
+
+@router.post("/stats/reset")
+async def reset_stats(channel: str = ""):
+    from lib.stats import STATS
+    STATS.reset(channel or None)
+    return {"result": f"Statistics reset for {channel or 'all channels'}"}
+
+# ==================== BINARY LOGS ====================
+
+@router.get("/logs")
+async def list_logs():
+    from lib import logstore
+    logstore.STORE.flush()
+    return {"logs": logstore.STORE.channels()}
+
+@router.get("/logs/{name}/export")
+async def export_log(name: str, format: str = "csv", start: float = None, end: float = None):
+    """Stream a channel log as CSV or JSON without loading it into memory"""
+    from lib import logstore
+    if format not in logstore.EXPORTERS:
+        return {"error": f"Unknown format '{format}'. Use one of {list(logstore.EXPORTERS)}"}
+    path = os.path.join(logstore.LOG_DIR, os.path.basename(name) + logstore.EXTENSION)
+    if not os.path.exists(path):
+        return {"error": f"No log named '{name}'"}
+    logstore.STORE.flush()
+
+    def chunks():
+        with logstore.LogReader(path) as reader:
+            yield from logstore.EXPORTERS[format](reader, start, end)
+
+    media_type = "text/csv" if format == "csv" else "application/json"
+    headers = {"Content-Disposition": f'attachment; filename="{os.path.basename(name)}.{format}"'}
+    return StreamingResponse(chunks(), media_type=media_type, headers=headers)
+
+# ==================== TEST RESULTS ====================
+
+@router.post("/results")
+async def add_results(request: Request):
+    """Store one run or a list of runs: {device, serial, fixture, protocol, verdict,
+    measurements: {name: {value, low, high, unit}}, duration_ms, message}"""
+    from lib.results_db import get_db
+    try:
+        body = await request.json()
+        runs = body if isinstance(body, list) else [body]
+        db = get_db()
+        verdicts = [await run_in_threadpool(lambda run=run: db.record(**run)) for run in runs]
+        return {"result": f"{len(verdicts)} run(s) stored", "verdicts": verdicts}
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.get("/results")
+async def results_history(serial: str = "", fixture: str = "", protocol: str = "", device: str = "",
+                          verdict: str = "", since: float = None, until: float = None,
+                          limit: int = 50, cursor: str = ""):
+    """Paginated run history, newest first"""
+    from lib.results_db import get_db
+    try:
+        return await run_in_threadpool(lambda: get_db().history(
+            limit=limit, cursor=cursor, serial=serial, fixture=fixture, protocol=protocol,
+            device=device, verdict=verdict, since=since, until=until))
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.get("/results/yield")
+async def results_yield(group_by: str = "device", serial: str = "", fixture: str = "", protocol: str = "",
+                        device: str = "", since: float = None, until: float = None):
+    """Pass/fail counts, yield and first-pass yield per device, fixture, protocol, day or hour"""
+    from lib.results_db import get_db
+    try:
+        return await run_in_threadpool(lambda: get_db().yield_stats(
+            group_by=group_by, serial=serial, fixture=fixture, protocol=protocol,
+            device=device, since=since, until=until))
+    except Exception as e:
+        return {"error": str(e)}
+
+# ==================== TEST PLANS ====================
+
+@router.get("/plans")
+async def list_plans():
+    from lib.testplan import PLAN_DIR
+    names = sorted(os.listdir(PLAN_DIR)) if os.path.isdir(PLAN_DIR) else []
+    return {"plans": [name for name in names if name.endswith((".json", ".yaml", ".yml"))]}
+
+@router.post("/run-plan")
+async def run_plan(request: Request):
+    """Run a test plan and return its report
+    Body: { "plan": "sensor_board.yaml" or {steps...}, "serial": "...", "fixture": "...", "store": true }"""
+    from lib.testplan import load_plan, run_plan
+    try:
+        body = await request.json()
+        plan = load_plan(body.get("plan", body))
+        return await run_in_threadpool(lambda: run_plan(plan, serial=body.get("serial"),
+                                                        fixture=body.get("fixture"),
+                                                        store=body.get("store", True)))
+    except Exception as e:
+        return {"error": str(e)}
+
+# ==================== CAPTURES ====================
+
+@router.get("/captures")
+async def list_captures():
+    from lib.capture import list_captures
+    return {"captures": list_captures()}
+
 # ==================== CUSTOM COMMUNICATION PAGES ====================
 
 # Custom I2C page
@@ -354,144 +713,238 @@ async def devices_adc_page(request: Request):
 
 # ==================== CUSTOM COMMUNICATION API ENDPOINTS ====================
 
-# Global variables for custom protocol instances
-CUSTOM_I2C_INSTANCE = None
-CUSTOM_SPI_INSTANCE = None
-CUSTOM_UART_INSTANCE = None
+# Global variables for custom protocol instances (I2C, SPI and UART: lib.CUSTOM.pool)
 CUSTOM_PWM_INSTANCES = {}  # Dictionary to hold instances for each pin
 
 # Custom I2C operations
 @router.get("/run-custom-i2c", response_class=StreamingResponse)
-async def run_custom_i2c(request: Request, operation: str, bus: int = 1, address: str = "0x00",
-                         register: str = "0x00", data: str = "", length: int = 1):
-    from lib.CUSTOM.custom_i2c import CustomI2C
-    global CUSTOM_I2C_INSTANCE, TEST_STOP_FLAG
+async def run_custom_i2c(request: Request, operation: str = "", bus: int = 1, address: str = "0x00",
+                         register: str = "0x00", data: str = "", length: int = 1,
+                         count: int = 256, interval: float = 0.5, duration: float = 0,
+                         cycles: int = 1000, seed: int = 0,
+                         record: str = "", replay: str = "", speed: float = 1.0):
+    params = macro_params(locals(), "speed")
+    from lib.CUSTOM.pool import I2C_SESSIONS
+    global TEST_STOP_FLAG
     TEST_STOP_FLAG = False
+    if replay:
+        return StreamingResponse(replay_stream(replay, speed), media_type="text/event-stream")
     
     async def event_generator():
-        global CUSTOM_I2C_INSTANCE
         try:
             # Convert address from hex string to int
             addr_int = int(address, 16) if isinstance(address, str) and address.startswith('0x') else int(address)
             reg_int = int(register, 16) if isinstance(register, str) and register.startswith('0x') else int(register)
             
-            if CUSTOM_I2C_INSTANCE is None or CUSTOM_I2C_INSTANCE.device_address != addr_int:
-                if CUSTOM_I2C_INSTANCE:
-                    CUSTOM_I2C_INSTANCE.close()
-                CUSTOM_I2C_INSTANCE = CustomI2C(bus=bus, device_address=addr_int)
+            # one handle per bus, shared by every address on it
+            session, opened = await run_in_threadpool(I2C_SESSIONS.get, bus)
+            i2c = session.instance
+
+            def call(method, *args):
+                return run_in_threadpool(session.call, i2c.addressed, addr_int, method, *args)
+
+            if opened:
                 yield f"data: I2C initialized - Bus: {bus}, Address: 0x{addr_int:02X}\n\n"
             
             if operation == "scan":
-                result = CUSTOM_I2C_INSTANCE.scan_bus()
+                result = await call(i2c.scan_bus)
                 yield f"data: {result['message']}\n\n"
                 if result['success'] and 'devices' in result:
                     yield f"data: Devices: {', '.join(result['devices'])}\n\n"
             
             elif operation == "write_byte":
                 byte_val = int(data, 16) if data.startswith('0x') else int(data)
-                result = CUSTOM_I2C_INSTANCE.write_byte(byte_val)
+                result = await call(i2c.write_byte, byte_val)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "read_byte":
-                result = CUSTOM_I2C_INSTANCE.read_byte()
+                result = await call(i2c.read_byte)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "write_byte_data":
                 byte_val = int(data, 16) if data.startswith('0x') else int(data)
-                result = CUSTOM_I2C_INSTANCE.write_byte_data(reg_int, byte_val)
+                result = await call(i2c.write_byte_data, reg_int, byte_val)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "read_byte_data":
-                result = CUSTOM_I2C_INSTANCE.read_byte_data(reg_int)
+                result = await call(i2c.read_byte_data, reg_int)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "write_block":
                 data_bytes = [int(b.strip(), 16) for b in data.split(',')]
-                result = CUSTOM_I2C_INSTANCE.write_block_data(reg_int, data_bytes)
+                result = await call(i2c.write_block_data, reg_int, data_bytes)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "read_block":
-                result = CUSTOM_I2C_INSTANCE.read_block_data(reg_int, length)
+                result = await call(i2c.read_block_data, reg_int, length)
                 yield f"data: {result['message']}\n\n"
             
+            elif operation in ("dump", "diff", "watch"):
+                # register map from `register`, `count` registers (default: to 0xFF)
+                span = min(count, 256 - reg_int)
+                if operation == "dump":
+                    result = await call(i2c.dump_registers, reg_int, span)
+                else:
+                    result = await call(i2c.diff_registers, reg_int, span)
+                yield f"data: {result['message']}\n\n"
+                deadline = time.monotonic() + duration if duration > 0 else None
+                while result["success"]:
+                    if result.get("changes") is None:
+                        for row in result["rows"]:
+                            yield f"data: {row}\n\n"
+                    else:
+                        for reg, (old, new) in result["changes"].items():
+                            yield f"data: 0x{reg:02X}: 0x{old:02X} -> 0x{new:02X}\n\n"
+                    # watch: re-read every `interval` s and stream only the changed registers
+                    if operation != "watch" or TEST_STOP_FLAG or await request.is_disconnected():
+                        break
+                    if deadline is not None and time.monotonic() >= deadline:
+                        break
+                    await asyncio.sleep(interval)
+                    result = await call(i2c.diff_registers, reg_int, span)
+                    if not result["success"]:
+                        yield f"data: {result['message']}\n\n"
+            
+            elif operation == "stress":
+                # write/readback-verify cycles in batches, with progress after each batch
+                batch = max(100, cycles // 10)
+                stats = None
+                done = 0
+                while done < cycles and not TEST_STOP_FLAG and not await request.is_disconnected():
+                    size = min(batch, cycles - done)
+                    result = await call(i2c.stress_test, reg_int, size, seed, stats)
+                    stats, done = result["stats"], done + size
+                    yield f"data: {result['message']}\n\n"
+                if stats is not None and stats.min_us is not None:
+                    yield f"data: Latency histogram ({stats.min_us:.1f}-{stats.max_us:.1f} us):\n\n"
+                    for row in stats.histogram_rows():
+                        yield f"data: {row}\n\n"
+            
             else:
                 yield f"data: Unknown operation: {operation}\n\n"
         
         except Exception as e:
             yield f"data: Error: {e}\n\n"
     
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(record_stream(macro_stream(event_generator(), "i2c", params), record, "custom-i2c"), media_type="text/event-stream")
 
 # Custom SPI operations
 @router.get("/run-custom-spi", response_class=StreamingResponse)
-async def run_custom_spi(request: Request, operation: str, bus: int = 0, device: int = 0,
-                         mode: int = 0, speed: int = 500000, data: str = "", length: int = 1):
-    from lib.CUSTOM.custom_spi import CustomSPI
-    global CUSTOM_SPI_INSTANCE, TEST_STOP_FLAG
+async def run_custom_spi(request: Request, operation: str = "", bus: int = 0, device: int = 0,
+                         mode: int = 0, speed: int = 500000, data: str = "", length: int = 1,
+                         speeds: str = "", modes: str = "0", frames: int = 4, seed: int = 0,
+                         echo_offset: int = 0,
+                         record: str = "", replay: str = "", replay_speed: float = 1.0):
+    params = macro_params(locals(), "replay_speed")
+    from lib.CUSTOM.pool import SPI_SESSIONS
+    global TEST_STOP_FLAG
     TEST_STOP_FLAG = False
+    if replay:
+        return StreamingResponse(replay_stream(replay, replay_speed), media_type="text/event-stream")
     
     async def event_generator():
-        global CUSTOM_SPI_INSTANCE
         try:
-            if CUSTOM_SPI_INSTANCE is None:
-                CUSTOM_SPI_INSTANCE = CustomSPI(bus=bus, device=device, mode=mode, max_speed_hz=speed)
+            # one handle per chip select, keeping its own mode and speed
+            session, opened = await run_in_threadpool(SPI_SESSIONS.get, (bus, device), mode=mode, max_speed_hz=speed)
+            spi = session.instance
+
+            def call(method, *args):
+                return run_in_threadpool(session.call, method, *args)
+
+            if opened:
                 yield f"data: SPI initialized - Bus: {bus}, Device: {device}, Mode: {mode}, Speed: {speed}Hz\n\n"
             
             if operation == "transfer":
                 data_bytes = [int(b.strip(), 16) for b in data.split(',')]
-                result = CUSTOM_SPI_INSTANCE.transfer(data_bytes)
+                result = await call(spi.transfer, data_bytes)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "write":
                 data_bytes = [int(b.strip(), 16) for b in data.split(',')]
-                result = CUSTOM_SPI_INSTANCE.write(data_bytes)
+                result = await call(spi.write, data_bytes)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "read":
-                result = CUSTOM_SPI_INSTANCE.read(length)
+                result = await call(spi.read, length)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "set_mode":
-                result = CUSTOM_SPI_INSTANCE.set_mode(mode)
+                result = await call(spi.set_mode, mode)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "set_speed":
-                result = CUSTOM_SPI_INSTANCE.set_speed(speed)
+                result = await call(spi.set_speed, speed)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "get_config":
-                result = CUSTOM_SPI_INSTANCE.get_config()
+                result = await call(spi.get_config)
                 yield f"data: Bus: {result['bus']}, Device: {result['device']}, Mode: {result['mode']}, Speed: {result['max_speed_hz']}Hz\n\n"
             
+            elif operation == "ber":
+                # loopback bit-error-rate sweep: every mode x speed, `frames` frames of `length` bytes
+                from lib.CUSTOM.custom_spi import SPEED_LADDER, max_clean_speed
+                ladder = [int(float(s)) for s in speeds.split(',') if s.strip()] or list(SPEED_LADDER)
+                mode_list = [int(m) for m in modes.split(',') if m.strip()]
+                frame = length if length > 1 else 4096
+                yield f"data: BER sweep: {len(ladder)} speed(s) x {len(mode_list)} mode(s), {frames} x {frame} byte frame(s), seed {seed}\n\n"
+                results = []
+                stopped = False
+                for test_mode in mode_list:
+                    for test_speed in ladder:
+                        if TEST_STOP_FLAG or await request.is_disconnected():
+                            stopped = True
+                            break
+                        result = await call(spi.loopback_test, test_speed, test_mode,
+                                            frame, frames, seed, echo_offset)
+                        results.append(result)
+                        yield f"data: {result['message']}\n\n"
+                    if stopped:
+                        yield f"data: BER sweep stopped after {len(results)} test(s)\n\n"
+                        break
+                for test_mode, clean in max_clean_speed(results).items():
+                    best = next((r for r in results if r["mode"] == test_mode and r["speed_hz"] == clean), None)
+                    if best:
+                        yield f"data: Mode {test_mode}: max clean speed {clean} Hz ({best['bytes_per_s'] / 1000:.1f} kB/s)\n\n"
+                    else:
+                        yield f"data: Mode {test_mode}: no clean speed (check the loopback wiring)\n\n"
+            
             else:
                 yield f"data: Unknown operation: {operation}\n\n"
         
         except Exception as e:
             yield f"data: Error: {e}\n\n"
     
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(record_stream(macro_stream(event_generator(), "spi", params), record, "custom-spi"), media_type="text/event-stream")
 
 # Custom UART operations
 @router.get("/run-custom-uart", response_class=StreamingResponse)
-async def run_custom_uart(request: Request, operation: str, port: str = "/dev/ttyS0",
+async def run_custom_uart(request: Request, operation: str = "", port: str = "/dev/ttyS0",
                           baudrate: int = 9600, bytesize: int = 8, parity: str = "N",
                           stopbits: float = 1, timeout: float = 1.0, xonxoff: bool = False,
                           rtscts: bool = False, dsrdtr: bool = False,
                           data: str = "", size: int = 1, delay: float = 0.1,
-                          dtr: bool = False, rts: bool = False, break_duration: float = 0.25):
-    from lib.CUSTOM.custom_uart import CustomUART
-    global CUSTOM_UART_INSTANCE, TEST_STOP_FLAG
+                          dtr: bool = False, rts: bool = False, break_duration: float = 0.25,
+                          expect: int = 0, terminator: str = "", pattern: str = "",
+                          record: str = "", replay: str = "", speed: float = 1.0):
+    params = macro_params(locals(), "speed")
+    from lib.CUSTOM.pool import UART_SESSIONS
+    global TEST_STOP_FLAG
     TEST_STOP_FLAG = False
+    if replay:
+        return StreamingResponse(replay_stream(replay, speed), media_type="text/event-stream")
     
     async def event_generator():
-        global CUSTOM_UART_INSTANCE
         try:
-            if CUSTOM_UART_INSTANCE is None or CUSTOM_UART_INSTANCE.port_name != port:
-                if CUSTOM_UART_INSTANCE:
-                    CUSTOM_UART_INSTANCE.close()
-                CUSTOM_UART_INSTANCE = CustomUART(port=port, baudrate=baudrate, bytesize=bytesize,
-                                                   parity=parity, stopbits=stopbits, timeout=timeout,
-                                                   xonxoff=xonxoff, rtscts=rtscts, dsrdtr=dsrdtr)
+            session, opened = await run_in_threadpool(UART_SESSIONS.get, port, baudrate=baudrate, bytesize=bytesize,
+                                                      parity=parity, stopbits=stopbits, timeout=timeout,
+                                                      xonxoff=xonxoff, rtscts=rtscts, dsrdtr=dsrdtr)
+            uart = session.instance
+
+            def call(method, *args):
+                # under the port's lock, off the event loop; other ports run alongside
+                return run_in_threadpool(session.call, method, *args)
+
+            if opened:
                 flow = []
                 if xonxoff: flow.append("XON/XOFF")
                 if rtscts: flow.append("RTS/CTS")
@@ -500,72 +953,82 @@ async def run_custom_uart(request: Request, operation: str, port: str = "/dev/tt
                 yield f"data: UART initialized - Port: {port}, Baud: {baudrate}, {bytesize}{parity}{stopbits}, Timeout: {timeout}s, Flow: {flow_str}\n\n"
             
             if operation == "write_string":
-                result = CUSTOM_UART_INSTANCE.write(data)
+                result = await call(uart.write, data)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "write_bytes":
                 data_bytes = [int(b.strip(), 16) for b in data.split(',')]
-                result = CUSTOM_UART_INSTANCE.write(data_bytes)
+                result = await call(uart.write, data_bytes)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "read":
-                result = CUSTOM_UART_INSTANCE.read(size)
+                result = await call(uart.read, size)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "read_line":
-                result = CUSTOM_UART_INSTANCE.read_line()
+                result = await call(uart.read_line)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "read_all":
-                result = CUSTOM_UART_INSTANCE.read_all()
+                result = await call(uart.read_all)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "write_read":
                 if data.startswith('0x') or ',' in data:
                     data_bytes = [int(b.strip(), 16) for b in data.split(',')]
-                    result = CUSTOM_UART_INSTANCE.write_read(data_bytes, size, delay)
+                    result = await call(uart.write_read, data_bytes, size, delay)
                 else:
-                    result = CUSTOM_UART_INSTANCE.write_read(data, size, delay)
+                    result = await call(uart.write_read, data, size, delay)
                 yield f"data: {result['message']}\n\n"
             
+            elif operation == "request":
+                payload = data.encode("utf-8").decode("unicode_escape").encode("latin-1")
+                if data.startswith('0x') or ',' in data:
+                    payload = bytes(int(b.strip(), 16) for b in data.split(','))
+                result = await call(uart.request, payload, expect or None,
+                                    parse_terminator(terminator), pattern or None, timeout)
+                yield f"data: {result['message']}\n\n"
+                if result.get("latency_ms") is not None:
+                    yield f"data: Latency: first byte {result['first_byte_ms']:.2f} ms, complete {result['latency_ms']:.2f} ms\n\n"
+            
             elif operation == "flush":
-                result = CUSTOM_UART_INSTANCE.flush()
+                result = await call(uart.flush)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "in_waiting":
-                result = CUSTOM_UART_INSTANCE.in_waiting()
+                result = await call(uart.in_waiting)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "out_waiting":
-                result = CUSTOM_UART_INSTANCE.out_waiting()
+                result = await call(uart.out_waiting)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "set_baudrate":
-                result = CUSTOM_UART_INSTANCE.set_baudrate(baudrate)
+                result = await call(uart.set_baudrate, baudrate)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "set_timeout":
-                result = CUSTOM_UART_INSTANCE.set_timeout(timeout)
+                result = await call(uart.set_timeout, timeout)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "set_dtr":
-                result = CUSTOM_UART_INSTANCE.set_dtr(dtr)
+                result = await call(uart.set_dtr, dtr)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "set_rts":
-                result = CUSTOM_UART_INSTANCE.set_rts(rts)
+                result = await call(uart.set_rts, rts)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "get_control_lines":
-                result = CUSTOM_UART_INSTANCE.get_control_lines()
+                result = await call(uart.get_control_lines)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "send_break":
-                result = CUSTOM_UART_INSTANCE.send_break(break_duration)
+                result = await call(uart.send_break, break_duration)
                 yield f"data: {result['message']}\n\n"
             
             elif operation == "get_config":
-                result = CUSTOM_UART_INSTANCE.get_config()
+                result = await call(uart.get_config)
                 yield f"data: Port: {result['port']}, Baud: {result['baudrate']}, Config: {result['bytesize']}{result['parity']}{result['stopbits']}, Timeout: {result['timeout']}s\n\n"
                 yield f"data: Flow Control - XON/XOFF: {result['xonxoff']}, RTS/CTS: {result['rtscts']}, DSR/DTR: {result['dsrdtr']}\n\n"
             
@@ -575,16 +1038,92 @@ async def run_custom_uart(request: Request, operation: str, port: str = "/dev/tt
         except Exception as e:
             yield f"data: Error: {e}\n\n"
     
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(record_stream(macro_stream(event_generator(), "uart", params), record, "custom-uart"), media_type="text/event-stream")
+
+def parse_terminator(text: str):
+    """Terminator as given: hex ("0x0d0a") or with escapes ("\\r\\n"); None when empty"""
+    if not text:
+        return None
+    if text.lower().startswith("0x"):
+        return bytes.fromhex(text[2:])
+    return text.encode("utf-8").decode("unicode_escape").encode("latin-1")
+
+
+def uart_stamp(t: float) -> str:
+    return time.strftime("%H:%M:%S", time.localtime(t)) + f".{int(t * 1000) % 1000:03d}"
+
+
+# Live receive stream of a custom UART port
+@router.get("/uart/live", response_class=StreamingResponse)
+async def uart_live(request: Request, port: str = "/dev/ttyS0", baudrate: int = 9600, timeout: float = 1.0,
+                    format: str = "hex", since: int = -1, duration: float = 0):
+    """Stream what the port's background reader receives, as hex rows or text lines
+
+    since=-1 starts with new data; a ring offset replays from there.
+    """
+    from lib.CUSTOM.pool import UART_SESSIONS
+    global TEST_STOP_FLAG
+    TEST_STOP_FLAG = False
+
+    async def event_generator():
+        try:
+            session, opened = await run_in_threadpool(UART_SESSIONS.get, port, baudrate=baudrate, timeout=timeout)
+            if opened:
+                yield f"data: UART initialized - Port: {port}, Baud: {baudrate}\n\n"
+        except Exception as e:
+            yield f"data: Error: {e}\n\n"
+            return
+        with session.using():
+            async for line in monitor_uart(request, port, session.instance, format, since, duration):
+                yield line
+    return StreamingResponse(track_stream(event_generator()), media_type="text/event-stream")
+
+
+async def monitor_uart(request: Request, port: str, uart, format: str, since: int, duration: float):
+    """Lines of a live UART stream, read from the port's ring without taking its lock"""
+    ring = uart.ring
+    offset = ring.end if since < 0 else since
+    pending, pending_at = "", 0.0
+    deadline = time.monotonic() + duration if duration > 0 else None
+    yield f"data: Monitoring {port} from offset {offset} ({format})\n\n"
+    while not TEST_STOP_FLAG and not await request.is_disconnected():
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+        if ring.end <= offset:
+            if not uart.reader.running:
+                yield f"data: Reader stopped: {uart.reader.error or 'port closed'}\n\n"
+                break
+            if pending and time.monotonic() - pending_at > 0.5:
+                yield f"data: [{uart_stamp(time.time())}] {pending}\n\n"  # unterminated line
+                pending = ""
+            await asyncio.sleep(0.02)
+            continue
+        data, start, dropped = ring.peek(offset)
+        if dropped:
+            yield f"data: ⚠️ {dropped} byte(s) overwritten before they were streamed\n\n"
+        if format == "text":
+            pending += data.decode("utf-8", errors="replace")
+            pending_at = time.monotonic()
+            *lines, pending = pending.split("\n")
+            for line in lines:
+                yield f"data: [{uart_stamp(ring.arrived(start))}] {line.rstrip(chr(13))}\n\n"
+        else:
+            for row in range(0, len(data), 16):
+                yield f"data: [{uart_stamp(ring.arrived(start + row))}] +{start + row}: {data[row:row + 16].hex(' ')}\n\n"
+        offset = start + len(data)
+    yield f"data: Stopped at offset {offset}\n\n"
 
 # Custom PWM operations
 @router.get("/run-custom-pwm", response_class=StreamingResponse)
-async def run_custom_pwm(request: Request, operation: str, pin: int = 18,
+async def run_custom_pwm(request: Request, operation: str = "", pin: int = 18,
                          frequency: float = 1000, duty_cycle: float = 0,
-                         pulse_width: float = 0):
+                         pulse_width: float = 0,
+                         record: str = "", replay: str = "", speed: float = 1.0):
     from lib.CUSTOM.custom_pwm import CustomPWM
     global CUSTOM_PWM_INSTANCES, TEST_STOP_FLAG
     TEST_STOP_FLAG = False
+    if replay:
+        return StreamingResponse(replay_stream(replay, speed), media_type="text/event-stream")
     
     async def event_generator():
         global CUSTOM_PWM_INSTANCES
@@ -631,26 +1170,164 @@ async def run_custom_pwm(request: Request, operation: str, pin: int = 18,
         except Exception as e:
             yield f"data: Error: {e}\n\n"
     
-    return StreamingResponse(event_generator(), media_type="text/event-stream")
+    return StreamingResponse(record_stream(event_generator(), record, "custom-pwm"), media_type="text/event-stream")
 
 # Cleanup endpoint for custom protocols
+# ==================== BINARY UPLOADS ====================
+# POST bodies carry the payload as raw bytes (encoding=raw) or a hex blob
+# (encoding=hex, whitespace/commas/0x allowed), so a display frame or an
+# EEPROM image is one request. The received bytes come back base64-encoded
+# in JSON, or as the raw response body with response=binary.
+
+async def read_payload(request, encoding):
+    body = await request.body()
+    if encoding == "hex":
+        return bytes.fromhex(re.sub(r"0[xX]|[\s,]", "", body.decode("ascii")))
+    if encoding != "raw":
+        raise ValueError("encoding must be raw or hex")
+    return body
+
+def binary_response(result, response):
+    if not result["success"]:
+        return {"error": result["message"]}
+    data = result["data"]
+    if response == "binary":
+        return Response(content=data, media_type="application/octet-stream",
+                        headers={"X-Result": result["message"]})
+    return {"result": result["message"], "bytes": len(data), "data": base64.b64encode(data).decode("ascii")}
+
+@router.post("/upload-custom-spi")
+async def upload_custom_spi(request: Request, operation: str = "transfer", bus: int = 0, device: int = 0,
+                            mode: int = 0, speed: int = 500000, cs_pin: int = -1,
+                            encoding: str = "raw", response: str = "base64"):
+    """Full-duplex transfer (operation=transfer) or write (operation=write) of the request body,
+    in spidev-sized chunks; cs_pin >= 0 holds that GPIO as chip select across all chunks"""
+    from lib.CUSTOM.pool import SPI_SESSIONS
+    try:
+        payload = await read_payload(request, encoding)
+        session, _ = await run_in_threadpool(SPI_SESSIONS.get, (bus, device), mode=mode, max_speed_hz=speed)
+        spi = session.instance
+
+        def transfer():
+            # this upload's mode and speed only; the pooled session keeps its own settings
+            saved = (spi.spi.mode, spi.spi.max_speed_hz)
+            try:
+                spi.spi.mode, spi.spi.max_speed_hz = mode, speed
+                return spi.transfer_bytes(payload, operation != "write", cs_pin if cs_pin >= 0 else None)
+            finally:
+                spi.spi.mode, spi.spi.max_speed_hz = saved
+
+        result = await run_in_threadpool(session.call, transfer)
+        return binary_response(result, response)
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.post("/upload-custom-i2c")
+async def upload_custom_i2c(request: Request, bus: int = 1, address: str = "0x00", read_length: int = 0,
+                            encoding: str = "raw", response: str = "base64"):
+    """Write the request body to the device, then read read_length bytes back"""
+    from lib.CUSTOM.pool import I2C_SESSIONS
+    try:
+        payload = await read_payload(request, encoding)
+        addr_int = int(address, 16) if address.startswith('0x') else int(address)
+        session, _ = await run_in_threadpool(I2C_SESSIONS.get, bus)
+        i2c = session.instance
+        result = await run_in_threadpool(session.call, i2c.addressed, addr_int, i2c.transfer_bytes, payload, read_length)
+        return binary_response(result, response)
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.post("/upload-custom-uart")
+async def upload_custom_uart(request: Request, port: str = "/dev/ttyS0", baudrate: int = 9600,
+                             size: int = 0, delay: float = 0.1, timeout: float = 1.0,
+                             encoding: str = "raw", response: str = "base64"):
+    """Write the request body to the port, then read up to size bytes back"""
+    from lib.CUSTOM.pool import UART_SESSIONS
+    try:
+        payload = await read_payload(request, encoding)
+        session, _ = await run_in_threadpool(UART_SESSIONS.get, port, baudrate=baudrate, timeout=timeout)
+        result = await run_in_threadpool(session.call, session.instance.transfer_bytes, payload, size, delay)
+        return binary_response(result, response)
+    except Exception as e:
+        return {"error": str(e)}
+
+# ==================== MACROS ====================
+
+@router.get("/macros")
+async def list_macros():
+    from lib.CUSTOM.macro import RECORDER, list_macros
+    return {"recording": RECORDER.status(), "macros": list_macros()}
+
+@router.post("/macros/record")
+async def record_macro(request: Request):
+    """Start recording custom I2C/SPI/UART operations
+    Body: { "name": "eeprom_check", "description": "..." }"""
+    from lib.CUSTOM.macro import RECORDER
+    try:
+        body = await request.json()
+        return {"result": "Recording macro", "recording": RECORDER.start(body.get("name", ""), body.get("description", ""))}
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.post("/macros/stop")
+async def stop_macro():
+    from lib.CUSTOM.macro import RECORDER
+    try:
+        return {"result": "Macro saved", **RECORDER.stop()}
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.get("/macros/{name}")
+async def get_macro(name: str):
+    from lib.CUSTOM.macro import load_macro
+    try:
+        return load_macro(name)
+    except Exception as e:
+        return {"error": str(e)}
+
+@router.post("/macros/{name}/replay")
+async def replay_macro(request: Request, name: str, stop_on_mismatch: bool = False):
+    """Run a macro's steps back to back and compare every response with the recording"""
+    from lib.CUSTOM import macro
+    try:
+        recorded = macro.load_macro(name)
+    except Exception as e:
+        return {"error": str(e)}
+    routes = {"i2c": run_custom_i2c, "spi": run_custom_spi, "uart": run_custom_uart}
+    token = macro.REPLAYING.set(True)
+    results = []
+    start = time.perf_counter()
+    try:
+        for index, step in enumerate(recorded["steps"], 1):
+            step_start = time.perf_counter()
+            response = await routes[step["protocol"]](request, **step["params"])
+            lines = [event[6:].rstrip("\n") async for event in response.body_iterator if event.startswith("data: ")]
+            results.append(macro.check_step(index, step, lines, (time.perf_counter() - step_start) * 1000))
+            if stop_on_mismatch and not results[-1]["match"]:
+                break
+    except Exception as e:
+        return {"error": f"Step {len(results) + 1}: {e}"}
+    finally:
+        macro.REPLAYING.reset(token)
+    return macro.report(recorded, results, (time.perf_counter() - start) * 1000)
+
 @router.post("/cleanup-custom")
 async def cleanup_custom(request: Request):
-    global CUSTOM_I2C_INSTANCE, CUSTOM_SPI_INSTANCE, CUSTOM_UART_INSTANCE, CUSTOM_PWM_INSTANCES
+    global CUSTOM_PWM_INSTANCES
+    from lib.CUSTOM.pool import I2C_SESSIONS, SPI_SESSIONS, UART_SESSIONS
     
     try:
         body = await request.json()
         protocol = body.get('protocol', '').lower()
         
-        if protocol == "i2c" and CUSTOM_I2C_INSTANCE:
-            CUSTOM_I2C_INSTANCE.close()
-            CUSTOM_I2C_INSTANCE = None
-        elif protocol == "spi" and CUSTOM_SPI_INSTANCE:
-            CUSTOM_SPI_INSTANCE.close()
-            CUSTOM_SPI_INSTANCE = None
-        elif protocol == "uart" and CUSTOM_UART_INSTANCE:
-            CUSTOM_UART_INSTANCE.close()
-            CUSTOM_UART_INSTANCE = None
+        # one bus / chip select / port when given, otherwise every open session
+        if protocol == "i2c":
+            await run_in_threadpool(I2C_SESSIONS.close, body.get('bus'))
+        elif protocol == "spi":
+            key = (body['bus'], body.get('device', 0)) if 'bus' in body else None
+            await run_in_threadpool(SPI_SESSIONS.close, key)
+        elif protocol == "uart":
+            await run_in_threadpool(UART_SESSIONS.close, body.get('port') or None)
         elif protocol == "pwm":
             for pin, instance in CUSTOM_PWM_INSTANCES.items():
                 instance.cleanup()
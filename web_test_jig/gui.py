@@ -2,10 +2,9 @@ import tkinter as tk
 from tkinter import ttk
 from PIL import Image, ImageTk
 from datetime import datetime
-import RPi.GPIO as GPIO
 import csv
 from lib.I2C.I2C import *
-import board
+from lib.hal import GPIO, board
 from lib.I2C.i2c_oled import I2C_OLED
 from lib.I2C.BH1750 import BH1750
 from lib.I2C.mlx90614 import MLX90614
@@ -1,13 +1,10 @@
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
 import time
+from lib.hal import ADS, AnalogIn, open_busio_i2c
 
 class LDRSensor:
     def __init__(self):
         # Initialize I2C bus and ADS1115 ADC
-        self.i2c = busio.I2C(board.SCL, board.SDA)
+        self.i2c = open_busio_i2c()  # busio.I2C, or I2CRdwr with TESTJIG_I2C_DRIVER=rdwr
         self.ads = ADS.ADS1115(self.i2c)
         # Create single-ended input on channel 0
         self.channel = AnalogIn(self.ads, ADS.P0)
@@ -1,12 +1,9 @@
-import board
 import time
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+from lib.hal import ADS, AnalogIn, open_busio_i2c
 
 class Pot:
     def __init__(self):
-        self.i2c = busio.I2C(board.SCL, board.SDA)
+        self.i2c = open_busio_i2c()  # busio.I2C, or I2CRdwr with TESTJIG_I2C_DRIVER=rdwr
         self.ads = ADS.ADS1115(self.i2c)
     
     def activate_gui(self):
@@ -1,12 +1,9 @@
 import time
-import board
-import busio
-import adafruit_ads1x15.ads1115 as ADS
-from adafruit_ads1x15.analog_in import AnalogIn
+from lib.hal import ADS, AnalogIn, open_busio_i2c
 
 class TDS_Sensor:
     def __init__(self, channel=0):
-        self.i2c = busio.I2C(board.SCL, board.SDA)
+        self.i2c = open_busio_i2c()  # busio.I2C, or I2CRdwr with TESTJIG_I2C_DRIVER=rdwr
         self.ads = ADS.ADS1115(self.i2c)
         self.channel = channel
         self.chan = AnalogIn(self.ads, ADS.P0 + channel)  # Adjust the channel accordingly
@@ -1,12 +1,92 @@
 #!/usr/bin/env python3
 """
 Custom I2C Communication for Test Jig Web Interface
+
+Register dumps read the map in as few bulk transactions as the bus
+handle allows (one I2C_RDWR transfer, or 32-byte SMBus blocks) and keep
+the last snapshot per (bus, address), so diff_registers only reports
+the registers that changed since the previous dump.
+
+stress_test runs write/readback-verify cycles on one register as fast as
+the bus allows and accumulates a StressStats: transactions per second,
+errors by errno name, readback mismatches and a log2 histogram of
+per-transaction latency.
 """
 
-import smbus2
+import errno
+import random
+import threading
 import time
 from typing import List, Optional
 
+from lib.hal import open_i2c
+from lib.I2C.scan import SCANNER
+
+SMBUS_BLOCK = 32  # longest SMBus block read
+REGISTER_COUNT = 256
+
+# (bus, address) -> (start register, register values, time of dump)
+SNAPSHOTS = {}
+SNAPSHOTS_LOCK = threading.Lock()
+
+
+class StressStats:
+    """Counters for an I2C stress run, accumulated over any number of batches"""
+
+    BUCKETS = 24  # bucket k holds latencies in [2**(k-1), 2**k) microseconds
+
+    def __init__(self):
+        self.cycles = 0
+        self.transactions = 0
+        self.mismatches = 0
+        self.errors = {}  # errno name (or exception type) -> count
+        self.histogram = [0] * self.BUCKETS
+        self.elapsed = 0.0
+        self.min_us = None
+        self.max_us = 0.0
+
+    def add_latency(self, ns: int):
+        us = ns / 1000
+        self.histogram[min(int(us).bit_length(), self.BUCKETS - 1)] += 1
+        self.min_us = us if self.min_us is None or us < self.min_us else self.min_us
+        self.max_us = max(self.max_us, us)
+
+    def add_error(self, error: Exception):
+        name = errno.errorcode.get(getattr(error, "errno", None) or -1, type(error).__name__)
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self) -> dict:
+        failed = sum(self.errors.values())
+        return {
+            "cycles": self.cycles,
+            "transactions": self.transactions,
+            "transactions_per_s": round(self.transactions / self.elapsed, 1) if self.elapsed else 0.0,
+            "errors": dict(self.errors),
+            "error_rate": failed / self.transactions if self.transactions else 0.0,
+            "mismatches": self.mismatches,
+            "min_us": self.min_us,
+            "max_us": self.max_us,
+            "histogram_us": {self.bucket_label(k): n for k, n in enumerate(self.histogram) if n},
+        }
+
+    @staticmethod
+    def bucket_label(k: int) -> str:
+        return "<1" if k == 0 else f"{1 << (k - 1)}-{1 << k}"
+
+    def histogram_rows(self, width: int = 40) -> List[str]:
+        peak = max(self.histogram) or 1
+        return [f"{self.bucket_label(k):>13s} us {n:>9d} {'#' * max(1, round(width * n / peak))}"
+                for k, n in enumerate(self.histogram) if n]
+
+
+def format_dump(start: int, data: bytes) -> List[str]:
+    """i2cdump-style rows of 16 registers: "10: 00 1f ..." """
+    rows = []
+    for offset in range(0, len(data), 16):
+        row = data[offset:offset + 16]
+        rows.append(f"{start + offset:02x}: " + " ".join(f"{value:02x}" for value in row))
+    return rows
+
 
 class CustomI2C:
     """Custom I2C communication class for web interface"""
@@ -24,7 +104,16 @@ class CustomI2C:
         """
         self.bus_number = bus
         self.device_address = device_address
-        self.bus = smbus2.SMBus(bus)
+        self.bus = open_i2c(bus)  # SMBus, or I2CRdwr (no 32-byte block limit) with TESTJIG_I2C_DRIVER=rdwr
+
+    def addressed(self, address: int, method, *args):
+        """Call one of the methods below on the device at address, over this same bus handle
+
+        The caller serializes access (the session lock in lib.CUSTOM.pool),
+        so the address cannot change under a running method.
+        """
+        self.device_address = address
+        return method(*args)
     
     def write_byte(self, data: int) -> dict:
         """Write a single byte to the I2C device"""
@@ -32,6 +121,7 @@ class CustomI2C:
             self.bus.write_byte(self.device_address, data)
             return {"success": True, "message": f"Written byte: 0x{data:02X}"}
         except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
             return {"success": False, "message": f"Error: {e}"}
     
     def read_byte(self) -> dict:
@@ -40,6 +130,7 @@ class CustomI2C:
             data = self.bus.read_byte(self.device_address)
             return {"success": True, "message": f"Read byte: 0x{data:02X}", "data": data}
         except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
             return {"success": False, "message": f"Error: {e}"}
     
     def write_byte_data(self, register: int, data: int) -> dict:
@@ -48,6 +139,7 @@ class CustomI2C:
             self.bus.write_byte_data(self.device_address, register, data)
             return {"success": True, "message": f"Written to register 0x{register:02X}: 0x{data:02X}"}
         except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
             return {"success": False, "message": f"Error: {e}"}
     
     def read_byte_data(self, register: int) -> dict:
@@ -56,6 +148,7 @@ class CustomI2C:
             data = self.bus.read_byte_data(self.device_address, register)
             return {"success": True, "message": f"Read from register 0x{register:02X}: 0x{data:02X}", "data": data}
         except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
             return {"success": False, "message": f"Error: {e}"}
     
     def write_block_data(self, register: int, data: List[int]) -> dict:
@@ -64,6 +157,7 @@ class CustomI2C:
             self.bus.write_i2c_block_data(self.device_address, register, data)
             return {"success": True, "message": f"Written block to register 0x{register:02X}: {[hex(b) for b in data]}"}
         except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
             return {"success": False, "message": f"Error: {e}"}
     
     def read_block_data(self, register: int, length: int) -> dict:
@@ -72,22 +166,173 @@ class CustomI2C:
             data = self.bus.read_i2c_block_data(self.device_address, register, length)
             return {"success": True, "message": f"Read block from register 0x{register:02X}: {[hex(b) for b in data]}", "data": data}
         except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
+            return {"success": False, "message": f"Error: {e}"}
+    
+    def transfer_bytes(self, data: bytes, read_length: int = 0) -> dict:
+        """Write a buffer, then read read_length bytes with a repeated START
+
+        On the I2C_RDWR driver this is one transfer of any length. On SMBus
+        the first byte is taken as the register and the rest is moved in
+        32-byte blocks at increasing register addresses, so the register
+        plus the payload (or read) length may not pass 0xFF.
+        """
+        try:
+            if hasattr(self.bus, "write_then_read"):
+                received = bytearray(read_length)
+                if not read_length:
+                    self.bus.write(self.device_address, data)
+                elif data:
+                    self.bus.write_then_read(self.device_address, data, received)
+                else:
+                    self.bus.read_into(self.device_address, received)
+                received = bytes(received)
+            else:
+                # blocks go to increasing register addresses, which end at 0xFF
+                span = max(len(data) - 1, read_length) if data else 0
+                if data and data[0] + span > REGISTER_COUNT:
+                    return {"success": False,
+                            "message": (f"Error: {span} byte(s) from register 0x{data[0]:02X} run past 0xFF; "
+                                        f"longer transfers need TESTJIG_I2C_DRIVER=rdwr")}
+                received = self._smbus_transfer(data, read_length)
+            return {"success": True, "message": f"Wrote {len(data)} byte(s), read {len(received)} byte(s)", "data": received}
+        except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
             return {"success": False, "message": f"Error: {e}"}
     
+    def _smbus_transfer(self, data: bytes, read_length: int) -> bytes:
+        if len(data) > 1 or (data and not read_length):
+            register, payload = data[0], data[1:]
+            if not payload:
+                self.bus.write_byte(self.device_address, register)
+            for offset in range(0, len(payload), SMBUS_BLOCK):
+                self.bus.write_i2c_block_data(self.device_address, register + offset,
+                                              list(payload[offset:offset + SMBUS_BLOCK]))
+        if not read_length:
+            return b""
+        if not data:
+            return bytes(self.bus.read_byte(self.device_address) for _ in range(read_length))
+        received = bytearray()
+        for offset in range(0, read_length, SMBUS_BLOCK):
+            received += bytes(self.bus.read_i2c_block_data(self.device_address, data[0] + offset,
+                                                           min(SMBUS_BLOCK, read_length - offset)))
+        return bytes(received)
+    
     def scan_bus(self) -> dict:
-        """Scan I2C bus for connected devices"""
-        devices = []
+        """Scan I2C bus for connected devices (always a fresh full scan)"""
         try:
-            for addr in range(0x03, 0x78):
-                try:
-                    self.bus.read_byte(addr)
-                    devices.append(f"0x{addr:02X}")
-                except:
-                    pass
+            found = SCANNER.scan(self.bus_number, refresh=True, bus=self.bus)
+            devices = [f"0x{addr:02X}" for addr in found]
             return {"success": True, "message": f"Found {len(devices)} device(s)", "devices": devices}
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
     
+    def _read_registers(self, start: int, count: int):
+        """Read count consecutive registers; returns (bytes, transactions used)"""
+        if hasattr(self.bus, "read_register"):
+            return bytes(self.bus.read_register(self.device_address, start, count)), 1
+        data = bytearray()
+        for offset in range(0, count, SMBUS_BLOCK):
+            data += bytes(self.bus.read_i2c_block_data(self.device_address, start + offset,
+                                                       min(SMBUS_BLOCK, count - offset)))
+        return bytes(data), -(-count // SMBUS_BLOCK)
+
+    def _snapshot(self, start: int, count: int):
+        """Bulk-read registers, cache them and return (data, transactions, previous snapshot)"""
+        if not 0 <= start < REGISTER_COUNT or not 0 < count <= REGISTER_COUNT - start:
+            raise ValueError(f"registers 0x{start:02X}+{count} are outside 0x00-0xFF")
+        data, transactions = self._read_registers(start, count)
+        with SNAPSHOTS_LOCK:
+            key = (self.bus_number, self.device_address)
+            previous = SNAPSHOTS.get(key)
+            SNAPSHOTS[key] = (start, data, time.time())
+        return data, transactions, previous
+
+    def dump_registers(self, start: int = 0, count: int = REGISTER_COUNT) -> dict:
+        """Read the register map from start in bulk and cache it as the snapshot"""
+        try:
+            data, transactions, _ = self._snapshot(start, count)
+            return {"success": True, "message": f"Dumped {len(data)} register(s) from 0x{start:02X} in {transactions} transaction(s)",
+                    "data": list(data), "rows": format_dump(start, data)}
+        except ValueError as e:
+            return {"success": False, "message": f"Error: {e}"}
+        except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
+            return {"success": False, "message": f"Error: {e}"}
+
+    def diff_registers(self, start: int = 0, count: int = REGISTER_COUNT) -> dict:
+        """Re-read the register map and report registers changed since the cached snapshot
+
+        changes maps register -> (old value, new value); it is None when
+        there was no earlier snapshot to compare with (the dump becomes the baseline).
+        """
+        try:
+            data, transactions, previous = self._snapshot(start, count)
+        except ValueError as e:
+            return {"success": False, "message": f"Error: {e}"}
+        except Exception as e:
+            SCANNER.invalidate(self.bus_number, self.device_address)
+            return {"success": False, "message": f"Error: {e}"}
+        if previous is None:
+            return {"success": True, "message": f"No earlier snapshot; cached {len(data)} register(s) as the baseline",
+                    "data": list(data), "rows": format_dump(start, data), "changes": None}
+        old_start, old_data, taken = previous
+        changes = {}
+        for register, value in enumerate(data, start):
+            index = register - old_start
+            if 0 <= index < len(old_data) and old_data[index] != value:
+                changes[register] = (old_data[index], value)
+        return {"success": True, "message": f"{len(changes)} register(s) changed since the snapshot {time.time() - taken:.1f} s ago",
+                "data": list(data), "changes": changes}
+
+    def stress_test(self, register: int, cycles: int = 1000, seed: int = 0,
+                    stats: Optional[StressStats] = None) -> dict:
+        """
+        Run write/readback-verify cycles on one register as fast as possible
+        
+        Parameters:
+        -----------
+        register : int
+            Register to write a pseudo-random byte to and read back
+        cycles : int
+            Number of write/read cycles in this batch
+        seed : int
+            Pattern seed
+        stats : StressStats, optional
+            Counters to add to (to report progress across batches)
+        """
+        stats = stats or StressStats()
+        rng = random.Random(f"{seed}:{stats.cycles}")
+        clock = time.perf_counter_ns
+        address = self.device_address
+        write, read = self.bus.write_byte_data, self.bus.read_byte_data
+        start = clock()
+        for value in rng.randbytes(cycles):
+            stats.cycles += 1
+            try:
+                t0 = clock()
+                write(address, register, value)
+                t1 = clock()
+                stats.add_latency(t1 - t0)
+                stats.transactions += 1
+                readback = read(address, register)
+                stats.add_latency(clock() - t1)
+                stats.transactions += 1
+                if readback != value:
+                    stats.mismatches += 1
+            except Exception as e:
+                stats.transactions += 1
+                stats.add_error(e)
+        stats.elapsed += (clock() - start) / 1e9
+        if stats.errors:
+            SCANNER.invalidate(self.bus_number, address)
+        summary = stats.summary()
+        errors = ", ".join(f"{name} x{count}" for name, count in stats.errors.items())
+        return {"success": True, "stats": stats, "summary": summary,
+                "message": (f"{stats.cycles} cycle(s), {stats.transactions} transaction(s) at "
+                            f"{summary['transactions_per_s']:.0f}/s, {sum(stats.errors.values())} error(s)"
+                            f"{f' ({errors})' if errors else ''}, {stats.mismatches} readback mismatch(es)")}
+
     def close(self):
         """Close I2C bus connection"""
         self.bus.close()
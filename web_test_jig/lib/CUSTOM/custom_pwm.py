@@ -3,10 +3,11 @@
 Custom PWM Communication for Test Jig Web Interface
 """
 
-import RPi.GPIO as GPIO
 import time
 from typing import Optional
 
+from lib.hal import GPIO
+
 
 class CustomPWM:
     """Custom PWM class for web interface"""
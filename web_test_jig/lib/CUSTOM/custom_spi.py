@@ -1,11 +1,46 @@
 #!/usr/bin/env python3
 """
 Custom SPI Communication for Test Jig Web Interface
+
+transfer_bytes moves buffers of any size: it slices them (memoryview,
+no copies) into chunks of the kernel's spidev bufsiz and sends each with
+the buffer-based xfer3/writebytes2. The controller's chip select is
+released between chunks; to keep one frame under a single CS assertion,
+pass cs_pin and wire CS to that GPIO: the kernel CS is then disabled
+(no_cs) and the GPIO is held low across all chunks.
+
+loopback_test sends seeded pseudo-random frames through a MOSI-MISO
+loopback (or an echo device, with echo_offset bytes of delay) at one
+clock speed and mode and counts bit errors with one big-integer XOR per
+frame. Stepping it through SPEED_LADDER finds the fastest clean clock.
 """
 
-import spidev
+import random
 import time
-from typing import List
+from typing import List, Optional
+
+from lib import hal
+from lib.hal import spidev
+
+SPEED_LADDER = (500000, 1000000, 2000000, 4000000, 8000000, 16000000, 32000000, 62500000)
+
+
+def count_bit_errors(sent: bytes, received: bytes) -> int:
+    """Differing bits between two equal-length buffers"""
+    return (int.from_bytes(sent, "big") ^ int.from_bytes(received, "big")).bit_count()
+
+
+def max_clean_speed(results: list) -> dict:
+    """Per mode, the highest speed that is clean along with every slower one tested"""
+    best = {}
+    for mode in sorted({r["mode"] for r in results}):
+        clean = None
+        for r in sorted((r for r in results if r["mode"] == mode), key=lambda r: r["speed_hz"]):
+            if not r["success"] or r["bit_errors"]:
+                break
+            clean = r["speed_hz"]
+        best[mode] = clean
+    return best
 
 
 class CustomSPI:
@@ -34,6 +69,7 @@ class CustomSPI:
         self.spi.mode = mode
         self.spi.max_speed_hz = max_speed_hz
         self.spi.bits_per_word = 8
+        self.chunk_size = hal.spidev_bufsiz()
     
     def transfer(self, data: List[int]) -> dict:
         """Full-duplex SPI transfer"""
@@ -64,6 +100,126 @@ class CustomSPI:
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
     
+    def transfer_bytes(self, data: bytes, duplex: bool = True, cs_pin: Optional[int] = None,
+                       chunk_size: Optional[int] = None) -> dict:
+        """
+        Send a buffer of any size in kernel-sized chunks
+
+        Parameters:
+        -----------
+        data : bytes-like
+            Bytes to send (bytes, bytearray or memoryview)
+        duplex : bool
+            Keep the received bytes (xfer3); False only writes (writebytes2)
+        cs_pin : int, optional
+            BCM pin driving chip select, held low across every chunk
+        chunk_size : int, optional
+            Bytes per transfer (default: the spidev bufsiz)
+        """
+        chunk = min(chunk_size or self.chunk_size, self.chunk_size)
+        view = memoryview(data).cast("B")
+        received = bytearray(len(view)) if duplex else bytearray()
+        chunks = 0
+        if cs_pin is not None:
+            self._select(cs_pin)
+        try:
+            start = time.perf_counter()
+            for offset in range(0, len(view), chunk):
+                block = view[offset:offset + chunk]
+                if duplex:
+                    received[offset:offset + len(block)] = self.spi.xfer3(block)
+                else:
+                    self.spi.writebytes2(block)
+                chunks += 1
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            return {"success": False, "message": f"Error after {chunks} chunk(s): {e}"}
+        finally:
+            if cs_pin is not None:
+                self._release(cs_pin)
+        throughput = len(view) / elapsed if elapsed else 0.0
+        wire = self.spi.max_speed_hz / 8
+        return {
+            "success": True,
+            "message": (f"{'Transferred' if duplex else 'Written'} {len(view)} bytes in {chunks} chunk(s) of "
+                        f"{chunk} in {elapsed * 1000:.1f} ms ({throughput / 1000:.1f} kB/s, "
+                        f"{100 * throughput / wire if wire else 0:.0f}% of the {self.spi.max_speed_hz} Hz clock)"),
+            "data": bytes(received),
+            "chunks": chunks,
+            "elapsed_s": elapsed,
+            "bytes_per_s": throughput,
+        }
+    
+    def _select(self, cs_pin: int):
+        from lib.hal import GPIO
+        GPIO.setwarnings(False)
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setup(cs_pin, GPIO.OUT, initial=GPIO.HIGH)
+        self.spi.no_cs = True
+        GPIO.output(cs_pin, GPIO.LOW)
+    
+    def _release(self, cs_pin: int):
+        from lib.hal import GPIO
+        GPIO.output(cs_pin, GPIO.HIGH)
+        self.spi.no_cs = False
+    
+    def loopback_test(self, speed_hz: int, mode: int = 0, length: int = 4096, frames: int = 4,
+                      seed: int = 0, echo_offset: int = 0) -> dict:
+        """
+        Bit-error-rate test through a loopback at one clock speed and mode
+        
+        Parameters:
+        -----------
+        speed_hz : int
+            SPI clock to test
+        mode : int
+            SPI mode (0, 1, 2, or 3)
+        length : int
+            Bytes per frame (chunked like transfer_bytes)
+        frames : int
+            Number of pseudo-random frames to send
+        seed : int
+            Pattern seed, so a failing run can be repeated exactly
+        echo_offset : int
+            Bytes by which an echo device's reply lags MOSI (0 for a wire loopback)
+        """
+        if not 0 <= echo_offset < length:
+            return {"success": False, "message": "Error: echo_offset must be smaller than the frame length",
+                    "speed_hz": speed_hz, "mode": mode}
+        saved = (self.spi.mode, self.spi.max_speed_hz)
+        rng = random.Random(f"{seed}:{speed_hz}:{mode}")
+        bit_errors = bits = 0
+        elapsed = 0.0
+        try:
+            self.spi.mode = mode
+            self.spi.max_speed_hz = speed_hz
+            for _ in range(frames):
+                pattern = rng.randbytes(length)
+                result = self.transfer_bytes(pattern)
+                if not result["success"]:
+                    return {"success": False, "message": result["message"], "speed_hz": speed_hz, "mode": mode}
+                sent, received = pattern[:length - echo_offset], result["data"][echo_offset:]
+                bit_errors += count_bit_errors(sent, received)
+                bits += 8 * len(sent)
+                elapsed += result["elapsed_s"]
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}", "speed_hz": speed_hz, "mode": mode}
+        finally:
+            self.spi.mode, self.spi.max_speed_hz = saved
+        ber = bit_errors / bits if bits else 0.0
+        throughput = frames * length / elapsed if elapsed else 0.0
+        return {
+            "success": True,
+            "message": (f"{speed_hz / 1e6:g} MHz mode {mode}: {bit_errors} bit error(s) in {bits} bits "
+                        f"(BER {ber:.2e}), {throughput / 1000:.1f} kB/s {'CLEAN' if not bit_errors else 'ERRORS'}"),
+            "speed_hz": speed_hz,
+            "mode": mode,
+            "bits": bits,
+            "bit_errors": bit_errors,
+            "ber": ber,
+            "bytes_per_s": throughput,
+        }
+    
     def set_mode(self, mode: int) -> dict:
         """Change SPI mode"""
         try:
@@ -2,12 +2,32 @@
 """
 Custom UART Communication for Test Jig Web Interface
 Enhanced with flow control and advanced operations
+
+Each open port is drained continuously by a background SerialReader
+(lib.UART.reader) into a ring buffer; read, read_line, read_all and
+write_read take bytes from that ring, so nothing received between
+requests is lost, and GET /uart/live can watch the same stream. The
+reader receives straight into the ring (lib.UART.fastserial), and line
+ends and terminators are searched for in the ring without copying.
+
+request() is the request/response primitive: it writes, then returns
+as soon as the response reaches an expected length, ends with a
+terminator or matches a regex, or its deadline passes, and reports the
+device's response latency from the ring's arrival timestamps.
+
+Received bytes are recorded into an active capture (lib.capture) when
+they are taken from the ring, in the caller's context; the reader thread
+receives them outside it.
 """
 
-import serial
+import re
 import time
 from typing import Optional, Union, List
 
+from lib.capture import ACTIVE, NO_ADDRESS
+from lib.hal import serial
+from lib.UART.reader import SerialReader
+
 
 class CustomUART:
     """Custom UART communication class for web interface with full control"""
@@ -74,11 +94,38 @@ class CustomUART:
             rtscts=rtscts,
             dsrdtr=dsrdtr
         )
+        self.reader = SerialReader(self.serial, name=port).start()
+        self.ring = self.reader.ring
+        self.rx_offset = 0  # next ring offset the read methods return
+
+    def _available(self) -> int:
+        return self.ring.end - self.rx_offset
+
+    def _wait_for(self, predicate, extra: float = 0.0) -> bool:
+        """Wait up to the port timeout (plus extra) for predicate(ring) or the reader stopping"""
+        if self.reader.running:
+            self.reader.drain()
+        timeout = None if self.serial.timeout is None else self.serial.timeout + extra
+        return self.ring.wait(lambda ring: predicate(ring) or not self.reader.running, timeout)
+
+    def _take(self, size: Optional[int] = None) -> bytes:
+        """Consume up to size received bytes (all of them by default)"""
+        data, offset, _ = self.ring.peek(self.rx_offset, size)
+        if not data and self.reader.error:
+            raise serial.SerialException(self.reader.error)  # the port went away
+        self.rx_offset = offset + len(data)
+        session = ACTIVE.get()
+        if data and session is not None:
+            session.bus("read", NO_ADDRESS, b"", data)
+        return data
     
-    def write(self, data: Union[str, List[int]]) -> dict:
+    def write(self, data: Union[str, List[int], bytes]) -> dict:
         """Write data to UART"""
         try:
-            if isinstance(data, str):
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                bytes_written = self.serial.write(data)
+                return {"success": True, "message": f"Written {bytes_written} bytes"}
+            elif isinstance(data, str):
                 bytes_written = self.serial.write(data.encode('utf-8'))
                 return {"success": True, "message": f"Written {bytes_written} bytes: {data}"}
             elif isinstance(data, list):
@@ -90,7 +137,8 @@ class CustomUART:
     def read(self, size: int = 1) -> dict:
         """Read bytes from UART"""
         try:
-            data = self.serial.read(size)
+            self._wait_for(lambda ring: ring.end - self.rx_offset >= size)
+            data = self._take(size)
             if data:
                 return {"success": True, "message": f"Read {len(data)} bytes: {data.hex()}", "data": data.hex()}
             else:
@@ -101,7 +149,10 @@ class CustomUART:
     def read_line(self) -> dict:
         """Read a line from UART"""
         try:
-            line = self.serial.readline().decode('utf-8', errors='ignore').strip()
+            self._wait_for(lambda ring: ring.find(b"\n", self.rx_offset) >= 0)
+            newline = self.ring.find(b"\n", self.rx_offset)
+            size = newline + 1 - max(self.rx_offset, self.ring.start) if newline >= 0 else None
+            line = self._take(size).decode('utf-8', errors='ignore').strip()
             return {"success": True, "message": f"Read line: {line}", "data": line}
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
@@ -109,7 +160,8 @@ class CustomUART:
     def read_all(self) -> dict:
         """Read all available data"""
         try:
-            data = self.serial.read(self.serial.in_waiting or 1)
+            self._wait_for(lambda ring: ring.end > self.rx_offset)
+            data = self._take()
             if data:
                 return {"success": True, "message": f"Read {len(data)} bytes: {data.hex()}", "data": data.hex()}
             else:
@@ -123,6 +175,7 @@ class CustomUART:
             self.serial.flush()
             self.serial.reset_input_buffer()
             self.serial.reset_output_buffer()
+            self.rx_offset = self.ring.end  # drop what the reader already received
             return {"success": True, "message": "Buffers flushed"}
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
@@ -130,7 +183,7 @@ class CustomUART:
     def in_waiting(self) -> dict:
         """Get number of bytes in input buffer"""
         try:
-            count = self.serial.in_waiting
+            count = self._available()
             return {"success": True, "message": f"Bytes in input buffer: {count}", "count": count}
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
@@ -144,14 +197,105 @@ class CustomUART:
             return {"success": False, "message": f"Error: {e}"}
     
     def write_read(self, data: Union[str, List[int]], read_size: int = 1024, delay: float = 0.1) -> dict:
-        """Write data and read response"""
+        """Write data and read response (as soon as read_size bytes are in, at most delay + timeout)"""
         try:
             write_result = self.write(data)
             if not write_result["success"]:
                 return write_result
-            time.sleep(delay)
-            read_result = self.read(read_size)
-            return {"success": True, "message": f"Write: {write_result['message']}, Read: {read_result['message']}", "data": read_result.get("data", "")}
+            self._wait_for(lambda ring: ring.end - self.rx_offset >= read_size, delay)
+            data = self._take(read_size)  # whatever arrived by the deadline; no second wait
+            read_message = f"Read {len(data)} bytes: {data.hex()}" if data else "No data received"
+            return {"success": True, "message": f"Write: {write_result['message']}, Read: {read_message}", "data": data.hex()}
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}"}
+    
+    def request(self, data: Union[str, List[int], bytes], size: Optional[int] = None,
+                terminator: Optional[bytes] = None, pattern: Optional[str] = None,
+                timeout: float = 1.0, flush: bool = True) -> dict:
+        """
+        Write data and return the response as soon as it is complete
+
+        Parameters:
+        -----------
+        data : str, list of int or bytes
+            Request to send
+        size : int
+            Response is complete at this many bytes
+        terminator : bytes
+            Response is complete once it ends with this sequence (e.g. b"\r\n")
+        pattern : str
+            Response is complete once this regex matches it (e.g. "OK|ERROR")
+        timeout : float
+            Deadline in seconds from the end of the write
+        flush : bool
+            Discard input received before the request
+
+        The first criterion met ends the response; bytes after it stay
+        buffered for the next read. With no criterion, the first bytes to
+        arrive are the response.
+        """
+        try:
+            regex = re.compile(pattern.encode("utf-8")) if pattern else None
+            if flush:
+                self.reader.drain()
+                self.rx_offset = self.ring.end
+            start = self.rx_offset
+            payload = data.encode("utf-8") if isinstance(data, str) else bytes(data)
+            self.serial.write(payload)
+            sent = time.time()
+            found = []
+
+            def complete(ring) -> bool:
+                received = ring.end - start
+                ends = []
+                if size and received >= size:
+                    ends.append((size, "length"))
+                if terminator:
+                    at = ring.find(terminator, start)  # in place, without copying the response
+                    if at >= 0:
+                        ends.append((at - start + len(terminator), "terminator"))
+                if regex is not None:
+                    match = regex.search(ring.peek(start)[0])
+                    if match:
+                        ends.append((match.end(), "pattern"))
+                if not (size or terminator or regex) and received:
+                    ends.append((received, "data"))
+                if ends:
+                    found.append(min(ends))
+                return bool(ends) or not self.reader.running
+
+            self.reader.drain()
+            self.ring.wait(complete, timeout)
+            end, matched = found[-1] if found else (None, None)
+            response = self._take(end) if end is not None else self._take()
+            first_byte_ms = (self.ring.arrived(start) - sent) * 1000 if response else None
+            latency_ms = (self.ring.arrived(start + len(response) - 1) - sent) * 1000 if response else None
+            text = response.decode("utf-8", errors="replace").strip()
+            printable = text.replace("\r", "").replace("\n", "").replace("\t", "").isprintable()
+            shown = text.replace("\r", "\\r").replace("\n", "\\n") if printable else response.hex()
+            if matched is None:
+                return {"success": False, "matched": None, "data": response.hex(), "latency_ms": latency_ms,
+                        "first_byte_ms": first_byte_ms,
+                        "message": f"Timeout: no complete response within {timeout * 1000:.0f} ms "
+                                   f"({len(response)} bytes received{': ' + shown if response else ''})"}
+            return {"success": True, "matched": matched, "data": response.hex(), "text": text,
+                    "latency_ms": latency_ms, "first_byte_ms": first_byte_ms,
+                    "message": f"Response ({matched}, {len(response)} bytes): {shown}"}
+        except Exception as e:
+            return {"success": False, "message": f"Error: {e}"}
+    
+    def transfer_bytes(self, data: bytes, read_size: int = 0, delay: float = 0.1) -> dict:
+        """Write a buffer, then read up to read_size bytes as "data" (as soon as they are in, at most delay + timeout)"""
+        try:
+            start = time.perf_counter()
+            written = self.serial.write(data)
+            received = b""
+            if read_size:
+                self._wait_for(lambda ring: ring.end - self.rx_offset >= read_size, delay)
+                received = self._take(read_size)
+            elapsed = time.perf_counter() - start
+            return {"success": True, "message": f"Written {written} bytes, read {len(received)} bytes in {elapsed * 1000:.1f} ms",
+                    "data": received}
         except Exception as e:
             return {"success": False, "message": f"Error: {e}"}
     
@@ -224,10 +368,12 @@ class CustomUART:
             "xonxoff": self.serial.xonxoff,
             "rtscts": self.serial.rtscts,
             "dsrdtr": self.serial.dsrdtr,
-            "is_open": self.serial.is_open
+            "is_open": self.serial.is_open,
+            "reader": self.reader.stats()
         }
     
     def close(self):
         """Close UART connection"""
+        self.reader.stop()
         if self.serial.is_open:
             self.serial.close()
@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+"""
+Macro recorder and replayer for the custom I2C/SPI/UART consoles
+
+While a recording is active, every /run-custom-i2c, /run-custom-spi and
+/run-custom-uart operation is appended to the macro with its parameters
+and the response lines it produced. Stopping saves the macro as JSON in
+MACRO_DIR:
+
+    {"name": "eeprom_check", "created": 1700000000.0, "steps": [
+        {"protocol": "i2c", "params": {"operation": "write_byte_data", ...},
+         "response": ["Written to register 0x10: 0xA5"], "at_s": 4.2, "duration_ms": 0.4},
+        ...]}
+
+Replaying runs the steps back to back on the server, at bus speed
+instead of click speed, and compares each step's response with the
+recorded one. Instance setup lines ("... initialized ...") depend on what
+the console did before, and measured latencies ("Latency: ...") on the
+device's timing, so both are ignored; a step whose response is
+expected to vary (a live sensor value) can be given "check": false in
+the file.
+"""
+
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from typing import List, Optional
+
+MACRO_DIR = "macros"
+PROTOCOLS = ("i2c", "spi", "uart")
+VOLATILE = re.compile(r"\binitialized\b|^Latency: ")
+
+# set while a macro is replaying, so its steps are not recorded again
+REPLAYING = contextvars.ContextVar("macro_replaying", default=False)
+
+
+def macro_path(name: str) -> str:
+    name = os.path.basename(name)
+    return os.path.join(MACRO_DIR, name if name.endswith(".json") else name + ".json")
+
+
+def list_macros() -> list:
+    if not os.path.isdir(MACRO_DIR):
+        return []
+    macros = []
+    for name in sorted(os.listdir(MACRO_DIR)):
+        if name.endswith(".json"):
+            try:
+                macro = load_macro(name)
+            except (OSError, ValueError):
+                continue
+            macros.append({"name": macro["name"], "steps": len(macro["steps"]),
+                           "created": macro.get("created"), "description": macro.get("description", "")})
+    return macros
+
+
+def load_macro(name: str) -> dict:
+    with open(macro_path(name)) as f:
+        macro = json.load(f)
+    steps = macro.get("steps") if isinstance(macro, dict) else None
+    if not isinstance(steps, list):
+        raise ValueError(f"Macro '{name}' has no 'steps' list")
+    for number, step in enumerate(steps, 1):
+        if step.get("protocol") not in PROTOCOLS or not isinstance(step.get("params"), dict):
+            raise ValueError(f"Macro '{name}' step {number}: needs a protocol {PROTOCOLS} and params")
+    macro.setdefault("name", os.path.splitext(os.path.basename(name))[0])
+    return macro
+
+
+def save_macro(macro: dict) -> str:
+    os.makedirs(MACRO_DIR, exist_ok=True)
+    path = macro_path(macro["name"])
+    with open(path + ".tmp", "w") as f:
+        json.dump(macro, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def comparable(lines: List[str]) -> List[str]:
+    """Response lines that should repeat on replay (setup and latency lines dropped)"""
+    return [line for line in lines if not VOLATILE.search(line)]
+
+
+# ==================== RECORDING ====================
+
+class MacroRecorder:
+    """Collects custom console operations into a macro while recording"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.macro = None
+        self.started = None
+
+    @property
+    def recording(self) -> bool:
+        return self.macro is not None and not REPLAYING.get()
+
+    def start(self, name: str, description: str = "") -> dict:
+        """Begin a new macro (an unsaved recording in progress is discarded)"""
+        name = os.path.splitext(os.path.basename(name or ""))[0]
+        if not name:
+            raise ValueError("A macro needs a name")
+        with self.lock:
+            self.macro = {"name": name, "description": description, "created": time.time(), "steps": []}
+            self.started = time.monotonic()
+        return self.status()
+
+    def add(self, protocol: str, params: dict, response: List[str], duration_ms: float):
+        with self.lock:
+            if self.macro is None:
+                return
+            self.macro["steps"].append({
+                "protocol": protocol,
+                "params": params,
+                "response": response,
+                "at_s": round(time.monotonic() - self.started, 3),
+                "duration_ms": round(duration_ms, 2),
+            })
+
+    def stop(self) -> dict:
+        """Save the macro being recorded and return its summary"""
+        with self.lock:
+            macro, self.macro = self.macro, None
+        if macro is None:
+            raise ValueError("No macro is being recorded")
+        path = save_macro(macro)
+        return {"name": macro["name"], "steps": len(macro["steps"]), "path": path}
+
+    def status(self) -> Optional[dict]:
+        with self.lock:
+            if self.macro is None:
+                return None
+            return {"name": self.macro["name"], "steps": len(self.macro["steps"]),
+                    "elapsed_s": round(time.monotonic() - self.started, 1)}
+
+
+RECORDER = MacroRecorder()
+
+
+# ==================== REPLAY CHECKS ====================
+
+def check_step(index: int, step: dict, response: List[str], duration_ms: float) -> dict:
+    """Compare a replayed step's response lines with the recorded ones"""
+    expected, actual = comparable(step.get("response", [])), comparable(response)
+    checked = step.get("check", True)
+    result = {
+        "step": index,
+        "protocol": step["protocol"],
+        "operation": step["params"].get("operation", ""),
+        "match": expected == actual or not checked,
+        "checked": checked,
+        "duration_ms": round(duration_ms, 2),
+    }
+    if expected != actual:
+        for line, (want, got) in enumerate(zip(expected + [None] * len(actual), actual + [None] * len(expected))):
+            if want != got:
+                result.update(line=line, expected=want, actual=got)
+                break
+    return result
+
+
+def report(macro: dict, results: list, duration_ms: float) -> dict:
+    mismatched = [r for r in results if not r["match"]]
+    steps = macro["steps"]
+    return {
+        "name": macro["name"],
+        "passed": not mismatched and len(results) == len(steps),
+        "steps": len(steps),
+        "run": len(results),
+        "matched": len(results) - len(mismatched),
+        "mismatched": len(mismatched),
+        "duration_ms": round(duration_ms, 1),
+        "recorded_s": steps[-1].get("at_s") if steps else 0,
+        "results": results,
+    }
+
+
+def format_report(result: dict) -> str:
+    lines = [f"{'✅' if result['passed'] else '❌'} Macro {result['name']}: {result['matched']}/{result['steps']} "
+             f"step(s) matched in {result['duration_ms']:.1f} ms (recorded over {result['recorded_s']:.1f} s)"]
+    for step in result["results"]:
+        if not step["match"]:
+            lines.append(f"  step {step['step']} {step['protocol']} {step['operation']}: "
+                         f"expected {step.get('expected')!r}, got {step.get('actual')!r}")
+    return "\n".join(lines)
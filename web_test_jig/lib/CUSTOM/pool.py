@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Session pools for the custom protocol consoles
+
+The custom console routes used to keep one instance per protocol and
+close it whenever the request named a different port or address, so
+alternating between two DUTs reopened the handle on every click. A
+SessionPool keeps one open instance per key instead:
+
+    UART_SESSIONS   serial port         "/dev/ttyUSB0"
+    I2C_SESSIONS    bus number          1 (one handle serves every address)
+    SPI_SESSIONS    (bus, chip select)  (0, 1), each with its own mode and speed
+
+
+    session, opened = UART_SESSIONS.get("/dev/ttyUSB0", baudrate=115200)
+    result = session.call(session.instance.read, 16)
+    session, _ = I2C_SESSIONS.get(1)
+    result = session.call(session.instance.addressed, 0x48, session.instance.read_byte)
+
+- every key keeps its own instance and the configuration it was opened
+  with, so several DUTs can be driven side by side; switching between
+  the devices on one I2C bus costs nothing
+- session.call() runs an operation under the session's lock, so requests
+  to one port are serialized while different ports run concurrently
+- a session unused for IDLE_TIMEOUT seconds is closed by a daemon reaper
+  thread; sessions in use (session.using(), e.g. a live monitor) are
+  never reaped
+
+The configuration given to get() applies when the session opens; later
+changes go through the instance (set_baudrate, set_mode, ...), as they
+did before. GET /metrics lists the open sessions under "sessions"
+and POST /cleanup-custom closes them.
+
+TESTJIG_SESSION_IDLE_S sets the idle timeout (0 keeps sessions open).
+"""
+
+import contextlib
+import os
+import threading
+import time
+
+IDLE_TIMEOUT = float(os.environ.get("TESTJIG_SESSION_IDLE_S", "300"))
+REAP_INTERVAL = 5.0
+
+
+class Session:
+    """One open instance in a pool"""
+
+    def __init__(self, key, instance, config: dict):
+        self.key = key
+        self.instance = instance
+        self.config = config
+        self.lock = threading.RLock()  # held for each operation
+        self._active_lock = threading.Lock()
+        self.opened = time.monotonic()
+        self.last_used = self.opened
+        self.calls = 0
+        self.active = 0  # callers currently using the session
+        self.closed = False
+
+    def call(self, method, *args, **kwargs):
+        """Run method under the session lock"""
+        with self.lock:
+            self.last_used = time.monotonic()
+            self.calls += 1
+            try:
+                return method(*args, **kwargs)
+            finally:
+                self.last_used = time.monotonic()
+
+    @contextlib.contextmanager
+    def using(self):
+        """Keep the session from being reaped while a long-running caller holds it"""
+        with self._active_lock:
+            self.active += 1
+        try:
+            yield self
+        finally:
+            with self._active_lock:
+                self.active -= 1
+                self.last_used = time.monotonic()
+
+    def idle(self) -> float:
+        return 0.0 if self.active else time.monotonic() - self.last_used
+
+    def info(self) -> dict:
+        return {"key": list(self.key) if isinstance(self.key, tuple) else self.key, "config": self.config,
+                "calls": self.calls, "active": self.active,
+                "age_s": round(time.monotonic() - self.opened, 1), "idle_s": round(self.idle(), 1)}
+
+
+class SessionPool:
+    """Open instances keyed by port, closed after idle_timeout seconds unused"""
+
+    def __init__(self, name: str, factory, idle_timeout: float = IDLE_TIMEOUT):
+        """
+        Parameters:
+        -----------
+        name : str
+            Protocol name, for listings
+        factory : callable
+            factory(key, **config) opens a new instance
+        idle_timeout : float
+            Seconds a session may stay unused before it is closed (0 keeps them open)
+        """
+        self.name = name
+        self.factory = factory
+        self.idle_timeout = idle_timeout
+        self.sessions = {}
+        self.lock = threading.Lock()
+        self.opens = 0
+        self.reaped = 0
+        self._reaper = None
+
+    def get(self, key, **config):
+        """(session, opened): the session for key, opened with config if there is none"""
+        with self.lock:
+            session = self.sessions.get(key)
+            if session is not None:
+                return session, False
+            session = Session(key, self.factory(key, **config), config)
+            self.sessions[key] = session
+            self.opens += 1
+            self._start_reaper()
+            return session, True
+
+    def find(self, key):
+        with self.lock:
+            return self.sessions.get(key)
+
+    def close(self, key=None):
+        """Close one session, or all of them"""
+        with self.lock:
+            keys = list(self.sessions) if key is None else [key] if key in self.sessions else []
+            sessions = [self.sessions.pop(k) for k in keys]
+        for session in sessions:
+            self._close(session)
+        return len(sessions)
+
+    def _close(self, session: Session):
+        with session.lock:
+            session.closed = True
+            close = getattr(session.instance, "close", None)
+            if close is not None:
+                close()
+
+    def reap(self) -> int:
+        """Close the sessions idle for longer than idle_timeout"""
+        if not self.idle_timeout:
+            return 0
+        with self.lock:
+            idle = [key for key, session in self.sessions.items() if session.idle() > self.idle_timeout]
+            sessions = [self.sessions.pop(key) for key in idle]
+        for session in sessions:
+            try:
+                self._close(session)
+            except Exception:
+                pass  # the port may already be gone
+        self.reaped += len(sessions)
+        return len(sessions)
+
+    def _start_reaper(self):
+        if self._reaper is None or not self._reaper.is_alive():
+            self._reaper = threading.Thread(target=self._reap_loop, name=f"{self.name}-pool-reaper", daemon=True)
+            self._reaper.start()
+
+    def _reap_loop(self):
+        while True:
+            time.sleep(REAP_INTERVAL)
+            self.reap()
+            with self.lock:
+                if not self.sessions:
+                    self._reaper = None
+                    return
+
+    def stats(self) -> dict:
+        with self.lock:
+            sessions = list(self.sessions.values())
+        return {"open": len(sessions), "opens": self.opens, "reaped": self.reaped,
+                "idle_timeout_s": self.idle_timeout, "sessions": [session.info() for session in sessions]}
+
+
+# ==================== POOLS ====================
+
+def open_uart(port: str, **config):
+    from lib.CUSTOM.custom_uart import CustomUART
+    return CustomUART(port=port, **config)
+
+
+def open_i2c_bus(bus: int):
+    from lib.CUSTOM.custom_i2c import CustomI2C
+    return CustomI2C(bus=bus)
+
+
+def open_spi(key: tuple, **config):
+    from lib.CUSTOM.custom_spi import CustomSPI
+    bus, device = key
+    return CustomSPI(bus=bus, device=device, **config)
+
+
+UART_SESSIONS = SessionPool("uart", open_uart)
+I2C_SESSIONS = SessionPool("i2c", open_i2c_bus)
+SPI_SESSIONS = SessionPool("spi", open_spi)
+
+
+def stats() -> dict:
+    return {pool.name: pool.stats() for pool in (UART_SESSIONS, I2C_SESSIONS, SPI_SESSIONS)}
@@ -1,17 +1,17 @@
-import os
 import glob
 import time
+from lib import hal
 
 class DS18B20:
-    def __init__(self, base_dir='/sys/bus/w1/devices/'):
-        self.base_dir = base_dir
+    def __init__(self, base_dir=None):
+        self.base_dir = base_dir or hal.w1_base_dir()
         self.device_folder = self.get_device_folder()
         self.device_file = self.device_folder + '/w1_slave'
         self.initialize_sensor()
 
     def initialize_sensor(self):
-        os.system('modprobe w1-gpio')
-        os.system('modprobe w1-therm')
+        hal.modprobe('w1-gpio')
+        hal.modprobe('w1-therm')
 
     def get_device_folder(self):
         device_folders = glob.glob(self.base_dir + '28*')
@@ -1,5 +1,5 @@
-import RPi.GPIO as GPIO
 import time
+from lib.hal import GPIO
 
 class ButtonController:
     def __init__(self, button_pin):
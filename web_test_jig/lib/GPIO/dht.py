@@ -1,7 +1,5 @@
-import RPi.GPIO as GPIO
-import adafruit_dht
-import board
 import time
+from lib.hal import GPIO, adafruit_dht, board
 
 class DHTSensor:
     def __init__(self, pin):
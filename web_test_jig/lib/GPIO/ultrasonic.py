@@ -1,5 +1,5 @@
-import RPi.GPIO as GPIO
 import time
+from lib.hal import GPIO
 
 class UltrasonicSensor:
     def __init__(self, trigger_pin, echo_pin):
@@ -1,6 +1,6 @@
-import smbus2
 import time
-import smbus
+from lib.hal import open_i2c
+from lib.I2C.scan import SCANNER
 
 class BH1750:
     BH1750_ADDR = 0x23
@@ -18,32 +18,41 @@ class BH1750:
 
     def __init__(self, bus_number=1):
         self.bus_number = bus_number
-        self.bus = smbus.SMBus(bus_number)
+        self.bus = open_i2c(bus_number, "smbus")
+        self.data = bytearray(2)
 
     def scan_i2c_bus(self):
-        devices = []
-        for address in range(0x03, 0x78):
-            try:
-                self.bus.write_quick(address)
-                devices.append(f"Device: {hex(address)}")
-            except OSError:
-                pass
-        return devices
+        return [f"Device: {hex(address)}" for address in SCANNER.scan(self.bus_number, bus=self.bus)]
 
     def convert_to_lux(self, data):
         # Convert data to lux according to sensor documentation
         return ((data[1] + (256 * data[0])) / 1.2)
 
+    def start_measurement(self, mode=ONE_TIME_HIGH_RES_MODE, bus=None):
+        (bus or self.bus).write_byte(self.BH1750_ADDR, mode)
+
+    def read_result(self, bus=None):
+        # Read the latched measurement (call start_measurement and wait first)
+        bus = bus or self.bus
+        if hasattr(bus, "read_into"):
+            data = bus.read_into(self.BH1750_ADDR, self.data)  # plain 2-byte read into a reused buffer
+        else:
+            data = bus.read_i2c_block_data(self.BH1750_ADDR, 0x00, 2)  # Read data
+        return self.convert_to_lux(data)
+
+    def read_lux(self, mode=ONE_TIME_HIGH_RES_MODE, delay=0.2, bus=None):
+        self.start_measurement(mode, bus)  # Start a measurement
+        time.sleep(delay)  # Wait for measurement
+        return self.read_result(bus)
+
     def activate_gui(self, mode=ONE_TIME_HIGH_RES_MODE):
         try:
-            bus = smbus2.SMBus(self.bus_number)  # Open /dev/i2c-1
+            bus = open_i2c(self.bus_number)  # Open /dev/i2c-1
             try:
-                bus.write_byte(self.BH1750_ADDR, mode)  # Change mode as you like
-                time.sleep(0.2)  # Wait for measurement
-                data = bus.read_i2c_block_data(self.BH1750_ADDR, 0x00, 2)  # Read data
-                lux = self.convert_to_lux(data)
+                lux = self.read_lux(mode, bus=bus)
                 return(f"Light level: {lux:.2f} lx")
             except Exception as e:
+                SCANNER.invalidate(self.bus_number, self.BH1750_ADDR)
                 return(f"Error reading BH1750 sensor: {e}")
                 time.sleep(1)  # Wait for 1 second before the next read
         except KeyboardInterrupt:
@@ -52,7 +61,7 @@ class BH1750:
             print(f"An error occurred: {e}")
     def activate_cli(self, mode=ONE_TIME_HIGH_RES_MODE):
         try:
-            bus = smbus2.SMBus(self.bus_number)  # Open /dev/i2c-1
+            bus = open_i2c(self.bus_number)  # Open /dev/i2c-1
             while True:
                 try:
                     bus.write_byte(self.BH1750_ADDR, mode)  # Change mode as you like
@@ -1,4 +1,4 @@
-from smbus import SMBus
+from lib.hal import smbus
 from luma.core.interface.serial import i2c
 from luma.oled.device import sh1106
 from luma.core.render import canvas
@@ -10,7 +10,7 @@ class I2C_OLED:
     def __init__(self, bus_number=1, oled_address=0x3C):
         self.bus_number = bus_number
         self.oled_address = oled_address
-        self.bus = SMBus(bus_number)
+        self.bus = smbus.SMBus(bus_number)
         self.device_present = False
         self.check_device()
 
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+I2C backend built on the I2C_RDWR ioctl of /dev/i2c-N
+
+smbus/smbus2 issue one SMBus ioctl per call, return a fresh Python list
+for every block read and cap blocks at 32 bytes; busio.I2C on top of
+them is a third handle type for the same bus 1. I2CRdwr talks to the
+kernel with I2C_RDWR instead:
+
+    write_then_read(addr, tx, rx)   write tx, repeated START, read len(rx)
+                                    bytes into rx: one ioctl, no STOP between
+    read_into(addr, buffer)         plain read into a caller buffer
+    write(addr, data)               plain write
+    read_register(addr, reg, n)     write_then_read into the handle's own
+                                    buffer; returns a memoryview of it that
+                                    is valid until the next call
+
+The i2c_msg array, the ioctl argument and the transmit buffer are
+allocated once per handle, and a caller buffer that is passed again is
+not re-wrapped, so a driver that reads into its own bytearray does no
+allocation per read. Messages may be up to MAX_MESSAGE bytes, the
+i2c-dev limit, instead of 32.
+
+The smbus method set (read_i2c_block_data, write_byte, ...) and the
+busio.I2C interface (writeto, readfrom_into, writeto_then_readfrom,
+try_lock) are provided on top, so BH1750, MLX90614, CustomI2C and the
+Adafruit ADS1115 driver can all run on one I2CRdwr handle. Drivers get
+one through lib.hal.open_i2c() when TESTJIG_I2C_DRIVER=rdwr.
+"""
+
+import ctypes
+import fcntl
+import os
+import threading
+
+I2C_RDWR = 0x0707
+I2C_M_RD = 0x0001
+MAX_MESSAGE = 8192  # i2c-dev rejects longer messages with EINVAL
+
+# one-byte register pointers, shared so read_register never builds bytes
+REGISTERS = tuple(bytes([register]) for register in range(256))
+
+
+class i2c_msg(ctypes.Structure):
+    """struct i2c_msg from <linux/i2c.h>"""
+    _fields_ = [
+        ("addr", ctypes.c_uint16),
+        ("flags", ctypes.c_uint16),
+        ("len", ctypes.c_uint16),
+        ("buf", ctypes.c_void_p),
+    ]
+
+
+class i2c_rdwr_ioctl_data(ctypes.Structure):
+    """struct i2c_rdwr_ioctl_data from <linux/i2c-dev.h>"""
+    _fields_ = [
+        ("msgs", ctypes.POINTER(i2c_msg)),
+        ("nmsgs", ctypes.c_uint32),
+    ]
+
+
+def _check_length(length: int):
+    if length > MAX_MESSAGE:
+        raise ValueError(f"I2C message of {length} bytes exceeds the {MAX_MESSAGE}-byte limit")
+
+
+def _span(buffer, start: int, end):
+    """buffer[start:end] as a zero-copy view, or buffer itself when that is all of it"""
+    if start == 0 and (end is None or end == len(buffer)):
+        return buffer
+    return memoryview(buffer)[start:end]
+
+
+class I2CRdwr:
+    """/dev/i2c-N handle using combined I2C_RDWR transfers"""
+
+    def __init__(self, bus=None, buffer_size: int = 256):
+        self.bus = bus
+        self.fd = None
+        self.transfers = 0  # kernel calls issued, for diagnostics
+        self._tx = bytearray(MAX_MESSAGE)
+        self._rx = bytearray(max(1, min(buffer_size, MAX_MESSAGE)))
+        self._rx_view = memoryview(self._rx)
+        self._lock = threading.Lock()  # busio try_lock/unlock
+        self._setup_buffers()
+        if bus is not None:
+            self.open(bus)
+
+    # ---------- kernel interface (replaced by the simulated backend) ----------
+
+    def _setup_buffers(self):
+        self._msgs = (i2c_msg * 2)()
+        self._request = i2c_rdwr_ioctl_data(ctypes.cast(self._msgs, ctypes.POINTER(i2c_msg)), 0)
+        self._tx_address = ctypes.addressof((ctypes.c_char * len(self._tx)).from_buffer(self._tx))
+        self._rx_buffer = None  # (buffer, length, address) of the last caller buffer
+        self._rx_buffer_ref = None
+
+    def open(self, bus):
+        self.bus = bus
+        self.fd = os.open(f"/dev/i2c-{bus}", os.O_RDWR)
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+    def _address_of(self, buffer) -> int:
+        cached = self._rx_buffer
+        if cached is not None and cached[0] is buffer and cached[1] == len(buffer):
+            return cached[2]
+        wrapper = (ctypes.c_char * len(buffer)).from_buffer(buffer)
+        self._rx_buffer_ref = wrapper  # keeps the buffer exported while cached
+        self._rx_buffer = (buffer, len(buffer), ctypes.addressof(wrapper))
+        return self._rx_buffer[2]
+
+    def _transfer(self, address: int, tx, rx, length: int = None):
+        """One I2C_RDWR ioctl: a write of tx (unless None), then a read into rx (unless None)
+
+        length limits the read to the start of rx (default: all of it).
+        """
+        if self.fd is None:
+            raise OSError(9, "Bad file descriptor")
+        count = 0
+        if tx is not None:
+            size = len(tx)
+            _check_length(size)
+            self._tx[:size] = tx
+            msg = self._msgs[0]
+            msg.addr, msg.flags, msg.len, msg.buf = address, 0, size, self._tx_address
+            count = 1
+        if rx is not None:
+            length = len(rx) if length is None else length
+            _check_length(length)
+            msg = self._msgs[count]
+            msg.addr, msg.flags, msg.len = address, I2C_M_RD, length
+            msg.buf = self._address_of(rx) if length else self._tx_address
+            count += 1
+        self._request.nmsgs = count
+        self.transfers += 1
+        fcntl.ioctl(self.fd, I2C_RDWR, self._request)
+
+    # ---------- combined transfers ----------
+
+    def write_then_read(self, address: int, tx, rx):
+        """Write tx then read len(rx) bytes into rx with a repeated START"""
+        self._transfer(address, tx, rx)
+        return rx
+
+    def read_into(self, address: int, buffer):
+        """Read len(buffer) bytes into buffer"""
+        self._transfer(address, None, buffer)
+        return buffer
+
+    def write(self, address: int, data):
+        """Write data (bytes-like or list of ints) in one message"""
+        self._transfer(address, data if isinstance(data, (bytes, bytearray, memoryview)) else bytes(data), None)
+
+    def read_register(self, address: int, register: int, length: int) -> memoryview:
+        """Read length bytes from an 8-bit register into the handle's buffer"""
+        if length > len(self._rx):
+            _check_length(length)
+            self._rx = bytearray(length)
+            self._rx_view = memoryview(self._rx)
+        self._transfer(address, REGISTERS[register & 0xFF], self._rx, length)
+        return self._rx_view[:length]
+
+    # ---------- smbus compatibility (no 32-byte limit) ----------
+
+    def write_quick(self, i2c_addr: int, force=None):
+        self._transfer(i2c_addr, b"", None)
+
+    def read_byte(self, i2c_addr: int, force=None) -> int:
+        self._transfer(i2c_addr, None, self._rx, 1)
+        return self._rx[0]
+
+    def write_byte(self, i2c_addr: int, value: int, force=None):
+        self._transfer(i2c_addr, REGISTERS[value & 0xFF], None)
+
+    def read_byte_data(self, i2c_addr: int, register: int, force=None) -> int:
+        return self.read_register(i2c_addr, register, 1)[0]
+
+    def write_byte_data(self, i2c_addr: int, register: int, value: int, force=None):
+        self._transfer(i2c_addr, bytes((register & 0xFF, value & 0xFF)), None)
+
+    def read_word_data(self, i2c_addr: int, register: int, force=None) -> int:
+        view = self.read_register(i2c_addr, register, 2)
+        return view[0] | (view[1] << 8)
+
+    def write_word_data(self, i2c_addr: int, register: int, value: int, force=None):
+        self._transfer(i2c_addr, bytes((register & 0xFF, value & 0xFF, (value >> 8) & 0xFF)), None)
+
+    def read_i2c_block_data(self, i2c_addr: int, register: int, length: int, force=None) -> list:
+        return list(self.read_register(i2c_addr, register, length))
+
+    def write_i2c_block_data(self, i2c_addr: int, register: int, data, force=None):
+        self._transfer(i2c_addr, bytes([register & 0xFF, *data]), None)
+
+    # ---------- busio.I2C compatibility ----------
+
+    def try_lock(self) -> bool:
+        return self._lock.acquire(blocking=False)
+
+    def unlock(self):
+        self._lock.release()
+
+    def scan(self) -> list:
+        from lib.I2C.scan import SCANNER
+        return SCANNER.scan(self.bus, refresh=True, bus=self)
+
+    def writeto(self, address: int, buffer, *, start: int = 0, end: int = None):
+        self._transfer(address, _span(buffer, start, end), None)
+
+    def readfrom_into(self, address: int, buffer, *, start: int = 0, end: int = None):
+        self._transfer(address, None, _span(buffer, start, end))
+
+    def writeto_then_readfrom(self, address: int, buffer_out, buffer_in, *,
+                              out_start: int = 0, out_end: int = None,
+                              in_start: int = 0, in_end: int = None):
+        self._transfer(address, _span(buffer_out, out_start, out_end), _span(buffer_in, in_start, in_end))
+
+    def deinit(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
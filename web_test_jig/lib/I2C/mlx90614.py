@@ -1,14 +1,20 @@
-import smbus
 import time
+from lib.hal import open_i2c
 
 class MLX90614:
+    OBJECT_TEMP = b"\x07"
+
     def __init__(self):
-        self.bus = smbus.SMBus(1)
+        self.bus = open_i2c(1, "smbus")
         self.address = 0x5A
+        self.data = bytearray(2)
 
     def read_temperature(self):
         # Read two bytes of data from the object temperature register (0x07)
-        data = self.bus.read_i2c_block_data(self.address, 0x07, 2)
+        if hasattr(self.bus, "write_then_read"):
+            data = self.bus.write_then_read(self.address, self.OBJECT_TEMP, self.data)  # one combined transfer, no allocation
+        else:
+            data = self.bus.read_i2c_block_data(self.address, 0x07, 2)
         # Convert the data
         temp = (data[1] << 8 | data[0])
         temp = temp * 0.02 - 273.15  # Convert to Celsius
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+TCA9548A I2C multiplexer support and a channel-grouped DUT scheduler
+
+Several identical boards (same BH1750/MLX90614 addresses) can be tested
+at once by putting each behind its own channel of a TCA9548A on bus 1.
+Only the channels enabled in the mux's control byte are connected, so
+every transfer to a DUT must be preceded by the right channel selection.
+
+TCA9548A caches the control byte it last wrote and skips a selection
+that would not change it. The cache is dropped when a write fails or the
+bus has been recovered (lib.I2C.recovery), since the switch state is
+then unknown.
+
+MuxScheduler reads a set of devices on every DUT in rounds:
+
+    1. start conversions on every channel (BH1750 one-shot measurement)
+    2. wait once for the slowest conversion, which all DUTs then share
+    3. read the results, visiting the channels in reverse so the channel
+       selected last in step 1 needs no second switch
+
+so a round costs two switches per DUT instead of one per device read,
+and the conversion wait is paid once per round instead of once per DUT.
+Results are attributed per DUT.
+
+A device on the upstream bus answers whichever channel is selected, so a
+DUT sensor sharing its address would be read from the jig instead of the
+DUT (and an empty channel would pass). The scheduler probes each
+sensor's address with all channels disconnected before the first round
+and refuses the sensors that answer there (MuxScheduler.conflicts). GET /i2c/mux/run streams rounds and
+GET /i2c/mux/scan lists the addresses found on each channel.
+"""
+
+import threading
+import time
+
+from lib.hal import open_i2c
+
+MUX_ADDRESS = 0x70
+CHANNELS = 8
+
+
+# ==================== MUX ====================
+
+class TCA9548A:
+    """TCA9548A 1-to-8 I2C switch with a cached channel selection"""
+
+    def __init__(self, bus_number: int = 1, address: int = MUX_ADDRESS):
+        self.bus_number = bus_number
+        self.address = address
+        self.bus = open_i2c(bus_number)
+        self.lock = threading.RLock()  # held for a whole scheduler round
+        self.control = None  # control byte last written, None when unknown
+        self.switches = 0
+        self.skipped = 0
+        self._generation = self._bus_generation()
+
+    def _bus_generation(self) -> int:
+        from lib.I2C.recovery import MONITOR
+        return MONITOR.state(self.bus_number).generation
+
+    def select(self, channel) -> bool:
+        """Connect one channel (None disconnects all); False when it already was"""
+        control = 0 if channel is None else 1 << channel
+        if channel is not None and not 0 <= channel < CHANNELS:
+            raise ValueError(f"Mux channel must be 0-{CHANNELS - 1}, got {channel}")
+        generation = self._bus_generation()
+        with self.lock:
+            if control == self.control and generation == self._generation:
+                self.skipped += 1
+                return False
+            try:
+                self.bus.write_byte(self.address, control)
+            except OSError:
+                self.control = None
+                raise
+            self.control, self._generation = control, generation
+            self.switches += 1
+            return True
+
+    def invalidate(self):
+        """Forget the cached selection (the next select always writes)"""
+        with self.lock:
+            self.control = None
+
+    def scan_channels(self, channels=range(CHANNELS)) -> dict:
+        """Addresses answering with each channel connected, apart from the mux itself
+
+        The upstream bus answers whatever is selected; its own devices are
+        listed under None (all channels disconnected).
+        """
+        from lib.I2C.recovery import unmonitored
+        from lib.I2C.scan import FIRST_ADDRESS, LAST_ADDRESS, probe
+        found = {}
+        with self.lock:
+            try:
+                for channel in [None, *channels]:
+                    self.select(channel)
+                    with unmonitored():
+                        found[channel] = [address for address in range(FIRST_ADDRESS, LAST_ADDRESS + 1)
+                                          if address != self.address and probe(self.bus, address)]
+            finally:
+                self.select(None)
+        return found
+
+    def stats(self) -> dict:
+        return {"address": f"0x{self.address:02X}", "switches": self.switches, "skipped": self.skipped,
+                "selected": None if self.control is None else
+                [channel for channel in range(CHANNELS) if self.control & (1 << channel)]}
+
+
+MUXES = {}
+MUXES_LOCK = threading.Lock()
+
+
+def get_mux(bus_number: int = 1, address: int = MUX_ADDRESS) -> TCA9548A:
+    """The shared TCA9548A for a bus and address (one cache per physical switch)"""
+    with MUXES_LOCK:
+        if (bus_number, address) not in MUXES:
+            MUXES[(bus_number, address)] = TCA9548A(bus_number, address)
+        return MUXES[(bus_number, address)]
+
+
+# ==================== READERS ====================
+# Each factory opens the device once and returns (measurement name,
+# address, conversion delay in seconds, start callable or None, read callable).
+
+def bh1750_reader():
+    from lib.I2C.BH1750 import BH1750
+    sensor = BH1750()
+    return "lux", sensor.BH1750_ADDR, 0.18, sensor.start_measurement, sensor.read_result
+
+
+def mlx90614_reader():
+    from lib.I2C.mlx90614 import MLX90614
+    sensor = MLX90614()
+    return "object_temp", sensor.address, 0.0, None, sensor.read_temperature
+
+
+READERS = {
+    "bh1750": bh1750_reader,
+    "mlx90614": mlx90614_reader,
+}
+
+
+# ==================== SCHEDULER ====================
+
+class MuxScheduler:
+    """Reads the same devices on every DUT behind a mux, grouped by channel"""
+
+    def __init__(self, mux: TCA9548A, duts: dict, devices=("bh1750", "mlx90614"), release: bool = True):
+        """
+        Parameters:
+        -----------
+        mux : TCA9548A
+            The switch the DUTs sit behind
+        duts : dict
+            DUT name -> mux channel (one DUT per channel)
+        devices : sequence
+            Device names from READERS to read on every DUT
+        release : bool
+            Disconnect all channels after each round, so the jig's own
+            sensors on the upstream bus are reachable again
+
+        Raises ValueError when every device answers on the upstream bus.
+        """
+        channels = list(duts.values())
+        if len(set(channels)) != len(channels):
+            raise ValueError("Each DUT needs its own mux channel")
+        unknown = [name for name in devices if name not in READERS]
+        if unknown:
+            raise ValueError(f"No mux reader for {', '.join(unknown)}. Known: {', '.join(READERS)}")
+        self.mux = mux
+        self.duts = dict(duts)
+        self.release = release
+        readers = {name: READERS[name]() for name in devices}
+        self.conflicts = {name: reader[1] for name, reader in self._upstream(readers).items()}
+        if len(self.conflicts) == len(readers):
+            raise ValueError(f"{format_conflict(self.conflicts)}; nothing is left to read behind the mux")
+        self.devices = [name for name in readers if name not in self.conflicts]
+        self.readers = [readers[name] for name in self.devices]
+        self.delay = max(delay for _, _, delay, _, _ in self.readers)
+
+    def _upstream(self, readers: dict) -> dict:
+        """The readers whose address answers with every mux channel disconnected"""
+        from lib.I2C.recovery import unmonitored
+        from lib.I2C.scan import probe
+        with self.mux.lock:
+            self.mux.select(None)
+            with unmonitored():
+                return {name: reader for name, reader in readers.items() if probe(self.mux.bus, reader[1])}
+
+    def _channel_order(self) -> list:
+        """DUT channels ascending, rotated to begin at the currently selected one"""
+        channels = sorted(self.duts.values())
+        current = self.mux.control
+        for index, channel in enumerate(channels):
+            if current == 1 << channel:
+                return channels[index:] + channels[:index]
+        return channels
+
+    def _visit(self, order: list, results: dict, phase: int):
+        names = {channel: dut for dut, channel in self.duts.items()}
+        for channel in order:
+            dut = names[channel]
+            try:
+                self.mux.select(channel)
+            except OSError as e:
+                for measurement, _, _, _, _ in self.readers:
+                    results[dut]["errors"].setdefault(measurement, f"mux select failed: {e}")
+                continue
+            for measurement, _, _, start, read in self.readers:
+                if measurement in results[dut]["errors"]:
+                    continue  # its conversion never started
+                try:
+                    if phase == 0:
+                        if start is not None:
+                            start()
+                    else:
+                        results[dut]["measurements"][measurement] = read()
+                except OSError as e:
+                    self.mux.invalidate()
+                    results[dut]["errors"][measurement] = str(e)
+
+    def run_round(self) -> dict:
+        """Read every device on every DUT once"""
+        switches, skipped = self.mux.switches, self.mux.skipped
+        results = {dut: {"channel": channel, "measurements": {}, "errors": {}} for dut, channel in self.duts.items()}
+        started = time.perf_counter()
+        with self.mux.lock:
+            order = self._channel_order()
+            if any(start is not None for _, _, _, start, _ in self.readers):
+                self._visit(order, results, 0)
+                time.sleep(max(0.0, self.delay - (time.perf_counter() - started)))
+                order.reverse()
+            self._visit(order, results, 1)
+            if self.release:
+                try:
+                    self.mux.select(None)
+                except OSError:
+                    pass  # reported through the channel selections that failed
+        return {
+            "duts": results,
+            "switches": self.mux.switches - switches,
+            "skipped": self.mux.skipped - skipped,
+            # one selection per device access when the devices are read one at a time across the DUTs
+            "unscheduled_switches": len(self.duts) * sum(2 if start else 1 for _, _, _, start, _ in self.readers),
+            "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        }
+
+
+def format_conflict(conflicts: dict) -> str:
+    devices = ", ".join(f"{name} (0x{address:02X})" for name, address in conflicts.items())
+    return f"{devices} answer{'s' if len(conflicts) == 1 else ''} on the upstream bus, so every channel would read it"
+
+
+def format_round(number: int, result: dict) -> list:
+    lines = []
+    for dut, entry in result["duts"].items():
+        values = ", ".join(f"{name}={value:.2f}" for name, value in entry["measurements"].items())
+        errors = ", ".join(f"{name}: {error}" for name, error in entry["errors"].items())
+        mark = "❌" if entry["errors"] else "✅"
+        lines.append(f"{mark} Round {number} {dut} (ch {entry['channel']}): {values}{' | ' + errors if errors else ''}")
+    lines.append(f"Round {number}: {result['duration_ms']:.1f} ms, {result['switches']} mux switch(es) "
+                 f"({result['unscheduled_switches']} reading device by device), {result['skipped']} skipped")
+    return lines
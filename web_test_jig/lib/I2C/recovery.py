@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Automatic recovery of a stuck I2C bus
+
+A target that is interrupted mid-byte (a reset of the Pi side, a glitch,
+a hot-plugged DUT) can keep holding SDA low while it waits for the clocks
+of the rest of its byte. The controller then cannot generate a START and
+every later transfer on the bus fails, for every device, until the
+target is power-cycled or given those clocks.
+
+Handles opened through lib.hal.open_i2c() / open_busio_i2c() come back
+wrapped in a GuardedBus, which reports each transfer's outcome to
+MONITOR. STUCK_THRESHOLD timeout-class failures in a row (TIMEOUT_ERRNOS)
+make the bus a suspect. A NACK never counts and ends the run: a target
+that did not answer means the controller could clock out its address,
+which it cannot do on a stuck bus, and operators probing absent
+addresses must not set off a recovery.
+
+A suspect bus is checked before anything is done to it: SDA is sampled
+with lib.hal.read_pin_level(), which leaves the pin in its I2C function.
+Only when SDA is held low is the bus recovered:
+
+    1. SDA and SCL are switched to GPIO; SCL is clocked (up to
+       CLOCK_PULSES times) until the target releases SDA
+    2. a STOP condition is sent (SDA rising while SCL is high)
+    3. the controller's driver is unbound and rebound through sysfs
+       (lib.hal.rebind_i2c), which resets it and gives the pins back to I2C
+
+after which every guarded handle on the bus reopens itself and the
+failed transfer is retried once. With SDA high (or unreadable) the
+controller is left alone. Either way the check runs at most once per
+COOLDOWN_S per bus. Presence probes (lib.I2C.scan) run unmonitored(),
+so a recovery never starts inside a scan that holds the scanner's lock.
+Counts are kept per bus for GET /metrics, and POST /i2c/recover runs the
+same check and sequence by hand.
+
+TESTJIG_I2C_RECOVERY=0 disables the guard.
+"""
+
+import collections
+import contextlib
+import errno
+import os
+import threading
+import time
+
+from lib import hal
+from lib.capture import TAPPED_METHODS
+from lib.I2C.scan import SCANNER
+
+ENABLED = os.environ.get("TESTJIG_I2C_RECOVERY", "1").strip().lower() not in ("0", "false", "no")
+STUCK_THRESHOLD = 3
+TIMEOUT_ERRNOS = {errno.ETIMEDOUT, errno.EIO, errno.EAGAIN}
+CLOCK_PULSES = 9  # enough for the rest of any byte plus its ACK bit
+HALF_PERIOD = 5e-6  # 100 kHz; time.sleep rounds this up, which is harmless
+COOLDOWN_S = 2.0
+
+# bus -> (SDA, SCL) BCM pins on the 40-pin header
+I2C_PINS = {0: (0, 1), 1: (2, 3)}
+
+# transfer methods whose failures count (the same set the capture taps record)
+I2C_METHODS = TAPPED_METHODS["i2c"]
+
+
+# ==================== RECOVERY SEQUENCE ====================
+
+def clock_out(sda: int, scl: int) -> dict:
+    """Clock SCL from GPIO until the target releases SDA, then send a STOP"""
+    from lib.hal import GPIO
+    GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(sda, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    GPIO.setup(scl, GPIO.OUT, initial=GPIO.HIGH)
+    try:
+        sda_was_low = not GPIO.input(sda)
+        pulses = 0
+        while pulses < CLOCK_PULSES and not GPIO.input(sda):
+            GPIO.output(scl, GPIO.LOW)
+            time.sleep(HALF_PERIOD)
+            GPIO.output(scl, GPIO.HIGH)
+            time.sleep(HALF_PERIOD)
+            pulses += 1
+        # STOP: SDA low while SCL is low, then SCL high, then SDA high
+        GPIO.output(scl, GPIO.LOW)
+        GPIO.setup(sda, GPIO.OUT, initial=GPIO.LOW)
+        time.sleep(HALF_PERIOD)
+        GPIO.output(scl, GPIO.HIGH)
+        time.sleep(HALF_PERIOD)
+        GPIO.setup(sda, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+        time.sleep(HALF_PERIOD)
+        released = bool(GPIO.input(sda))
+    finally:
+        GPIO.cleanup([sda, scl])
+    return {"sda_was_low": sda_was_low, "pulses": pulses, "released": released}
+
+
+def recover(bus_number: int) -> dict:
+    """Sample SDA and, when a target holds it low, run the recovery sequence; report what was done"""
+    start = time.perf_counter()
+    result = {"bus": bus_number, "at": time.time(), "sda_was_low": None, "pulses": 0,
+              "released": None, "rebound": False, "error": None}
+    try:
+        if bus_number not in I2C_PINS:
+            raise ValueError(f"no SDA/SCL pins known for bus {bus_number}")
+        sda, scl = I2C_PINS[bus_number]
+        level = hal.read_pin_level(sda)
+        if level is None:
+            raise OSError(errno.ENOTSUP, f"cannot read the level of SDA (GPIO {sda}) without pinctrl/raspi-gpio")
+        if level:
+            result.update(sda_was_low=False, released=True)  # not stuck: leave the controller alone
+        else:
+            result.update(clock_out(sda, scl))
+            hal.rebind_i2c(bus_number)
+            result["rebound"] = True
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["ok"] = result["error"] is None and result["rebound"] and result["released"] is not False
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 2)
+    if result["rebound"]:
+        SCANNER.invalidate(bus_number)  # devices may have come back (or gone)
+    return result
+
+
+def format_recovery(result: dict) -> str:
+    if result["error"]:
+        return f"❌ I2C bus {result['bus']} recovery failed: {result['error']}"
+    if result["released"] is False:
+        return (f"❌ I2C bus {result['bus']}: SDA still held low after {result['pulses']} clock pulse(s); "
+                f"the target needs a power cycle")
+    if not result["sda_was_low"]:
+        return f"⚠️ I2C bus {result['bus']}: SDA is not held low, nothing to recover (controller left bound)"
+    return (f"✅ I2C bus {result['bus']} recovered in {result['duration_ms']:.1f} ms "
+            f"(SDA released after {result['pulses']} clock pulse(s), controller rebound)")
+
+
+# ==================== FAILURE MONITOR ====================
+
+class BusState:
+    """Failure history and recovery counts of one bus"""
+
+    def __init__(self, bus_number: int):
+        self.bus_number = bus_number
+        self.lock = threading.Lock()
+        self.failures = collections.deque(maxlen=STUCK_THRESHOLD)  # (address, errno) since the last success
+        self.generation = 0  # bumped by every recovery; guarded handles opened before it reopen
+        self.errors = 0
+        self.detected = 0
+        self.not_stuck = 0  # checks that found SDA released
+        self.recoveries = 0
+        self.recovered = 0
+        self.last = None
+        self.last_at = 0.0
+
+
+def looks_stuck(failures) -> bool:
+    """True for a run of timeouts long enough to suspect a target holding SDA"""
+    return len(failures) >= STUCK_THRESHOLD and all(code in TIMEOUT_ERRNOS for _, code in failures)
+
+
+class BusMonitor:
+    """Watches guarded transfers and recovers buses that look stuck"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.buses = {}
+
+    def state(self, bus_number: int) -> BusState:
+        with self.lock:
+            if bus_number not in self.buses:
+                self.buses[bus_number] = BusState(bus_number)
+            return self.buses[bus_number]
+
+    def success(self, state: BusState):
+        with state.lock:
+            state.failures.clear()
+
+    def failure(self, state: BusState, address, error: OSError, generation: int) -> bool:
+        """Record a failed transfer; True when the caller should reopen its handle and retry"""
+        with state.lock:
+            if state.generation != generation:
+                return True  # the bus was recovered while this transfer was failing
+            state.errors += 1
+            if error.errno not in TIMEOUT_ERRNOS:
+                state.failures.clear()  # a NACK: the address went out, so the bus is not stuck
+                return False
+            state.failures.append((address, error.errno))
+            if not looks_stuck(state.failures) or time.monotonic() - state.last_at < COOLDOWN_S:
+                return False
+            state.detected += 1
+            return self._recover(state)["ok"]
+
+    def recover(self, bus_number: int) -> dict:
+        """Recover a bus on request, whatever its failure history"""
+        state = self.state(bus_number)
+        with state.lock:
+            return self._recover(state)
+
+    def _recover(self, state: BusState) -> dict:
+        result = recover(state.bus_number)
+        if result["sda_was_low"] is False:
+            state.not_stuck += 1
+        else:
+            state.recoveries += 1
+            state.recovered += result["ok"]
+        if result["rebound"]:
+            state.generation += 1  # guarded handles on the bus reopen
+        state.failures.clear()
+        state.last, state.last_at = result, time.monotonic()
+        return result
+
+    def stats(self) -> dict:
+        with self.lock:
+            states = list(self.buses.values())
+        return {state.bus_number: {"errors": state.errors, "stuck_detected": state.detected,
+                                   "not_stuck": state.not_stuck, "recoveries": state.recoveries, "recovered": state.recovered,
+                                   "last": state.last} for state in states}
+
+
+MONITOR = BusMonitor()
+
+_LOCAL = threading.local()
+
+
+@contextlib.contextmanager
+def unmonitored():
+    """Failures of guarded transfers in this thread are raised without being reported"""
+    previous = getattr(_LOCAL, "quiet", False)
+    _LOCAL.quiet = True
+    try:
+        yield
+    finally:
+        _LOCAL.quiet = previous
+
+
+# ==================== GUARDED HANDLES ====================
+
+class GuardedBus:
+    """Transparent proxy around an I2C handle that reports to MONITOR and reopens after a recovery"""
+
+    __slots__ = ("_open", "_target", "_state", "_generation", "_calls")
+
+    def __init__(self, open_bus, state: BusState):
+        object.__setattr__(self, "_open", open_bus)
+        object.__setattr__(self, "_state", state)
+        object.__setattr__(self, "_generation", state.generation)
+        object.__setattr__(self, "_target", open_bus())
+        object.__setattr__(self, "_calls", {})  # method name -> guarded callable, built once
+
+    def _reopen(self):
+        close = getattr(self._target, "close", None) or getattr(self._target, "deinit", None)
+        try:
+            if close is not None:
+                close()
+        except OSError:
+            pass  # the old file descriptor died with the rebind
+        object.__setattr__(self, "_generation", self._state.generation)
+        object.__setattr__(self, "_target", self._open())
+
+    def _guarded(self, name: str):
+        def call(*args, **kwargs):
+            if self._generation != self._state.generation:
+                self._reopen()
+            try:
+                result = getattr(self._target, name)(*args, **kwargs)
+            except OSError as e:
+                if getattr(_LOCAL, "quiet", False) or not MONITOR.failure(self._state, args[0] if args else None, e, self._generation):
+                    raise
+                self._reopen()
+                result = getattr(self._target, name)(*args, **kwargs)
+            if self._state.failures:
+                MONITOR.success(self._state)
+            return result
+        self._calls[name] = call
+        return call
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)  # AttributeError when the handle lacks the method
+        if name in I2C_METHODS:
+            return self._calls.get(name) or self._guarded(name)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __enter__(self):
+        self._target.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._target.__exit__(exc_type, exc_value, traceback)
+
+
+def guard(open_bus, bus_number: int):
+    """open_bus() wrapped for stuck-bus recovery (unwrapped when TESTJIG_I2C_RECOVERY=0)"""
+    if not ENABLED:
+        return open_bus()
+    return GuardedBus(open_bus, MONITOR.state(bus_number))
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+I2C bus scan service shared by run_test, CustomI2C and the drivers
+
+Probe results are cached per (bus, address) for CACHE_TTL seconds, so a
+test start only re-probes the addresses its device can use (see
+DEVICE_ADDRESSES) and usually costs no bus traffic at all. A full
+0x03-0x77 scan happens only when asked for (refresh=True). Drivers call
+invalidate() when a transfer fails so the next test probes again.
+
+Probe method per address follows i2cdetect: a read_byte for 0x30-0x37
+and 0x50-0x5F, where a quick write can lock up write-protect logic or
+corrupt an EEPROM, and write_quick everywhere else, where a read can
+stall some write-only devices.
+"""
+
+import threading
+import time
+
+from lib.hal import smbus2
+
+FIRST_ADDRESS = 0x03
+LAST_ADDRESS = 0x77
+CACHE_TTL = 30.0
+READ_PROBE_RANGES = ((0x30, 0x37), (0x50, 0x5F))
+
+# device -> addresses it can answer on (the default first)
+DEVICE_ADDRESSES = {
+    "bh1750": (0x23, 0x5C),
+    "oled": (0x3C, 0x3D),
+    "mlx90614": (0x5A,),
+    "ads1115": (0x48, 0x49, 0x4A, 0x4B),
+    "pot": (0x48,),
+    "ldr": (0x48,),
+    "tds": (0x48,),
+}
+
+
+def probe_method(address: int) -> str:
+    for first, last in READ_PROBE_RANGES:
+        if first <= address <= last:
+            return "read_byte"
+    return "write_quick"
+
+
+def probe(bus, address: int) -> bool:
+    """True if a device acknowledges at address"""
+    try:
+        if probe_method(address) == "read_byte":
+            bus.read_byte(address)
+        else:
+            bus.write_quick(address)
+        return True
+    except OSError:
+        return False
+
+
+class ScanService:
+    """Cached I2C presence probes"""
+
+    def __init__(self, ttl: float = CACHE_TTL):
+        self.ttl = ttl
+        self.results = {}  # bus number -> {address: (present, checked at)}
+        self.lock = threading.Lock()
+        self.probes = 0  # bus transactions issued, for diagnostics
+
+    def scan(self, bus_number: int = 1, addresses=None, refresh: bool = False, bus=None) -> list:
+        """Return the present addresses among `addresses` (default: the full range)
+
+        Cached results younger than the TTL are reused unless refresh is
+        set. `bus` is an already open SMBus to probe with; otherwise one
+        is opened for the addresses that need probing.
+        """
+        if addresses is None:
+            addresses = range(FIRST_ADDRESS, LAST_ADDRESS + 1)
+        now = time.monotonic()
+        with self.lock:
+            known = self.results.setdefault(bus_number, {})
+            stale = [a for a in addresses if refresh or a not in known or now - known[a][1] > self.ttl]
+            if stale:
+                from lib.I2C.recovery import unmonitored
+                opened = bus is None
+                bus = smbus2.SMBus(bus_number) if opened else bus
+                try:
+                    with unmonitored():  # absent addresses NACK; that is no stuck bus
+                        for address in stale:
+                            known[address] = (probe(bus, address), now)
+                    self.probes += len(stale)
+                finally:
+                    if opened:
+                        bus.close()
+            return [a for a in addresses if known[a][0]]
+
+    def expected(self, device: str, bus_number: int = 1, bus=None) -> list:
+        """Present addresses among those the named device can use"""
+        return self.scan(bus_number, DEVICE_ADDRESSES.get(device.lower(), ()), bus=bus)
+
+    def invalidate(self, bus_number: int = None, address: int = None):
+        """Forget cached results (all, one bus, or one address) after an error"""
+        with self.lock:
+            if bus_number is None:
+                self.results.clear()
+            elif address is None:
+                self.results.pop(bus_number, None)
+            else:
+                self.results.get(bus_number, {}).pop(address, None)
+
+    def cached(self, bus_number: int = 1) -> dict:
+        """Cached results for a bus as {address: {"present", "age_s"}}"""
+        now = time.monotonic()
+        with self.lock:
+            return {address: {"present": present, "age_s": round(now - checked, 1)}
+                    for address, (present, checked) in sorted(self.results.get(bus_number, {}).items())}
+
+
+SCANNER = ScanService()
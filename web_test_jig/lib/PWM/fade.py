@@ -1,5 +1,5 @@
-import RPi.GPIO as GPIO
 import time
+from lib.hal import GPIO
 
 class LedFader:
     def __init__(self, pin, frequency=1000):
@@ -1,5 +1,5 @@
-import RPi.GPIO as GPIO
 import time
+from lib.hal import GPIO
 
 # Set up GPIO mode
 GPIO.setmode(GPIO.BCM)
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Simulated RPi.GPIO module
+
+Keeps per-pin state for outputs and inputs, records every PWM change in
+PWM_LOG (the PWM recorder), and models the jig's wiring:
+
+- GPIO 6 (push button, pulled up) reads as pressed for one second in four
+- GPIO 26 -> 19 is an HC-SR04: a HIGH-LOW pulse on the trigger produces
+  an echo pulse whose width matches ULTRASONIC_DISTANCE_CM
+- GPIO 2/3 are I2C bus 1 SDA/SCL: SDA reads low while a simulated
+  target holds the bus, and each rising edge driven on SCL clocks it
+"""
+
+import collections
+import threading
+import time
+
+from lib.SIM import devices
+
+BCM = 11
+BOARD = 10
+OUT = 0
+IN = 1
+LOW = 0
+HIGH = 1
+PUD_OFF = 20
+PUD_DOWN = 21
+PUD_UP = 22
+RISING = 31
+FALLING = 32
+BOTH = 33
+HARD_PWM = 43
+UNKNOWN = -1
+
+RPI_INFO = {"P1_REVISION": 3, "TYPE": "Simulated Pi 3 Model B", "PROCESSOR": "BCM2837"}
+VERSION = "0.7.1-sim"
+
+BUTTON_PIN = 6
+ULTRASONIC_TRIGGER_PIN = 26
+ULTRASONIC_ECHO_PIN = 19
+ULTRASONIC_DISTANCE_CM = lambda: devices.signal(42.0, 15.0, 40.0, noise=0.3)
+
+I2C_SDA_PIN = 2  # bus 1
+I2C_SCL_PIN = 3
+
+SPEED_OF_SOUND_CM_S = 34300
+ECHO_START_DELAY = 0.0002  # the HC-SR04 bursts for ~200 us before raising echo
+
+# (timestamp, pin, event, value) for every PWM start/stop/duty/frequency change
+PWM_LOG = collections.deque(maxlen=10000)
+
+_lock = threading.RLock()
+_mode = None
+_functions = {}
+_levels = {}
+_pulls = {}
+_echo_window = (0.0, 0.0)
+_trigger_rose = None
+
+
+def _pins(channel):
+    return list(channel) if isinstance(channel, (list, tuple)) else [channel]
+
+
+def setmode(mode):
+    global _mode
+    if _mode is not None and mode != _mode:
+        raise ValueError("A different mode has already been set!")
+    _mode = mode
+
+
+def getmode():
+    return _mode
+
+
+def setwarnings(flag):
+    pass
+
+
+def setup(channel, direction, pull_up_down=PUD_OFF, initial=None):
+    if _mode is None:
+        raise RuntimeError("Please set pin numbering mode using GPIO.setmode(GPIO.BOARD) or GPIO.setmode(GPIO.BCM)")
+    with _lock:
+        for pin in _pins(channel):
+            _functions[pin] = direction
+            _pulls[pin] = pull_up_down
+            if direction == OUT:
+                _levels[pin] = initial if initial is not None else LOW
+
+
+def gpio_function(channel):
+    return _functions.get(channel, UNKNOWN)
+
+
+def output(channel, value):
+    global _trigger_rose, _echo_window
+    values = _pins(value) if isinstance(value, (list, tuple)) else None
+    with _lock:
+        for index, pin in enumerate(_pins(channel)):
+            if _functions.get(pin) != OUT:
+                raise RuntimeError("The GPIO channel has not been set up as an OUTPUT")
+            level = int(bool(values[index] if values else value))
+            if pin == ULTRASONIC_TRIGGER_PIN:
+                now = time.time()
+                if level and not _levels.get(pin):
+                    _trigger_rose = now
+                elif not level and _levels.get(pin) and _trigger_rose is not None:
+                    start = now + ECHO_START_DELAY
+                    width = 2 * ULTRASONIC_DISTANCE_CM() / SPEED_OF_SOUND_CM_S
+                    _echo_window = (start, start + width)
+                    _trigger_rose = None
+            elif pin == I2C_SCL_PIN and level and not _levels.get(pin):
+                devices.i2c_scl_pulse(1)
+            _levels[pin] = level
+
+
+def input(channel):
+    with _lock:
+        if channel not in _functions:
+            raise RuntimeError("You must setup() the GPIO channel first")
+        if _functions[channel] == OUT:
+            return _levels.get(channel, LOW)
+        if channel == ULTRASONIC_ECHO_PIN:
+            start, end = _echo_window
+            return HIGH if start <= time.time() < end else LOW
+        if channel == BUTTON_PIN:
+            return LOW if int(time.time()) % 4 == 0 else HIGH
+        if channel == I2C_SDA_PIN and not devices.i2c_sda_level(1):
+            return LOW
+        return HIGH if _pulls.get(channel) == PUD_UP else LOW
+
+
+def level(channel) -> int:
+    """Level of a pin whatever its function, as `pinctrl get` reports it (no setup needed)"""
+    with _lock:
+        if channel == I2C_SDA_PIN:
+            return devices.i2c_sda_level(1)
+        if _functions.get(channel) == OUT:
+            return _levels.get(channel, LOW)
+        return HIGH if channel in (I2C_SDA_PIN, I2C_SCL_PIN) or _pulls.get(channel) == PUD_UP else LOW
+
+
+def cleanup(channel=None):
+    global _mode
+    with _lock:
+        if channel is None:
+            _functions.clear()
+            _levels.clear()
+            _pulls.clear()
+            _mode = None
+            return
+        for pin in _pins(channel):
+            _functions.pop(pin, None)
+            _levels.pop(pin, None)
+            _pulls.pop(pin, None)
+
+
+def add_event_detect(channel, edge, callback=None, bouncetime=None):
+    pass
+
+
+def remove_event_detect(channel):
+    pass
+
+
+def event_detected(channel):
+    return False
+
+
+def wait_for_edge(channel, edge, bouncetime=None, timeout=None):
+    if timeout:
+        time.sleep(timeout / 1000.0)
+    return None
+
+
+class PWM:
+    """Software PWM whose every change is recorded in PWM_LOG"""
+
+    def __init__(self, channel, frequency):
+        if _functions.get(channel) != OUT:
+            raise RuntimeError("You must setup() the GPIO channel as an output first")
+        if frequency <= 0:
+            raise ValueError("frequency must be greater than 0.0")
+        self.channel = channel
+        self.frequency = frequency
+        self.duty_cycle = 0
+        self.running = False
+
+    def _record(self, event, value):
+        PWM_LOG.append((time.time(), self.channel, event, value))
+
+    def start(self, dutycycle):
+        if not 0.0 <= dutycycle <= 100.0:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty_cycle = dutycycle
+        self.running = True
+        self._record("start", dutycycle)
+
+    def ChangeDutyCycle(self, dutycycle):
+        if not 0.0 <= dutycycle <= 100.0:
+            raise ValueError("dutycycle must have a value from 0.0 to 100.0")
+        self.duty_cycle = dutycycle
+        self._record("duty", dutycycle)
+
+    def ChangeFrequency(self, frequency):
+        if frequency <= 0:
+            raise ValueError("frequency must be greater than 0.0")
+        self.frequency = frequency
+        self._record("frequency", frequency)
+
+    def stop(self):
+        self.running = False
+        self._record("stop", 0)
+
+
+def pwm_history(pin=None) -> list:
+    """Recorded PWM events, optionally filtered to one pin"""
+    return [event for event in PWM_LOG if pin is None or event[1] == pin]
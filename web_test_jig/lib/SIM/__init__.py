@@ -0,0 +1 @@
+# Simulated Hardware Backend
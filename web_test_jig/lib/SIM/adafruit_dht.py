@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Simulated adafruit_dht module
+"""
+
+import time
+
+from lib.SIM import devices
+
+
+class DHTBase:
+    """Simulated single-wire DHT sensor"""
+
+    MIN_INTERVAL = 2.0  # the sensor refuses to be read faster than this
+
+    def __init__(self, pin, use_pulseio: bool = True):
+        self.pin = pin
+        self._last_read = 0.0
+        self._temperature = None
+        self._humidity = None
+
+    def measure(self):
+        now = time.monotonic()
+        if self._temperature is None or now - self._last_read >= self.MIN_INTERVAL or not devices.REALTIME:
+            self._last_read = now
+            self._temperature = round(devices.signal(26.0, 2.0, 600.0), self.precision)
+            self._humidity = round(devices.signal(55.0, 8.0, 900.0), self.precision)
+
+    @property
+    def temperature(self):
+        self.measure()
+        return self._temperature
+
+    @property
+    def humidity(self):
+        self.measure()
+        return self._humidity
+
+    def exit(self):
+        pass
+
+
+class DHT11(DHTBase):
+    precision = 0
+
+
+class DHT22(DHTBase):
+    precision = 1
+
+
+class DHT21(DHT22):
+    pass
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Simulated adafruit_ads1x15 ADS1115 and AnalogIn
+
+Talks to the simulated ADS1115 register model over busio.I2C the same
+way the Adafruit driver does: write the config register to start a
+single-shot conversion, then read the conversion register.
+"""
+
+P0 = 0
+P1 = 1
+P2 = 2
+P3 = 3
+
+_GAINS = {2 / 3: 0, 1: 1, 2: 2, 4: 3, 8: 4, 16: 5}
+_FULL_SCALE = {2 / 3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+
+
+class ADS1115:
+    """Simulated ADS1115 on an I2C bus"""
+
+    bits = 16
+
+    def __init__(self, i2c, gain: float = 1, data_rate: int = None, mode: int = 0x0100, address: int = 0x48):
+        if gain not in _GAINS:
+            raise ValueError("Gain must be one of: {}".format(list(_GAINS)))
+        self.i2c = i2c
+        self.gain = gain
+        self.mode = mode
+        self.address = address
+
+    def read(self, pin: int, is_differential: bool = False) -> int:
+        mux = pin if is_differential else pin + 4
+        config = 0x8000 | (mux << 12) | (_GAINS[self.gain] << 9) | self.mode | 0x0083
+        self.i2c.writeto(self.address, bytes([0x01, config >> 8, config & 0xFF]))
+        result = bytearray(2)
+        self.i2c.writeto_then_readfrom(self.address, bytes([0x00]), result)
+        raw = (result[0] << 8) | result[1]
+        return raw - 0x10000 if raw & 0x8000 else raw
+
+
+class AnalogIn:
+    """Single-ended analog input on a simulated ADS1115 channel"""
+
+    def __init__(self, ads: ADS1115, positive_pin: int, negative_pin: int = None):
+        self._ads = ads
+        self._pin = positive_pin
+
+    @property
+    def value(self) -> int:
+        return self._ads.read(self._pin)
+
+    @property
+    def voltage(self) -> float:
+        return self.value * _FULL_SCALE[self._ads.gain] / 32767
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Simulated Blinka board module (Raspberry Pi 3 pin names)
+"""
+
+
+class Pin:
+    """A BCM-numbered pin"""
+
+    def __init__(self, pin_id: int):
+        self.id = pin_id
+
+    def __repr__(self):
+        return f"board.D{self.id}"
+
+    def __eq__(self, other):
+        return isinstance(other, Pin) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+
+for _number in range(28):
+    globals()[f"D{_number}"] = Pin(_number)
+
+SDA = D2
+SCL = D3
+CE1 = D7
+CE0 = D8
+MISO = D9
+MOSI = D10
+SCLK = SCK = D11
+TXD = TX = D14
+RXD = RX = D15
+
+board_id = "SIMULATED_RASPBERRY_PI_3B"
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Simulated Blinka busio module
+
+busio.I2C is mapped onto the simulated SMBus for bus 1 (the bus that
+board.SCL/board.SDA are wired to on the Pi).
+"""
+
+import threading
+
+from lib.SIM import devices
+from lib.SIM.smbus import SMBus
+
+
+class I2C:
+    """Simulated busio.I2C on /dev/i2c-1"""
+
+    def __init__(self, scl, sda, frequency: int = 100000):
+        self.frequency = frequency
+        self._bus = SMBus(1)
+        self._lock = threading.Lock()
+
+    def try_lock(self) -> bool:
+        return self._lock.acquire(blocking=False)
+
+    def unlock(self):
+        self._lock.release()
+
+    def scan(self) -> list:
+        return sorted(devices.I2C_BUSES[1])
+
+    def _target(self, address: int) -> devices.I2CDevice:
+        return self._bus._device(address)
+
+    def writeto(self, address: int, buffer, *, start: int = 0, end: int = None):
+        data = bytes(buffer[start:end])
+        device = self._target(address)
+        devices.wire_delay(len(data) + 1, 9, self.frequency)
+        with device.lock:
+            if len(data) == 1:
+                device.write_byte(data[0])
+            elif data:
+                device.write_block(data[0], data[1:])
+            else:
+                device.write_quick()
+
+    def readfrom_into(self, address: int, buffer, *, start: int = 0, end: int = None):
+        end = len(buffer) if end is None else end
+        device = self._target(address)
+        devices.wire_delay(end - start + 1, 9, self.frequency)
+        with device.lock:
+            data = device.read_block(device.pointer, end - start)
+        buffer[start:end] = bytes(data)
+
+    def writeto_then_readfrom(self, address: int, buffer_out, buffer_in, *,
+                              out_start: int = 0, out_end: int = None,
+                              in_start: int = 0, in_end: int = None):
+        out = bytes(buffer_out[out_start:out_end])
+        in_end = len(buffer_in) if in_end is None else in_end
+        device = self._target(address)
+        devices.wire_delay(len(out) + in_end - in_start + 2, 9, self.frequency)
+        with device.lock:
+            data = device.read_block(out[0] if out else device.pointer, in_end - in_start)
+        buffer_in[in_start:in_end] = bytes(data)
+
+    def deinit(self):
+        self._bus.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.deinit()
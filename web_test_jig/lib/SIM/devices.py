@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Simulated device models for the Test Jig simulation backend
+
+Register-level models of the I2C devices on the jig (BH1750, MLX90614,
+ADS1115), the SDS011 particulate sensor frame generator, and the shared
+signal sources that give every simulated reading a slowly varying,
+plausible value.
+
+Set TESTJIG_SIM_REALTIME=1 to make the simulated buses take as long as
+the real wires would (I2C at 100 kHz, UART at the configured baud rate).
+By default transactions complete immediately, which is what benchmarks
+and load tests want.
+"""
+
+import errno
+import math
+import os
+import random
+import struct
+import threading
+import time
+
+REALTIME = os.environ.get("TESTJIG_SIM_REALTIME", "0").strip().lower() in ("1", "true", "yes")
+
+I2C_CLOCK_HZ = 100000
+
+
+def wire_delay(nbytes: int, bits_per_byte: int, clock_hz: float):
+    """Sleep for the time nbytes would take on the wire (realtime mode only)"""
+    if REALTIME and nbytes and clock_hz:
+        time.sleep(nbytes * bits_per_byte / clock_hz)
+
+
+def signal(base: float, amplitude: float, period: float, noise: float = 0.0) -> float:
+    """Slowly varying test signal: base + amplitude * sin(2*pi*t/period) + noise"""
+    value = base + amplitude * math.sin(2 * math.pi * time.time() / period)
+    if noise:
+        value += random.uniform(-noise, noise)
+    return value
+
+
+def nack(address: int):
+    """Raise the OSError the kernel returns when nothing ACKs an address"""
+    raise OSError(errno.EREMOTEIO, f"Remote I/O error (no ACK from 0x{address:02X})")
+
+
+# Fraction of I2C transfers that fail with a spurious NACK, to exercise
+# retry and stress-test paths (TESTJIG_SIM_I2C_NACK_RATE, default none)
+I2C_NACK_RATE = float(os.environ.get("TESTJIG_SIM_I2C_NACK_RATE", "0"))
+
+
+# Fraction of I2C transfers interrupted so that the target keeps holding
+# SDA low (TESTJIG_SIM_I2C_STUCK_RATE, default none). A stuck bus times
+# out every transfer until SCL is clocked from GPIO (see lib.I2C.recovery)
+# or stick_i2c_bus() is undone with release_i2c_bus().
+I2C_STUCK_RATE = float(os.environ.get("TESTJIG_SIM_I2C_STUCK_RATE", "0"))
+I2C_STUCK = {}  # bus -> SCL pulses still needed before the target lets go of SDA
+I2C_STUCK_LOCK = threading.Lock()
+
+
+def stick_i2c_bus(bus: int, pulses: int = None):
+    """Leave a target mid-byte, holding SDA low until it has seen `pulses` more clocks"""
+    with I2C_STUCK_LOCK:
+        I2C_STUCK[bus] = pulses if pulses is not None else random.randint(1, 8)
+
+
+def release_i2c_bus(bus: int):
+    with I2C_STUCK_LOCK:
+        I2C_STUCK.pop(bus, None)
+
+
+def i2c_scl_pulse(bus: int):
+    """One SCL clock from GPIO: a stuck target shifts out another bit"""
+    with I2C_STUCK_LOCK:
+        if bus in I2C_STUCK:
+            I2C_STUCK[bus] -= 1
+            if I2C_STUCK[bus] <= 0:
+                del I2C_STUCK[bus]
+
+
+def i2c_sda_level(bus: int) -> int:
+    return 0 if bus in I2C_STUCK else 1
+
+
+def i2c_target(bus: int, address: int):
+    """The device at address on a simulated bus, or the NACK the kernel would report"""
+    if I2C_STUCK_RATE and random.random() < I2C_STUCK_RATE:
+        stick_i2c_bus(bus)
+    if bus in I2C_STUCK:
+        raise OSError(errno.ETIMEDOUT, "Connection timed out (SDA held low)")
+    devices = I2C_BUSES[bus]
+    device = devices.get(address)
+    mux = devices.get(0x70)
+    if isinstance(mux, TCA9548AModel) and mux.control:
+        device = mux.downstream(address) or device  # enabled channels shadow the upstream bus
+    if device is None or (I2C_NACK_RATE and random.random() < I2C_NACK_RATE):
+        nack(address)
+    return device
+
+
+class I2CDevice:
+    """Generic I2C target with a 256-byte register file and a register pointer"""
+
+    def __init__(self, address: int):
+        self.address = address
+        self.registers = bytearray(256)
+        self.pointer = 0
+        self.lock = threading.RLock()
+
+    def write_quick(self):
+        pass
+
+    def write_byte(self, value: int):
+        self.pointer = value & 0xFF
+
+    def read_byte(self) -> int:
+        value = self.registers[self.pointer]
+        self.pointer = (self.pointer + 1) & 0xFF
+        return value
+
+    def write_block(self, register: int, data):
+        for offset, value in enumerate(data):
+            self.registers[(register + offset) & 0xFF] = value & 0xFF
+        self.pointer = (register + len(data)) & 0xFF
+
+    def read_block(self, register: int, length: int) -> list:
+        self.pointer = register & 0xFF
+        return [self.read_byte() for _ in range(length)]
+
+
+class BH1750Model(I2CDevice):
+    """BH1750 ambient light sensor: opcode writes, 2-byte big-endian result"""
+
+    POWER_DOWN = 0x00
+    POWER_ON = 0x01
+    RESET = 0x07
+
+    def __init__(self, address: int = 0x23, offset: float = 0.0):
+        super().__init__(address)
+        self.mode = None
+        self.result = 0
+        self.offset = offset  # tells apart identical boards behind a mux
+
+    def lux(self) -> float:
+        return max(0.0, signal(320.0 + self.offset, 80.0, 60.0, noise=2.0))
+
+    def measure(self):
+        counts = int(self.lux() * 1.2)
+        if self.mode in (0x11, 0x21):  # high-res mode 2 counts in 0.5 lx steps
+            counts *= 2
+        self.result = min(counts, 0xFFFF)
+
+    def write_byte(self, value: int):
+        if value in (0x10, 0x11, 0x13, 0x20, 0x21, 0x23):
+            self.mode = value
+            self.measure()
+        elif value == self.RESET:
+            self.result = 0
+
+    def read_block(self, register: int, length: int) -> list:
+        # The BH1750 has no registers; a "register" byte is just another
+        # opcode and the read returns the latched measurement.
+        if self.mode is not None and self.mode < 0x20:
+            self.measure()  # continuous modes keep converting
+        data = [(self.result >> 8) & 0xFF, self.result & 0xFF]
+        return (data * (length // 2 + 1))[:length]
+
+    def read_byte(self) -> int:
+        return (self.result >> 8) & 0xFF
+
+
+class MLX90614Model(I2CDevice):
+    """MLX90614 IR thermometer: 16-bit little-endian RAM words in 0.02 K units"""
+
+    TA = 0x06
+    TOBJ1 = 0x07
+    TOBJ2 = 0x08
+
+    def __init__(self, address: int = 0x5A, offset: float = 0.0):
+        super().__init__(address)
+        self.offset = offset
+
+    def temperature(self, register: int) -> float:
+        if register == self.TA:
+            return signal(24.0, 0.5, 300.0)
+        return signal(31.0 + self.offset, 4.0, 90.0, noise=0.05)
+
+    def read_block(self, register: int, length: int) -> list:
+        if register in (self.TA, self.TOBJ1, self.TOBJ2):
+            raw = int((self.temperature(register) + 273.15) / 0.02) & 0xFFFF
+            data = [raw & 0xFF, raw >> 8, self.pec(register, raw)]
+            return (data + [0xFF] * length)[:length]
+        return super().read_block(register, length)
+
+    def pec(self, register: int, raw: int) -> int:
+        crc = 0
+        for byte in (self.address << 1, register, (self.address << 1) | 1, raw & 0xFF, raw >> 8):
+            crc ^= byte
+            for _ in range(8):
+                crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        return crc
+
+
+class ADS1115Model(I2CDevice):
+    """ADS1115 16-bit ADC: pointer register plus 16-bit big-endian registers"""
+
+    CONVERSION = 0x00
+    CONFIG = 0x01
+    LO_THRESH = 0x02
+    HI_THRESH = 0x03
+
+    FULL_SCALE = {0: 6.144, 1: 4.096, 2: 2.048, 3: 1.024, 4: 0.512, 5: 0.256, 6: 0.256, 7: 0.256}
+
+    # Single-ended inputs wired on the jig: pot / LDR / TDS probe share A0
+    INPUTS = {
+        0: lambda: signal(1.65, 0.9, 20.0, noise=0.005),
+        1: lambda: signal(2.2, 0.3, 45.0, noise=0.005),
+        2: lambda: signal(0.8, 0.2, 30.0, noise=0.005),
+        3: lambda: 0.0,
+    }
+
+    def __init__(self, address: int = 0x48):
+        super().__init__(address)
+        self.words = {self.CONVERSION: 0x0000, self.CONFIG: 0x8583,
+                      self.LO_THRESH: 0x8000, self.HI_THRESH: 0x7FFF}
+
+    def convert(self):
+        config = self.words[self.CONFIG]
+        mux = (config >> 12) & 0x07
+        gain = (config >> 9) & 0x07
+        if mux >= 4:
+            volts = self.INPUTS[mux - 4]()
+        else:  # differential pairs: 0-1, 0-3, 1-3, 2-3
+            pairs = {0: (0, 1), 1: (0, 3), 2: (1, 3), 3: (2, 3)}
+            a, b = pairs[mux]
+            volts = self.INPUTS[a]() - self.INPUTS[b]()
+        raw = int(volts / self.FULL_SCALE[gain] * 32767)
+        raw = max(-32768, min(32767, raw))
+        self.words[self.CONVERSION] = raw & 0xFFFF
+        self.words[self.CONFIG] = config | 0x8000  # OS bit: conversion done
+
+    def write_byte(self, value: int):
+        self.pointer = value & 0x03
+
+    def write_block(self, register: int, data):
+        register &= 0x03
+        self.pointer = register
+        if len(data) >= 2:
+            self.words[register] = (data[0] << 8) | data[1]
+            if register == self.CONFIG and data[0] & 0x80:
+                self.convert()
+
+    def read_block(self, register: int, length: int) -> list:
+        register &= 0x03
+        self.pointer = register
+        word = self.words[register]
+        return ([word >> 8, word & 0xFF] * (length // 2 + 1))[:length]
+
+    def read_byte(self) -> int:
+        return self.words[self.pointer] >> 8
+
+
+class OLEDModel(I2CDevice):
+    """SH1106 OLED controller: accepts command/data writes, reads status"""
+
+    def __init__(self, address: int = 0x3C):
+        super().__init__(address)
+
+
+class TCA9548AModel(I2CDevice):
+    """TCA9548A 1-to-8 I2C switch: the control byte enables downstream channels"""
+
+    CHANNELS = 8
+
+    def __init__(self, address: int = 0x70, channels: dict = None):
+        super().__init__(address)
+        self.control = 0
+        self.channels = channels or {}  # channel -> {address: device}
+
+    def write_byte(self, value: int):
+        self.control = value & 0xFF
+
+    def read_byte(self) -> int:
+        return self.control
+
+    def downstream(self, address: int):
+        """The device answering at address on the enabled channels, if any"""
+        for channel, devices in self.channels.items():
+            if self.control & (1 << channel) and address in devices:
+                return devices[address]
+        return None
+
+
+# Identical DUT boards (a BH1750 and an MLX90614 each) behind a TCA9548A
+# at 0x70 on bus 1, one per mux channel (TESTJIG_SIM_I2C_MUX_BOARDS, 0-8).
+# Their sensors take the place of the jig's own: a device left on the
+# upstream bus at the same address would answer on every channel.
+I2C_MUX_BOARDS = int(os.environ.get("TESTJIG_SIM_I2C_MUX_BOARDS", "0"))
+
+
+def default_i2c_devices() -> dict:
+    """Devices present on each simulated I2C bus, keyed by bus then address"""
+    boards = {channel: {0x23: BH1750Model(offset=25.0 * channel), 0x5A: MLX90614Model(offset=0.5 * channel)}
+              for channel in range(min(I2C_MUX_BOARDS, TCA9548AModel.CHANNELS))}
+    buses = {
+        1: {
+            0x23: BH1750Model(),
+            0x3C: OLEDModel(),
+            0x48: ADS1115Model(),
+            0x5A: MLX90614Model(),
+        },
+    }
+    if boards:
+        for address in (0x23, 0x5A):
+            del buses[1][address]
+        buses[1][0x70] = TCA9548AModel(channels=boards)
+    return buses
+
+
+I2C_BUSES = default_i2c_devices()
+
+
+class SDS011Model:
+    """SDS011 particulate sensor: emits a 10-byte measurement frame once a second"""
+
+    PERIOD = 1.0
+
+    def __init__(self):
+        self.next_frame = time.monotonic()
+
+    def frame(self) -> bytes:
+        pm25 = int(max(0.0, signal(12.0, 6.0, 120.0, noise=0.4)) * 10)
+        pm10 = int(max(0.0, signal(21.0, 9.0, 150.0, noise=0.6)) * 10)
+        payload = struct.pack("<HH", pm25, pm10) + b"\x12\x34"
+        checksum = sum(payload) & 0xFF
+        return b"\xaa\xc0" + payload + bytes([checksum]) + b"\xab"
+
+    def poll(self, now: float, on_demand: bool) -> bytes:
+        """Return the bytes the sensor has transmitted since the last poll"""
+        if on_demand:
+            return self.frame()
+        frames = b""
+        while now >= self.next_frame:
+            frames += self.frame()
+            self.next_frame += self.PERIOD
+        return frames
+
+    def on_write(self, data: bytes) -> bytes:
+        return b""
+
+
+class EchoModel:
+    """Loopback device: every byte written is received back"""
+
+    def poll(self, now: float, on_demand: bool) -> bytes:
+        return b""
+
+    def on_write(self, data: bytes) -> bytes:
+        return bytes(data)
+
+
+SERIAL_PORTS = {
+    "/dev/ttyS0": SDS011Model,
+    "/dev/ttyAMA0": SDS011Model,
+    "/dev/serial0": SDS011Model,
+    "/dev/ttyUSB0": EchoModel,
+    "/dev/ttyUSB1": EchoModel,
+}
+
+# (bus, chip select) pairs that have a simulated spidev node; MISO is looped
+# back to MOSI on all of them.
+SPI_DEVICES = {(0, 0), (0, 1), (1, 0), (1, 1), (1, 2)}
+SPI_BUFSIZ = 4096
+# Loopback wiring is clean up to SPI_CLEAN_HZ; above it the simulated
+# MISO flips bits at a rate that grows with the clock (a 1e-5 BER just
+# past the limit, 1e-3 at four times it), like a long jumper would.
+SPI_CLEAN_HZ = int(os.environ.get("TESTJIG_SIM_SPI_CLEAN_HZ", "16000000"))
+
+
+def spi_bit_error_rate(speed_hz: float) -> float:
+    if speed_hz <= SPI_CLEAN_HZ:
+        return 0.0
+    return min(1e-2, 1e-5 * (speed_hz / SPI_CLEAN_HZ) ** (math.log(100, 4)))
+
+
+def corrupt(data: list, ber: float) -> list:
+    """Flip about ber * len(data) * 8 random bits in a list of byte values"""
+    expected = ber * len(data) * 8
+    flips = int(expected) + (random.random() < expected - int(expected))
+    for _ in range(flips):
+        bit = random.randrange(len(data) * 8)
+        data[bit >> 3] ^= 0x80 >> (bit & 7)
+    return data
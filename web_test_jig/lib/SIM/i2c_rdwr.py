@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Simulated I2C_RDWR backend
+
+Same I2CRdwr API as lib.I2C.i2c_rdwr (combined transfers, smbus and
+busio methods), with each ioctl carried out against the register models
+in lib.SIM.devices. Like the kernel interface there is no 32-byte block
+limit; messages are capped at MAX_MESSAGE bytes.
+"""
+
+import errno
+
+from lib.I2C import i2c_rdwr
+from lib.SIM import devices
+
+MAX_MESSAGE = i2c_rdwr.MAX_MESSAGE
+
+
+class I2CRdwr(i2c_rdwr.I2CRdwr):
+    """Simulated /dev/i2c-N handle using combined transfers"""
+
+    def _setup_buffers(self):
+        pass  # no ctypes message array to build
+
+    def open(self, bus):
+        if bus not in devices.I2C_BUSES:
+            raise FileNotFoundError(errno.ENOENT, f"No such file or directory: '/dev/i2c-{bus}'")
+        self.bus = bus
+        self.fd = bus
+
+    def close(self):
+        self.fd = None
+
+    def _transfer(self, address: int, tx, rx, length: int = None):
+        if self.fd is None:
+            raise OSError(errno.EBADF, "Bad file descriptor")
+        if rx is not None:
+            length = len(rx) if length is None else length
+            i2c_rdwr._check_length(length)
+        if tx is not None:
+            i2c_rdwr._check_length(len(tx))
+        self.transfers += 1
+        device = devices.i2c_target(self.bus, address)
+        devices.wire_delay((len(tx) + 1 if tx is not None else 0) + (length + 1 if rx is not None else 0),
+                           9, devices.I2C_CLOCK_HZ)
+        with device.lock:
+            if rx is None:
+                if len(tx) == 0:
+                    device.write_quick()
+                elif len(tx) == 1:
+                    device.write_byte(tx[0])
+                else:
+                    device.write_block(tx[0], tx[1:])
+                return
+            register = tx[0] if tx else device.pointer
+            rx[:length] = bytes(device.read_block(register, length))
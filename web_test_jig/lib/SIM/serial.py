@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""
+Simulated pyserial module
+
+Serial ports are backed by the models in lib.SIM.devices.SERIAL_PORTS:
+/dev/ttyS0 carries an SDS011 frame stream and the USB adapters are
+loopbacks. Without TESTJIG_SIM_REALTIME the SDS011 produces a frame
+whenever its receive buffer runs dry, so reads never wait.
+"""
+
+import threading
+import time
+
+from lib.SIM import devices
+
+PARITY_NONE, PARITY_EVEN, PARITY_ODD, PARITY_MARK, PARITY_SPACE = 'N', 'E', 'O', 'M', 'S'
+STOPBITS_ONE, STOPBITS_ONE_POINT_FIVE, STOPBITS_TWO = (1, 1.5, 2)
+FIVEBITS, SIXBITS, SEVENBITS, EIGHTBITS = (5, 6, 7, 8)
+
+PARITY_NAMES = {
+    PARITY_NONE: 'None',
+    PARITY_EVEN: 'Even',
+    PARITY_ODD: 'Odd',
+    PARITY_MARK: 'Mark',
+    PARITY_SPACE: 'Space',
+}
+
+VERSION = "3.5-sim"
+
+RX_BUFFER_SIZE = 4096  # the tty layer drops input beyond its buffer
+
+
+class SerialException(IOError):
+    """Base class for serial port related exceptions"""
+
+
+class SerialTimeoutException(SerialException):
+    """Write timeouts give an exception"""
+
+
+class Serial:
+    """Simulated serial port"""
+
+    def __init__(self, port=None, baudrate: int = 9600, bytesize: int = EIGHTBITS,
+                 parity: str = PARITY_NONE, stopbits: float = STOPBITS_ONE,
+                 timeout=None, xonxoff: bool = False, rtscts: bool = False,
+                 write_timeout=None, dsrdtr: bool = False, inter_byte_timeout=None,
+                 exclusive=None, **kwargs):
+        self.port = port
+        self.baudrate = baudrate
+        self.bytesize = bytesize
+        self.parity = parity
+        self.stopbits = stopbits
+        self.timeout = timeout
+        self.xonxoff = xonxoff
+        self.rtscts = rtscts
+        self.dsrdtr = dsrdtr
+        self.write_timeout = write_timeout
+        self.inter_byte_timeout = inter_byte_timeout
+        self.dtr = True
+        self.rts = True
+        self.is_open = False
+        self._rx = bytearray()
+        self._lock = threading.Lock()
+        self._model = None
+        if port is not None:
+            self.open()
+
+    def open(self):
+        model = devices.SERIAL_PORTS.get(self.port)
+        if model is None:
+            raise SerialException(2, f"could not open port {self.port}: [Errno 2] No such file or directory: '{self.port}'")
+        self._model = model()
+        self.is_open = True
+
+    def close(self):
+        self.is_open = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _check_open(self):
+        if not self.is_open:
+            raise SerialException("Attempting to use a port that is not open")
+
+    def _byte_time(self) -> float:
+        bits = 1 + self.bytesize + (0 if self.parity == PARITY_NONE else 1) + self.stopbits
+        return bits / self.baudrate
+
+    def _pump(self, on_demand: bool = False):
+        data = self._model.poll(time.monotonic(), on_demand and not devices.REALTIME)
+        if data:
+            self._rx += data
+            if len(self._rx) > RX_BUFFER_SIZE:
+                del self._rx[RX_BUFFER_SIZE:]
+
+    @property
+    def in_waiting(self) -> int:
+        self._check_open()
+        with self._lock:
+            self._pump()
+            return len(self._rx)
+
+    @property
+    def out_waiting(self) -> int:
+        self._check_open()
+        return 0
+
+    def read(self, size: int = 1) -> bytes:
+        self._check_open()
+        deadline = None if self.timeout is None else time.monotonic() + self.timeout
+        while True:
+            with self._lock:
+                self._pump(on_demand=not self._rx)
+                if len(self._rx) >= size or (self._rx and self.timeout == 0):
+                    break
+            if not devices.REALTIME or (deadline is not None and time.monotonic() >= deadline):
+                break
+            time.sleep(min(0.01, self._byte_time() * max(size, 1)))
+        with self._lock:
+            data = bytes(self._rx[:size])
+            del self._rx[:size]
+        devices.wire_delay(len(data), 1, 1 / self._byte_time())
+        return data
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readline(self, size: int = -1) -> bytes:
+        line = bytearray()
+        while size < 0 or len(line) < size:
+            byte = self.read(1)
+            if not byte:
+                break
+            line += byte
+            if byte == b"\n":
+                break
+        return bytes(line)
+
+    def read_until(self, expected: bytes = b"\n", size: int = None) -> bytes:
+        line = bytearray()
+        while size is None or len(line) < size:
+            byte = self.read(1)
+            if not byte:
+                break
+            line += byte
+            if line.endswith(expected):
+                break
+        return bytes(line)
+
+    def write(self, data) -> int:
+        self._check_open()
+        data = bytes(data)
+        devices.wire_delay(len(data), 1, 1 / self._byte_time())
+        reply = self._model.on_write(data)
+        with self._lock:
+            self._rx += reply
+        return len(data)
+
+    def flush(self):
+        self._check_open()
+
+    def reset_input_buffer(self):
+        self._check_open()
+        with self._lock:
+            self._rx.clear()
+
+    def reset_output_buffer(self):
+        self._check_open()
+
+    def flushInput(self):
+        self.reset_input_buffer()
+
+    def flushOutput(self):
+        self.reset_output_buffer()
+
+    def send_break(self, duration: float = 0.25):
+        self._check_open()
+        if devices.REALTIME:
+            time.sleep(duration)
+
+    @property
+    def cd(self) -> bool:
+        return False
+
+    @property
+    def cts(self) -> bool:
+        return self.rts
+
+    @property
+    def dsr(self) -> bool:
+        return self.dtr
+
+    @property
+    def ri(self) -> bool:
+        return False
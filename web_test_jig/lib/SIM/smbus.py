@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Simulated smbus / smbus2 module
+
+Provides an SMBus class with the smbus2 method set, backed by the
+register models in lib.SIM.devices. Addresses with no simulated device
+raise OSError(EREMOTEIO) exactly like an unacknowledged transfer on the
+real bus.
+"""
+
+import errno
+from typing import List
+
+from lib.SIM import devices
+
+
+class SMBus:
+    """Simulated /dev/i2c-N handle"""
+
+    def __init__(self, bus=None, force: bool = False):
+        self.bus = bus
+        self.fd = None
+        if bus is not None:
+            self.open(bus)
+
+    def open(self, bus):
+        if bus not in devices.I2C_BUSES:
+            raise FileNotFoundError(errno.ENOENT, f"No such file or directory: '/dev/i2c-{bus}'")
+        self.bus = bus
+        self.fd = bus
+
+    def close(self):
+        self.fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _device(self, address: int) -> devices.I2CDevice:
+        if self.fd is None:
+            raise OSError(errno.EBADF, "Bad file descriptor")
+        return devices.i2c_target(self.bus, address)
+
+    def write_quick(self, i2c_addr: int, force=None):
+        device = self._device(i2c_addr)
+        devices.wire_delay(1, 9, devices.I2C_CLOCK_HZ)
+        with device.lock:
+            device.write_quick()
+
+    def read_byte(self, i2c_addr: int, force=None) -> int:
+        device = self._device(i2c_addr)
+        devices.wire_delay(2, 9, devices.I2C_CLOCK_HZ)
+        with device.lock:
+            return device.read_byte()
+
+    def write_byte(self, i2c_addr: int, value: int, force=None):
+        device = self._device(i2c_addr)
+        devices.wire_delay(2, 9, devices.I2C_CLOCK_HZ)
+        with device.lock:
+            device.write_byte(value)
+
+    def read_byte_data(self, i2c_addr: int, register: int, force=None) -> int:
+        return self.read_i2c_block_data(i2c_addr, register, 1)[0]
+
+    def write_byte_data(self, i2c_addr: int, register: int, value: int, force=None):
+        self.write_i2c_block_data(i2c_addr, register, [value])
+
+    def read_word_data(self, i2c_addr: int, register: int, force=None) -> int:
+        low, high = self.read_i2c_block_data(i2c_addr, register, 2)
+        return low | (high << 8)
+
+    def write_word_data(self, i2c_addr: int, register: int, value: int, force=None):
+        self.write_i2c_block_data(i2c_addr, register, [value & 0xFF, (value >> 8) & 0xFF])
+
+    def read_i2c_block_data(self, i2c_addr: int, register: int, length: int, force=None) -> List[int]:
+        if length > 32:
+            raise ValueError("Desired block length over 32 bytes")
+        device = self._device(i2c_addr)
+        devices.wire_delay(length + 3, 9, devices.I2C_CLOCK_HZ)
+        with device.lock:
+            return device.read_block(register, length)
+
+    def write_i2c_block_data(self, i2c_addr: int, register: int, data: List[int], force=None):
+        if len(data) > 32:
+            raise ValueError("Data length cannot exceed 32 bytes")
+        device = self._device(i2c_addr)
+        devices.wire_delay(len(data) + 2, 9, devices.I2C_CLOCK_HZ)
+        with device.lock:
+            device.write_block(register, data)
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+Simulated spidev module
+
+Every simulated spidev node has MISO looped back to MOSI, which is the
+wiring used for jig self-checks. Above devices.SPI_CLEAN_HZ the loopback
+picks up bit errors, so clock-speed sweeps find a limit. The 4096-byte kernel buffer limit of
+xfer/xfer2/writebytes/readbytes is enforced like the real driver; xfer3
+and writebytes2 split larger buffers into bufsiz chunks.
+"""
+
+import errno
+
+from lib.SIM import devices
+
+
+class SpiDev:
+    """Simulated /dev/spidevB.C handle"""
+
+    def __init__(self, bus: int = None, client: int = None):
+        self.bus = None
+        self.device = None
+        self.mode = 0
+        self.max_speed_hz = 125000000
+        self.bits_per_word = 8
+        self.cshigh = False
+        self.lsbfirst = False
+        self.loop = False
+        self.no_cs = False
+        self.threewire = False
+        self._open = False
+        if bus is not None:
+            self.open(bus, client)
+
+    def open(self, bus: int, device: int):
+        if (bus, device) not in devices.SPI_DEVICES:
+            raise FileNotFoundError(errno.ENOENT, f"No such file or directory: '/dev/spidev{bus}.{device}'")
+        self.bus = bus
+        self.device = device
+        self._open = True
+
+    def close(self):
+        self._open = False
+
+    def fileno(self) -> int:
+        return -1 if not self._open else 100 + self.bus * 10 + self.device
+
+    def _check(self, data):
+        if not self._open:
+            raise OSError(errno.EBADF, "Bad file descriptor")
+        if len(data) > devices.SPI_BUFSIZ:
+            raise OverflowError(f"Argument list size exceeds {devices.SPI_BUFSIZ} bytes.")
+
+    def _shift(self, data, speed_hz: int = 0) -> list:
+        speed_hz = speed_hz or self.max_speed_hz
+        devices.wire_delay(len(data), self.bits_per_word, speed_hz)
+        received = [int(b) & 0xFF for b in data]
+        ber = devices.spi_bit_error_rate(speed_hz)
+        return devices.corrupt(received, ber) if ber else received
+
+    def xfer(self, data, speed_hz: int = 0, delay_usecs: int = 0, bits_per_word: int = 0) -> list:
+        self._check(data)
+        return self._shift(data, speed_hz)
+
+    def xfer2(self, data, speed_hz: int = 0, delay_usecs: int = 0, bits_per_word: int = 0) -> list:
+        self._check(data)
+        return self._shift(data, speed_hz)
+
+    def xfer3(self, data, speed_hz: int = 0, delay_usecs: int = 0, bits_per_word: int = 0) -> tuple:
+        received = []
+        for offset in range(0, len(data), devices.SPI_BUFSIZ):
+            chunk = data[offset:offset + devices.SPI_BUFSIZ]
+            self._check(chunk)
+            received.extend(self._shift(chunk, speed_hz))
+        return tuple(received)
+
+    def writebytes(self, data):
+        self._check(data)
+        self._shift(data)
+
+    def writebytes2(self, data):
+        for offset in range(0, len(data), devices.SPI_BUFSIZ):
+            chunk = data[offset:offset + devices.SPI_BUFSIZ]
+            self._check(chunk)
+            devices.wire_delay(len(chunk), self.bits_per_word, self.max_speed_hz)
+
+    def readbytes(self, length: int) -> list:
+        self._check(range(length))
+        devices.wire_delay(length, self.bits_per_word, self.max_speed_hz)
+        return [0xFF if not self.cshigh else 0x00] * length  # idle MISO with nothing driving it
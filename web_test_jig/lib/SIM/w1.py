@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Simulated 1-Wire sysfs tree
+
+Builds a /sys/bus/w1/devices lookalike with one DS18B20 under a
+temporary directory. The w1_slave file is rewritten with a fresh reading
+every time base_dir() is called, which is how drivers locate the tree.
+"""
+
+import os
+import tempfile
+
+from lib.SIM import devices
+
+DS18B20_ID = "28-3c01d6070e1a"
+
+_root = None
+
+
+def w1_slave_text(temp_c: float) -> str:
+    milli = int(round(temp_c * 1000))
+    raw = int(round(temp_c * 16)) & 0xFFFF
+    scratch = f"{raw & 0xFF:02x} {raw >> 8:02x} 4b 46 7f ff 0c 10 1c"
+    return f"{scratch} : crc=1c YES\n{scratch} t={milli}\n"
+
+
+def base_dir() -> str:
+    """Create (once) and refresh the simulated devices directory"""
+    global _root
+    if _root is None:
+        _root = os.path.join(tempfile.gettempdir(), f"testjig-sim-w1-{os.getpid()}") + "/"
+        os.makedirs(os.path.join(_root, DS18B20_ID), exist_ok=True)
+        os.makedirs(os.path.join(_root, "w1_bus_master1"), exist_ok=True)
+    path = os.path.join(_root, DS18B20_ID, "w1_slave")
+    with open(path + ".tmp", "w") as f:
+        f.write(w1_slave_text(devices.signal(23.5, 1.5, 240.0, noise=0.06)))
+    os.replace(path + ".tmp", path)
+    return _root
@@ -1,12 +1,24 @@
-import serial
 import struct
 import time
+from lib.hal import serial
+from lib.UART.fastserial import FrameBuffer
+
+# measurement frame: AA C0 pm25(LE) pm10(LE) id(2) checksum AB
+FRAME_HEADER = b'\xaa\xc0'
+FRAME_LENGTH = 10
+
+
+def valid_frame(frame):
+    """Checksum (sum of the 6 data bytes) and tail of a measurement frame"""
+    return frame[9] == 0xab and sum(frame[2:8]) & 0xFF == frame[8]
+
 
 class SDS011:
     def __init__(self, port='/dev/ttyS0'):
         try:
             self.ser = serial.Serial(port, baudrate=9600, timeout=2)
             self.ser.flush()
+            self.rx = FrameBuffer(self.ser)  # frames are found in place, no per-byte reads
             # print("Sensor connected successfully.")
         except serial.SerialException:
             self.ser = None
@@ -15,24 +27,14 @@ class SDS011:
     def read(self):
         if self.ser is None:
             return (None, None)
-        
-        byte = 0
-        while byte != b'\xaa':
-            byte = self.ser.read(size=1)
-            if byte == b'':
-                print("No data received from sensor.")
-                return (None, None)
 
-        data = self.ser.read(size=9)
-        if len(data) != 9:
-            print("Incomplete data received from sensor.")
+        frame = self.rx.read_frame(FRAME_HEADER, FRAME_LENGTH, self.ser.timeout, valid_frame)
+        if frame is None:
+            print("No data received from sensor." if not len(self.rx) else "Incomplete data received from sensor.")
             return (None, None)
-            
-        if data[0] == 0xc0:
-            pm25 = struct.unpack('<H', data[2:4])[0] / 10.0
-            pm10 = struct.unpack('<H', data[4:6])[0] / 10.0
-            return (pm25, pm10)
-        return (None, None)
+
+        pm25, pm10 = struct.unpack_from('<HH', frame, 2)
+        return (pm25 / 10.0, pm10 / 10.0)
 
     def close(self):
         if self.ser:
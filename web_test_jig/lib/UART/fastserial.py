@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Zero-copy serial input
+
+pyserial's read(size) costs a syscall and a new bytes object per call,
+and the drivers used to call it a byte at a time while hunting for a
+frame header. Here a port is read the other way round: whatever has
+arrived is moved in one non-blocking call straight into memory the
+caller already owns, and frames are found and parsed where they landed.
+
+SerialInput.readinto(view)
+    os.readv() on the port's file descriptor into a writable memoryview
+    (pyserial opens ports O_NONBLOCK, so this returns at once with what
+    the tty has buffered). Ports without a descriptor (the simulated
+    ones) fall back to port.readinto() of only the bytes in_waiting, so
+    neither path ever blocks. readinto_wait() first waits for input:
+    select() on the descriptor, or else a blocking one-byte read.
+    os.readv() goes around the lib.capture tap on the port, so what it
+    receives is recorded into the active capture here, as a "readinto".
+    SerialInput(port, record=False) reads the untapped port and records
+    nothing; the SerialReader thread uses it, since no capture is active
+    on that thread and CustomUART records input where it is consumed.
+
+FrameBuffer
+    A preallocated bytearray filled through SerialInput. frame() searches
+    it in place with bytearray.find and hands back a memoryview of the
+    frame; nothing is copied until the caller unpacks the fields it
+    wants (struct.unpack_from works on the view directly). Consumed bytes
+    are only moved when the free tail runs short.
+
+ByteRing.fill() (lib.UART.reader) uses SerialInput to receive straight
+into the ring, so the background reader of CustomUART copies nothing
+either; the SDS011 driver reads its frames through a FrameBuffer.
+"""
+
+import os
+import select
+import time
+
+from lib.capture import ACTIVE, NO_ADDRESS, BusTap, untapped
+
+BUFFER_SIZE = 4096  # the tty's own receive buffer
+POLL_S = 0.01
+
+
+def port_fd(port):
+    """The port's file descriptor, or None when it has none (simulated ports)"""
+    try:
+        fd = port.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+    return fd if isinstance(fd, int) and fd >= 0 else None
+
+
+class SerialInput:
+    """Non-blocking reads from a pyserial port into caller-owned buffers"""
+
+    def __init__(self, port, record: bool = True):
+        self.port = port if record else untapped(port)
+        self.fd = port_fd(self.port)
+        self.tapped = isinstance(self.port, BusTap)  # record readv() traffic like the tap would
+        self.calls = 0  # reads that returned data
+        self.received = 0
+
+    def readinto(self, view) -> int:
+        """Move up to len(view) already received bytes into view; 0 when none are waiting"""
+        if self.fd is not None:
+            try:
+                size = os.readv(self.fd, [view])
+            except BlockingIOError:
+                return 0
+            except OSError as e:
+                self._record(b"", e.errno or 0xFF)
+                raise
+            if size:
+                self._record(view[:size])
+        else:
+            waiting = min(self.port.in_waiting, len(view))
+            size = self.port.readinto(view[:waiting]) if waiting else 0
+        if size:
+            self.calls += 1
+            self.received += size
+        return size
+
+    def _record(self, rx, error: int = 0):
+        session = ACTIVE.get() if self.tapped else None
+        if session is not None:
+            session.bus("readinto", NO_ADDRESS, b"", bytes(rx), error)
+
+    def readinto_wait(self, view, timeout: float) -> int:
+        """readinto(), first waiting up to timeout seconds for input when none is waiting"""
+        size = self.readinto(view)
+        if size or timeout <= 0:
+            return size
+        if self.fd is not None:
+            select.select([self.fd], [], [], timeout)
+            return self.readinto(view)
+        # nothing to select on: a one-byte read blocks for up to the port's own timeout
+        size = self.port.readinto(view[:1])
+        if not size:
+            return 0
+        self.calls += 1
+        self.received += 1
+        return 1 + self.readinto(view[1:])
+
+    def wait(self, timeout: float):
+        """Sleep until input may be waiting, at most timeout seconds"""
+        if self.fd is None:
+            time.sleep(min(timeout, POLL_S))
+        else:
+            select.select([self.fd], [], [], max(0.0, timeout))
+
+
+class FrameBuffer:
+    """Preallocated receive buffer with in-place frame extraction
+
+    Views returned by frame() and read_frame() point into the buffer and
+    are only valid until the next fill().
+    """
+
+    def __init__(self, port, size: int = BUFFER_SIZE):
+        self.input = SerialInput(port)
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.start = 0  # first unconsumed byte
+        self.end = 0  # one past the last received byte
+
+    def __len__(self) -> int:
+        return self.end - self.start
+
+    def fill(self, timeout: float = 0.0) -> int:
+        """Append what the port has received, waiting up to timeout for it; returns the byte count"""
+        if self.start == self.end:
+            self.start = self.end = 0
+        elif self.end == len(self.buffer):
+            # move the unconsumed tail to the front (the older half goes when it fills the buffer)
+            keep = self.end - self.start if self.start else len(self.buffer) // 2
+            self.view[:keep] = self.view[self.end - keep:self.end]
+            self.start, self.end = 0, keep
+        size = self.input.readinto_wait(self.view[self.end:], timeout)
+        self.end += size
+        return size
+
+    def frame(self, header: bytes, length: int, valid=None):
+        """The next complete frame starting with header, as a memoryview, or None
+
+        Bytes before the header are discarded, and so is the header of a
+        frame that valid(view) rejects, which resynchronizes on the next one.
+        """
+        while True:
+            index = self.buffer.find(header, self.start, self.end)
+            if index < 0:
+                # keep a partial header at the end for the next fill
+                self.start = max(self.start, self.end - len(header) + 1)
+                return None
+            if index + length > self.end:
+                self.start = index
+                return None
+            frame = self.view[index:index + length]
+            if valid is not None and not valid(frame):
+                self.start = index + 1
+                continue
+            self.start = index + length
+            return frame
+
+    def read_frame(self, header: bytes, length: int, timeout: float, valid=None):
+        """Wait up to timeout seconds for frame(header, length, valid)"""
+        deadline = time.monotonic() + timeout
+        while True:
+            frame = self.frame(header, length, valid)
+            if frame is not None:
+                return frame
+            remaining = deadline - time.monotonic()
+            if not self.fill(remaining) and remaining <= 0:
+                return None
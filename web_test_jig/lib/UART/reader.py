@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Background UART reader and receive ring buffer
+
+A SerialReader thread drains an open port continuously into a ByteRing,
+so bytes that arrive while nobody is asking (between console clicks, or
+from a DUT that chatters at full baud rate) are kept with their arrival
+time instead of overflowing the 4 kB tty buffer.
+
+The ring is addressed by absolute stream offsets: `end` is the number of
+bytes received since the port was opened. Every consumer keeps its own
+offset, so CustomUART's reads and any number of live monitors
+(GET /uart/live) read the same stream independently. A consumer that
+falls more than RING_SIZE bytes behind loses the oldest bytes and is
+told how many.
+
+The reader waits for input with select() on the port's file descriptor
+(or by polling in_waiting every POLL_S on ports without one, like the
+simulated ones) and then reads only what is waiting, so it never blocks
+on a read timeout and stops within POLL_S of being asked to. Consumers
+call drain() before they look at the ring, which moves anything already
+waiting in the driver across at once instead of at the next poll.
+
+Received bytes go straight into the ring's storage (ByteRing.fill with
+lib.UART.fastserial.SerialInput), and find() searches the ring in place,
+so neither receiving nor waiting for a terminator allocates per byte.
+
+The reader bypasses the lib.capture tap on the port: drains run on the
+reader thread (where no capture is active) as well as on the consumer's,
+so consumers record the bytes they take instead (CustomUART._take).
+"""
+
+import bisect
+import collections
+import threading
+import time
+
+from lib.UART.fastserial import SerialInput
+
+RING_SIZE = 256 * 1024
+ARRIVALS = 4096  # (offset, time) entries kept for timestamping
+POLL_S = 0.01
+
+
+# ==================== RING BUFFER ====================
+
+class ByteRing:
+    """Bounded byte ring with arrival timestamps, addressed by stream offset"""
+
+    def __init__(self, capacity: int = RING_SIZE):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.end = 0  # offset of the next byte to arrive
+        self.arrivals = collections.deque(maxlen=ARRIVALS)
+        self.cond = threading.Condition()
+
+    @property
+    def start(self) -> int:
+        """Oldest offset still held"""
+        return max(0, self.end - self.capacity)
+
+    def append(self, data):
+        """Store received bytes (the oldest are overwritten when full)"""
+        size = len(data)
+        if not size:
+            return
+        with self.cond:
+            if size > self.capacity:
+                data, self.end = memoryview(data)[-self.capacity:], self.end + size - self.capacity
+                size = self.capacity
+            self.arrivals.append((self.end, time.time()))
+            position = self.end % self.capacity
+            first = min(size, self.capacity - position)
+            self.view[position:position + first] = memoryview(data)[:first]
+            if first < size:
+                self.view[:size - first] = memoryview(data)[first:]
+            self.end += size
+            self.cond.notify_all()
+
+    def fill(self, readinto) -> int:
+        """Receive straight into the ring: readinto(view) fills the free space it is given"""
+        with self.cond:
+            position = self.end % self.capacity
+            size = readinto(self.view[position:])  # up to the wrap; the next fill continues at 0
+            if size:
+                self.arrivals.append((self.end, time.time()))
+                self.end += size
+                self.cond.notify_all()
+            return size
+
+    def find(self, needle: bytes, offset: int) -> int:
+        """Offset of the first needle at or after offset, or -1, searched in place"""
+        with self.cond:
+            offset = max(offset, self.start)
+            position, stop = offset % self.capacity, self.end - offset
+            first = min(stop, self.capacity - position)
+            index = self.buffer.find(needle, position, position + first)
+            if index >= 0:
+                return offset + index - position
+            if first == stop:
+                return -1
+            # wrapped: the needle may straddle the end of the buffer
+            overlap = len(needle) - 1
+            if overlap:
+                seam = max(position, position + first - overlap)
+                index = (bytes(self.view[seam:position + first]) + self.view[:min(overlap, stop - first)]).find(needle)
+                if index >= 0:
+                    return offset + seam - position + index
+            index = self.buffer.find(needle, 0, stop - first)
+            return offset + first + index if index >= 0 else -1
+
+    def peek(self, offset: int, limit: int = None):
+        """(bytes from offset, offset they start at, bytes lost before them)"""
+        with self.cond:
+            dropped = max(0, self.start - offset)
+            offset += dropped
+            size = self.end - offset if limit is None else min(limit, self.end - offset)
+            position = offset % self.capacity
+            first = min(size, self.capacity - position)
+            data = bytes(self.view[position:position + first])
+            if first < size:
+                data += self.view[:size - first]
+            return data, offset, dropped
+
+    def wait(self, predicate, timeout) -> bool:
+        """Wait until predicate(ring) holds or timeout (None waits forever) passes"""
+        with self.cond:
+            return self.cond.wait_for(lambda: predicate(self), timeout)
+
+    def arrived(self, offset: int) -> float:
+        """Arrival time of the byte at offset (time of the chunk it came in)"""
+        with self.cond:
+            index = bisect.bisect_right(self.arrivals, (offset, float("inf"))) - 1
+            return self.arrivals[max(0, index)][1] if self.arrivals else 0.0
+
+
+# ==================== READER THREAD ====================
+
+class SerialReader:
+    """Daemon thread that moves everything a port receives into a ByteRing"""
+
+    def __init__(self, port, ring: ByteRing = None, name: str = ""):
+        self.port = port
+        self.ring = ring or ByteRing()
+        self.name = name or str(getattr(port, "port", "serial"))
+        self.input = SerialInput(port, record=False)
+        self.error = None
+        self.reads = 0
+        self._lock = threading.Lock()  # one drain at a time
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"uart-reader-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self, timeout: float = 1.0):
+        self._stop.set()
+        if self._thread is not None and self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def drain(self) -> int:
+        """Move whatever the port has waiting into the ring now; returns the byte count"""
+        with self._lock:
+            received = 0
+            while True:
+                size = self.ring.fill(self.input.readinto)
+                if not size:
+                    return received
+                received += size
+                self.reads += 1
+
+    def _wait(self):
+        if self.input.fd is None:
+            self._stop.wait(POLL_S)
+        else:
+            self.input.wait(POLL_S)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if not self.drain():
+                    self._wait()
+            except Exception as e:
+                if not self._stop.is_set():
+                    self.error = f"{type(e).__name__}: {e}"
+                break
+        with self.ring.cond:
+            self.ring.cond.notify_all()  # wake readers waiting on a dead port
+
+    def stats(self) -> dict:
+        return {"running": self.running, "received": self.ring.end, "reads": self.reads,
+                "buffered": self.ring.end - self.ring.start, "error": self.error}
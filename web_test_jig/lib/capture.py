@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Record-and-replay captures of sensor streams
+
+A capture file holds every event a stream produced (the decoded text
+sent to the browser) plus the raw bus traffic behind it, each with a
+timestamp. Files are a sequence of binary records, gzip-compressed when
+the name ends in .gz:
+
+    <d timestamp> <B kind> <H stream> <I length> payload
+
+    kind 0  STREAM  payload = stream name (utf-8), defines the stream id
+    kind 1  OP      payload = <B op id> + operation name, defines an op id
+    kind 2  BUS     payload = <B op> <B errno> <H address> <H tx length> tx rx
+    kind 3  EVENT   payload = decoded event text (utf-8)
+
+Raw traffic is captured by the taps lib.hal puts around SMBus, Serial,
+SpiDev and busio.I2C handles. A tap only records while a capture
+session is active in the calling context (see CaptureSession.activate),
+so there is no recording cost otherwise.
+
+Run this module on a capture to print it:
+
+    python -m lib.capture captures/bh1750.tjcap.gz
+"""
+
+import contextvars
+import gzip
+import os
+import struct
+import sys
+import threading
+import time
+
+CAPTURE_DIR = "captures"
+EXTENSION = ".tjcap"
+
+MAGIC = b"TJCAP\x01"
+RECORD = struct.Struct("<dBHI")
+BUS_HEADER = struct.Struct("<BBHH")
+
+KIND_STREAM = 0
+KIND_OP = 1
+KIND_BUS = 2
+KIND_EVENT = 3
+
+NO_ADDRESS = 0xFFFF
+MAX_REPLAY_GAP = 10.0  # never sleep longer than this between replayed events
+
+ACTIVE = contextvars.ContextVar("testjig_capture", default=None)
+
+
+def capture_path(name: str) -> str:
+    """Map a user supplied capture name to a file inside CAPTURE_DIR"""
+    name = os.path.basename(name.strip())
+    if not name:
+        raise ValueError("Capture name is empty")
+    if not (name.endswith(EXTENSION) or name.endswith(EXTENSION + ".gz")):
+        name += EXTENSION
+    return os.path.join(CAPTURE_DIR, name)
+
+
+def list_captures() -> list:
+    if not os.path.isdir(CAPTURE_DIR):
+        return []
+    entries = []
+    for name in sorted(os.listdir(CAPTURE_DIR)):
+        if EXTENSION in name:
+            path = os.path.join(CAPTURE_DIR, name)
+            entries.append({"name": name, "bytes": os.path.getsize(path), "modified": os.path.getmtime(path)})
+    return entries
+
+
+def _to_bytes(value) -> bytes:
+    if value is None or isinstance(value, bool):
+        return b""
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value)
+    if isinstance(value, str):
+        return value.encode("utf-8")
+    if isinstance(value, int):
+        return value.to_bytes(2, "little") if value > 0xFF else bytes([value & 0xFF])
+    if isinstance(value, (list, tuple)):
+        return bytes(v & 0xFF for v in value if isinstance(v, int))
+    return b""
+
+
+# ==================== WRITING ====================
+
+class CaptureWriter:
+    """Append records to a capture file; safe to share between threads"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        opener = gzip.open if path.endswith(".gz") else open
+        self.path = path
+        self.file = opener(path, "ab")
+        self.lock = threading.Lock()
+        self.streams = {}
+        self.ops = {}
+        if new_file:
+            self.file.write(MAGIC)
+
+    def _write(self, kind: int, stream: int, payload: bytes, timestamp: float = None):
+        record = RECORD.pack(time.time() if timestamp is None else timestamp, kind, stream, len(payload))
+        self.file.write(record + payload)
+
+    def stream_id(self, name: str) -> int:
+        with self.lock:
+            if name not in self.streams:
+                self.streams[name] = len(self.streams)
+                self._write(KIND_STREAM, self.streams[name], name.encode("utf-8"))
+            return self.streams[name]
+
+    def event(self, stream: int, text: str):
+        with self.lock:
+            self._write(KIND_EVENT, stream, text.encode("utf-8"))
+
+    def bus(self, stream: int, op: str, address: int, tx: bytes, rx: bytes, error: int = 0):
+        with self.lock:
+            if op not in self.ops:
+                self.ops[op] = len(self.ops)
+                self._write(KIND_OP, stream, bytes([self.ops[op]]) + op.encode("ascii"))
+            payload = BUS_HEADER.pack(self.ops[op], error & 0xFF, address, len(tx)) + tx + rx
+            self._write(KIND_BUS, stream, payload)
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+
+class CaptureSession:
+    """One stream recording into a CaptureWriter"""
+
+    def __init__(self, writer: CaptureWriter, stream: str):
+        self.writer = writer
+        self.stream = writer.stream_id(stream)
+
+    def event(self, text: str):
+        self.writer.event(self.stream, text)
+
+    def bus(self, op: str, address: int, tx: bytes, rx: bytes, error: int = 0):
+        self.writer.bus(self.stream, op, address, tx, rx, error)
+
+    def activate(self):
+        """Make bus taps in this context record here
+
+        Work handed off with run_in_threadpool (or run in a
+        contextvars.copy_context()) records too; a plain threading.Thread
+        starts with an empty context and does not.
+        """
+        return ACTIVE.set(self)
+
+    def deactivate(self, token):
+        ACTIVE.reset(token)
+
+
+# ==================== BUS TAPS ====================
+
+# Methods recorded per handle kind; for "i2c" handles the first argument
+# is the 7-bit target address.
+TAPPED_METHODS = {
+    "i2c": {"write_quick", "read_byte", "write_byte", "read_byte_data", "write_byte_data",
+            "read_word_data", "write_word_data", "read_i2c_block_data", "write_i2c_block_data",
+            "writeto", "readfrom_into", "writeto_then_readfrom",
+            "write", "read_into", "write_then_read", "read_register"},
+    "serial": {"read", "readline", "read_until", "readinto", "write"},
+    "spi": {"xfer", "xfer2", "xfer3", "writebytes", "writebytes2", "readbytes"},
+}
+
+# module name -> {class name: handle kind}
+TAPPED_CLASSES = {
+    "smbus": {"SMBus": "i2c"},
+    "smbus2": {"SMBus": "i2c"},
+    "i2c_rdwr": {"I2CRdwr": "i2c"},
+    "busio": {"I2C": "i2c"},
+    "serial": {"Serial": "serial"},
+    "spidev": {"SpiDev": "spi"},
+}
+
+
+def _recorder(method, name: str, kind: str):
+    def call(*args, **kwargs):
+        session = ACTIVE.get()
+        address = args[0] if kind == "i2c" and args else NO_ADDRESS
+        params = args[1:] if kind == "i2c" else args
+        try:
+            result = method(*args, **kwargs)
+        except OSError as e:
+            if session is not None:
+                session.bus(name, address, b"".join(_to_bytes(p) for p in params), b"", e.errno or 0xFF)
+            raise
+        if session is not None:
+            if name in ("readfrom_into", "writeto_then_readfrom", "read_into", "write_then_read"):
+                rx, params = bytes(params[-1]), params[:-1]
+            elif name == "readinto":
+                rx, params = bytes(params[0][:result]), ()
+            elif name == "write":
+                rx = b""
+            else:
+                rx = _to_bytes(result)
+            session.bus(name, address, b"".join(_to_bytes(p) for p in params), rx)
+        return result
+    return call
+
+
+class BusTap:
+    """Transparent proxy around a bus handle that records into the active capture"""
+
+    __slots__ = ("_target", "_kind", "_methods")
+
+    def __init__(self, target, kind: str):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_kind", kind)
+        object.__setattr__(self, "_methods", TAPPED_METHODS[kind])
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name in self._methods and ACTIVE.get() is not None:
+            return _recorder(value, name, self._kind)
+        return value
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+    def __enter__(self):
+        self._target.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return self._target.__exit__(exc_type, exc_value, traceback)
+
+
+class TappedModule:
+    """Module proxy whose bus classes return BusTap-wrapped handles"""
+
+    def __init__(self, module, classes: dict):
+        self.__dict__["_module"] = module
+        self.__dict__["_classes"] = classes
+
+    def __getattr__(self, name):
+        value = getattr(self._module, name)
+        if name in self._classes:
+            cls, kind = value, self._classes[name]
+
+            def factory(*args, **kwargs):
+                return BusTap(cls(*args, **kwargs), kind)
+            factory.__name__ = name
+            value = factory
+        self.__dict__[name] = value
+        return value
+
+    def __repr__(self):
+        return f"<tapped {self._module!r}>"
+
+
+def untapped(handle):
+    """The handle a BusTap wraps (the handle itself when it is not tapped)"""
+    return handle._target if isinstance(handle, BusTap) else handle
+
+
+def tap_module(name: str, module):
+    """Wrap a hal module so its bus handles can be recorded"""
+    if name in TAPPED_CLASSES:
+        return TappedModule(module, TAPPED_CLASSES[name])
+    return module
+
+
+# ==================== READING AND REPLAY ====================
+
+def read_records(path: str):
+    """Yield (timestamp, kind, stream name, fields) for every record in a capture
+
+    fields is the event text for EVENT records and a dict with op,
+    error, address, tx and rx for BUS records.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    streams, ops = {}, {}
+    with opener(path, "rb") as f:
+        magic = f.read(len(MAGIC))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a Test Jig capture")
+        while True:
+            header = f.read(RECORD.size)
+            if len(header) < RECORD.size:
+                return
+            timestamp, kind, stream, length = RECORD.unpack(header)
+            payload = f.read(length)
+            if kind == KIND_STREAM:
+                streams[stream] = payload.decode("utf-8")
+            elif kind == KIND_OP:
+                ops[payload[0]] = payload[1:].decode("ascii")
+            elif kind == KIND_EVENT:
+                yield timestamp, kind, streams.get(stream, str(stream)), payload.decode("utf-8", errors="replace")
+            elif kind == KIND_BUS:
+                op, error, address, tx_length = BUS_HEADER.unpack_from(payload)
+                body = payload[BUS_HEADER.size:]
+                yield timestamp, kind, streams.get(stream, str(stream)), {
+                    "op": ops.get(op, str(op)),
+                    "error": error,
+                    "address": None if address == NO_ADDRESS else address,
+                    "tx": body[:tx_length],
+                    "rx": body[tx_length:],
+                }
+
+
+def read_events(path: str, stream: str = None):
+    """Yield (timestamp, stream, text) for the decoded events in a capture"""
+    for timestamp, kind, name, text in read_records(path):
+        if kind == KIND_EVENT and (stream is None or name == stream):
+            yield timestamp, name, text
+
+
+def replay_delays(events, speed: float):
+    """Attach to each event the delay before it should be emitted
+
+    speed 1.0 replays at the original pace, 10.0 ten times faster and
+    0 (or less) as fast as possible.
+    """
+    previous = None
+    for timestamp, stream, text in events:
+        delay = 0.0
+        if speed > 0 and previous is not None:
+            delay = min(max(0.0, (timestamp - previous) / speed), MAX_REPLAY_GAP)
+        previous = timestamp
+        yield delay, stream, text
+
+
+def describe(path: str, out=sys.stdout):
+    start = None
+    for timestamp, kind, stream, fields in read_records(path):
+        start = timestamp if start is None else start
+        offset = timestamp - start
+        if kind == KIND_EVENT:
+            print(f"{offset:10.4f}  {stream:20s}  EVENT  {fields}", file=out)
+        else:
+            address = "--" if fields["address"] is None else f"0x{fields['address']:02X}"
+            error = f"  errno {fields['error']}" if fields["error"] else ""
+            print(f"{offset:10.4f}  {stream:20s}  {fields['op']:22s} {address}  "
+                  f"tx {fields['tx'].hex() or '-'}  rx {fields['rx'].hex() or '-'}{error}", file=out)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python -m lib.capture <capture file>")
+        sys.exit(1)
+    describe(sys.argv[1])
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Hardware Abstraction Layer for the Test Jig drivers
+
+Drivers import their bus libraries from here instead of importing
+RPi.GPIO, smbus/smbus2, spidev, serial, board/busio, adafruit_dht and
+adafruit_ads1x15 directly. The backend is selected with the
+TESTJIG_BACKEND environment variable:
+
+    TESTJIG_BACKEND=hardware   real Raspberry Pi libraries (default)
+    TESTJIG_BACKEND=sim        simulated devices from lib.SIM
+
+I2C drivers open their bus with open_i2c(), which returns an SMBus by
+default and an I2CRdwr (lib.I2C.i2c_rdwr: combined write-then-read
+transfers into preallocated buffers) with TESTJIG_I2C_DRIVER=rdwr.
+Both helpers hand back the handle inside lib.I2C.recovery's guard, which
+recovers a bus that a target holds stuck (TESTJIG_I2C_RECOVERY=0 turns
+that off).
+
+Modules are imported lazily on first use, so a driver only pulls in the
+libraries it actually needs:
+
+    from lib.hal import GPIO, smbus2
+
+Bus handles (SMBus, busio.I2C, Serial, SpiDev) are wrapped by the taps
+in lib.capture so their traffic can be recorded.
+"""
+
+import errno
+import importlib
+import os
+import re
+import subprocess
+import time
+
+BACKEND = os.environ.get("TESTJIG_BACKEND", "hardware").strip().lower()
+SIMULATED = BACKEND in ("sim", "simulated", "simulation")
+I2C_DRIVER = os.environ.get("TESTJIG_I2C_DRIVER", "smbus").strip().lower()
+
+# name -> (module, attribute or None for the module itself)
+HARDWARE_MODULES = {
+    "GPIO": ("RPi.GPIO", None),
+    "smbus": ("smbus", None),
+    "smbus2": ("smbus2", None),
+    "i2c_rdwr": ("lib.I2C.i2c_rdwr", None),
+    "spidev": ("spidev", None),
+    "serial": ("serial", None),
+    "board": ("board", None),
+    "busio": ("busio", None),
+    "adafruit_dht": ("adafruit_dht", None),
+    "ADS": ("adafruit_ads1x15.ads1115", None),
+    "AnalogIn": ("adafruit_ads1x15.analog_in", "AnalogIn"),
+}
+
+SIMULATED_MODULES = {
+    "GPIO": ("lib.SIM.GPIO", None),
+    "smbus": ("lib.SIM.smbus", None),
+    "smbus2": ("lib.SIM.smbus", None),
+    "i2c_rdwr": ("lib.SIM.i2c_rdwr", None),
+    "spidev": ("lib.SIM.spidev", None),
+    "serial": ("lib.SIM.serial", None),
+    "board": ("lib.SIM.board", None),
+    "busio": ("lib.SIM.busio", None),
+    "adafruit_dht": ("lib.SIM.adafruit_dht", None),
+    "ADS": ("lib.SIM.ads1115", None),
+    "AnalogIn": ("lib.SIM.ads1115", "AnalogIn"),
+}
+
+W1_DEVICES_DIR = "/sys/bus/w1/devices/"
+
+
+def _resolve(name):
+    table = SIMULATED_MODULES if SIMULATED else HARDWARE_MODULES
+    if name not in table:
+        raise AttributeError(f"module 'lib.hal' has no attribute '{name}'")
+    module_name, attribute = table[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+
+def __getattr__(name):
+    from lib import capture
+    value = capture.tap_module(name, _resolve(name))  # bus handles can be recorded
+    globals()[name] = value  # cache so later lookups skip __getattr__
+    return value
+
+
+def _module(name):
+    return globals()[name] if name in globals() else __getattr__(name)
+
+
+def open_i2c(bus_number: int = 1, default: str = "smbus2"):
+    """Open an I2C bus with the driver chosen by TESTJIG_I2C_DRIVER
+
+    "rdwr" gives an i2c_rdwr.I2CRdwr, which also has the smbus and
+    busio.I2C methods; anything else gives `default` (smbus or smbus2).
+    """
+    from lib.I2C import recovery
+
+    def open_bus():
+        if I2C_DRIVER == "rdwr":
+            return _module("i2c_rdwr").I2CRdwr(bus_number)
+        return _module(default).SMBus(bus_number)
+    return recovery.guard(open_bus, bus_number)
+
+
+def open_busio_i2c():
+    """busio.I2C on the board SCL/SDA pins, or an I2CRdwr on bus 1 with TESTJIG_I2C_DRIVER=rdwr"""
+    from lib.I2C import recovery
+
+    def open_bus():
+        if I2C_DRIVER == "rdwr":
+            return _module("i2c_rdwr").I2CRdwr(1)
+        board = _module("board")
+        return _module("busio").I2C(board.SCL, board.SDA)
+    return recovery.guard(open_bus, 1)
+
+
+SPIDEV_BUFSIZ_FILE = "/sys/module/spidev/parameters/bufsiz"
+SPIDEV_DEFAULT_BUFSIZ = 4096
+
+
+def spidev_bufsiz() -> int:
+    """Largest single spidev transfer the kernel accepts (the spidev bufsiz parameter)"""
+    if SIMULATED:
+        from lib.SIM import devices
+        return devices.SPI_BUFSIZ
+    try:
+        with open(SPIDEV_BUFSIZ_FILE) as f:
+            return int(f.read().strip())
+    except (OSError, ValueError):
+        return SPIDEV_DEFAULT_BUFSIZ
+
+
+I2C_ADAPTER_DIR = "/sys/bus/i2c/devices/i2c-{}"
+
+
+def rebind_i2c(bus_number: int, timeout: float = 2.0):
+    """Unbind and rebind the driver of an I2C bus's controller (no-op on the simulated backend)
+
+    The controller is reset and its pins are switched back to the I2C
+    function; /dev/i2c-N disappears meanwhile, so open handles go stale.
+    """
+    if SIMULATED:
+        return
+    controller = os.path.dirname(os.path.realpath(I2C_ADAPTER_DIR.format(bus_number)))
+    driver = os.path.realpath(os.path.join(controller, "driver"))
+    name = os.path.basename(controller)
+    with open(os.path.join(driver, "unbind"), "w") as f:
+        f.write(name)
+    with open(os.path.join(driver, "bind"), "w") as f:
+        f.write(name)
+    deadline = time.monotonic() + timeout
+    while not os.path.exists(f"/dev/i2c-{bus_number}"):  # udev recreates the node
+        if time.monotonic() > deadline:
+            raise OSError(errno.ENODEV, f"/dev/i2c-{bus_number} did not come back after rebinding {name}")
+        time.sleep(0.01)
+
+
+# tools that print a pin's level without changing its function (Pi OS 12+, older)
+PIN_LEVEL_COMMANDS = ("pinctrl", "raspi-gpio")
+PIN_LEVEL = re.compile(r"level=([01])|\|\s*(hi|lo)\b")
+
+
+def read_pin_level(pin: int):
+    """Level (0/1) of a BCM pin, read without switching it out of its current function
+
+    RPi.GPIO can only read pins it has set up as inputs, which would take
+    I2C pins away from the controller. None when the level cannot be read.
+    """
+    if SIMULATED:
+        return _module("GPIO").level(pin)
+    for command in PIN_LEVEL_COMMANDS:
+        try:
+            output = subprocess.run([command, "get", str(pin)], capture_output=True, text=True,
+                                    timeout=1.0).stdout
+        except (OSError, subprocess.SubprocessError):
+            continue
+        match = PIN_LEVEL.search(output)
+        if match:
+            return int(match.group(1)) if match.group(1) else int(match.group(2) == "hi")
+    return None
+
+
+def w1_base_dir() -> str:
+    """Return the 1-Wire sysfs devices directory for the active backend"""
+    if SIMULATED:
+        from lib.SIM import w1
+        return w1.base_dir()
+    return W1_DEVICES_DIR
+
+
+def modprobe(module: str):
+    """Load a kernel module (no-op on the simulated backend)"""
+    if not SIMULATED:
+        os.system(f"modprobe {module}")
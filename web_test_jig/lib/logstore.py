@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+"""
+Append-only binary logs of sensor readings, one file per channel
+
+Each file starts with a header describing the channel and its value
+fields, followed by fixed-size little-endian records:
+
+    header   <6s magic> <B mode> <B fields> <d base time> <H meta length> meta JSON
+    full     <d timestamp> <d value> * fields                 (mode 0)
+    compact  <I ms since base time> <f value> * fields        (mode 1)
+
+Compact records store the timestamp as a millisecond offset from the
+header's base time and the values as float32, roughly a third of the
+full size, and cover 49 days per file. A record past that rolls the log
+over: the full file is renamed to <name>.<base time>.tjlog and a new one
+starts with a fresh base time. Because every record is the same
+size, a time range is found by binary search over a memory-mapped file
+and exported without loading the log into RAM.
+
+Writes are buffered and flushed in batches (every FLUSH_RECORDS records
+or FLUSH_INTERVAL seconds), so a 50 Hz soak test costs a few writes per
+second instead of one per sample.
+
+    python -m lib.logstore logs/i2c_bh1750.tjlog --format csv > bh1750.csv
+"""
+
+import argparse
+import json
+import math
+import mmap
+import os
+import re
+import struct
+import sys
+import threading
+import time
+
+LOG_DIR = "logs"
+EXTENSION = ".tjlog"
+
+MAGIC = b"TJLOG\x01"
+HEADER = struct.Struct("<6sBBdH")
+
+MODE_FULL = 0
+MODE_COMPACT = 1
+
+MAX_OFFSET_MS = 0xFFFFFFFF  # last compact timestamp a file can hold
+FLUSH_RECORDS = 256
+FLUSH_INTERVAL = 2.0
+EXPORT_BATCH = 1024  # records per chunk of streamed export
+
+
+def record_struct(mode: int, fields: int) -> struct.Struct:
+    if mode == MODE_COMPACT:
+        return struct.Struct("<I" + "f" * fields)
+    return struct.Struct("<d" + "d" * fields)
+
+
+def log_path(channel: str, directory: str = LOG_DIR) -> str:
+    """File name for a channel such as "i2c/bh1750" -> logs/i2c_bh1750.tjlog"""
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", channel.strip()).strip("_.")
+    if not name:
+        raise ValueError("Channel name is empty")
+    return os.path.join(directory, name + EXTENSION)
+
+
+def read_header(f) -> dict:
+    raw = f.read(HEADER.size)
+    if len(raw) < HEADER.size:
+        raise ValueError("Log file is truncated")
+    magic, mode, fields, base_time, meta_length = HEADER.unpack(raw)
+    if magic != MAGIC:
+        raise ValueError("Not a Test Jig log file")
+    meta = json.loads(f.read(meta_length).decode("utf-8"))
+    return {
+        "mode": mode,
+        "base_time": base_time,
+        "channel": meta.get("channel", ""),
+        "fields": meta.get("fields", [f"value{i}" for i in range(fields)]),
+        "data_offset": HEADER.size + meta_length,
+    }
+
+
+# ==================== WRITING ====================
+
+class ChannelLog:
+    """Buffered appender for one channel's log file"""
+
+    def __init__(self, path: str, channel: str = "", fields=("value",), compact: bool = False,
+                 base_time: float = None):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = bytearray()
+        self.pending_records = 0
+        self.last_flush = time.monotonic()
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as f:
+                header = read_header(f)
+            self.mode = header["mode"]
+            self.base_time = header["base_time"]
+            self.channel = header["channel"]
+            self.fields = header["fields"]
+            self.record = record_struct(self.mode, len(self.fields))
+            self.file = open(path, "ab")
+            # drop a partial record left by a crash mid-write
+            extra = (os.path.getsize(path) - header["data_offset"]) % self.record.size
+            if extra:
+                self.file.truncate(os.path.getsize(path) - extra)
+        else:
+            self.mode = MODE_COMPACT if compact else MODE_FULL
+            self.channel = channel
+            self.fields = list(fields)
+            self.record = record_struct(self.mode, len(self.fields))
+            self._create(time.time() if base_time is None else base_time)
+        self.field_index = {name: i for i, name in enumerate(self.fields)}
+
+    def append(self, values, timestamp: float = None):
+        """Buffer one record; values is a sequence in field order or a {field: value} dict"""
+        timestamp = time.time() if timestamp is None else timestamp
+        if isinstance(values, dict):
+            row = [math.nan] * len(self.fields)
+            for name, value in values.items():
+                if name in self.field_index:
+                    row[self.field_index[name]] = value
+            values = row
+        with self.lock:
+            if self.mode == MODE_COMPACT:
+                stamp = max(0, int(round((timestamp - self.base_time) * 1000)))
+                if stamp > MAX_OFFSET_MS:
+                    self._roll_over(timestamp)
+                    stamp = max(0, int(round((timestamp - self.base_time) * 1000)))
+            else:
+                stamp = timestamp
+            self.pending += self.record.pack(stamp, *values)
+            self.pending_records += 1
+            if self.pending_records >= FLUSH_RECORDS or time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+                self._flush()
+
+    def _create(self, base_time: float):
+        self.base_time = math.floor(base_time)
+        meta = json.dumps({"channel": self.channel, "fields": self.fields}).encode("utf-8")
+        self.file = open(self.path, "wb")
+        self.file.write(HEADER.pack(MAGIC, self.mode, len(self.fields), self.base_time, len(meta)) + meta)
+        self.file.flush()
+
+    def _roll_over(self, timestamp: float):
+        """Keep the full file as <name>.<base time>.tjlog and start a new one based at timestamp"""
+        self._flush()
+        self.file.close()
+        stem, extension = os.path.splitext(self.path)
+        os.replace(self.path, f"{stem}.{int(self.base_time)}{extension}")
+        self._create(timestamp)
+
+    def _flush(self):
+        if self.pending:
+            self.file.write(self.pending)
+            self.file.flush()
+            self.pending.clear()
+            self.pending_records = 0
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            self._flush()
+            self.file.close()
+
+
+class LogStore:
+    """ChannelLogs by channel name inside one directory"""
+
+    def __init__(self, directory: str = LOG_DIR, compact: bool = True):
+        self.directory = directory
+        self.compact = compact
+        self.logs = {}
+        self.lock = threading.Lock()
+
+    def log(self, channel: str, fields, base_time: float = None) -> ChannelLog:
+        log = self.logs.get(channel)
+        if log is None:
+            with self.lock:
+                log = self.logs.get(channel)
+                if log is None:
+                    log = ChannelLog(log_path(channel, self.directory), channel, fields, self.compact, base_time)
+                    self.logs[channel] = log
+        return log
+
+    def append(self, channel: str, readings: dict, timestamp: float = None):
+        """Log a {field: value} reading; the first reading fixes the channel's fields"""
+        timestamp = time.time() if timestamp is None else timestamp
+        self.log(channel, list(readings), timestamp).append(readings, timestamp)
+
+    def flush(self, channel: str = None):
+        for name, log in list(self.logs.items()):
+            if channel is None or name == channel:
+                log.flush()
+
+    def close(self):
+        with self.lock:
+            for log in self.logs.values():
+                log.close()
+            self.logs.clear()
+
+    def channels(self) -> list:
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in sorted(os.listdir(self.directory)):
+            if name.endswith(EXTENSION):
+                path = os.path.join(self.directory, name)
+                try:
+                    with LogReader(path) as reader:
+                        entries.append({
+                            "name": name[:-len(EXTENSION)],
+                            "channel": reader.channel,
+                            "fields": reader.fields,
+                            "records": len(reader),
+                            "bytes": os.path.getsize(path),
+                            "first": reader.timestamp(0) if len(reader) else None,
+                            "last": reader.timestamp(len(reader) - 1) if len(reader) else None,
+                        })
+                except ValueError:
+                    continue
+        return entries
+
+
+# ==================== READING ====================
+
+class LogReader:
+    """Memory-mapped, read-only view of a log file's complete records"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, "rb")
+        header = read_header(self.file)
+        self.mode = header["mode"]
+        self.base_time = header["base_time"]
+        self.channel = header["channel"]
+        self.fields = header["fields"]
+        self.offset = header["data_offset"]
+        self.record = record_struct(self.mode, len(self.fields))
+        size = os.fstat(self.file.fileno()).st_size
+        self.count = max(0, size - self.offset) // self.record.size
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) if self.count else None
+        self.stamp = struct.Struct("<I" if self.mode == MODE_COMPACT else "<d")
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        self.file.close()
+
+    def _time(self, raw) -> float:
+        return self.base_time + raw / 1000 if self.mode == MODE_COMPACT else raw
+
+    def timestamp(self, index: int) -> float:
+        return self._time(self.stamp.unpack_from(self.map, self.offset + index * self.record.size)[0])
+
+    def bisect(self, timestamp: float) -> int:
+        """Index of the first record at or after timestamp"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamp(middle) < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def iter_range(self, start: float = None, end: float = None, batch: int = EXPORT_BATCH):
+        """Yield lists of (timestamp, values) for start <= t <= end, batch records at a time"""
+        if not self.count:
+            return
+        first = 0 if start is None else self.bisect(start)
+        last = self.count if end is None else self.bisect(end + 1e-6)
+        size = self.record.size
+        for index in range(first, last, batch):
+            stop = min(index + batch, last)
+            view = memoryview(self.map)[self.offset + index * size:self.offset + stop * size]
+            try:
+                rows = [(self._time(row[0]), row[1:]) for row in self.record.iter_unpack(view)]
+            finally:
+                view.release()
+            yield rows
+
+
+def _number(value) -> str:
+    return "" if value != value else repr(value)  # NaN -> empty cell
+
+
+def export_csv(reader: LogReader, start: float = None, end: float = None):
+    """Yield CSV text in chunks"""
+    yield "timestamp," + ",".join(reader.fields) + "\n"
+    for rows in reader.iter_range(start, end):
+        yield "".join(f"{t:.3f}," + ",".join(_number(v) for v in values) + "\n" for t, values in rows)
+
+
+def export_json(reader: LogReader, start: float = None, end: float = None):
+    """Yield a JSON document in chunks: {"channel", "fields", "records": [[t, v...], ...]}"""
+    yield json.dumps({"channel": reader.channel, "fields": reader.fields})[:-1] + ', "records": ['
+    separator = ""
+    for rows in reader.iter_range(start, end):
+        chunk = ",".join(json.dumps([round(t, 3)] + [None if v != v else v for v in values]) for t, values in rows)
+        yield separator + chunk
+        separator = ","
+    yield "]}\n"
+
+
+EXPORTERS = {"csv": export_csv, "json": export_json}
+
+STORE = LogStore()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Export a Test Jig binary log")
+    parser.add_argument("path", type=str, help="Log file (.tjlog)")
+    parser.add_argument("--format", type=str, default="csv", choices=list(EXPORTERS), help="Output format")
+    parser.add_argument("--start", type=float, default=None, help="First timestamp (epoch seconds)")
+    parser.add_argument("--end", type=float, default=None, help="Last timestamp (epoch seconds)")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    with LogReader(args.path) as reader:
+        for chunk in EXPORTERS[args.format](reader, args.start, args.end):
+            sys.stdout.write(chunk)
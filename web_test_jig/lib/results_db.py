@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Production test results stored in SQLite
+
+Each run of a device test is one row: DUT serial, fixture, protocol,
+device, verdict, duration and its measurements with limits (a JSON
+object {name: {"value", "low", "high", "unit"}}). The database runs in
+WAL mode with synchronous=NORMAL so readers never block the writer and a
+commit is a sequential append to the WAL instead of a random SD card
+write. Runs are queued and inserted with executemany in one transaction
+per batch (every BATCH_SIZE runs, and before any query). A queued run
+is never held longer than FLUSH_INTERVAL seconds: a timer flushes the
+batch even when no further run or query follows.
+
+History pages use keyset pagination on (started, id), so page 1000 costs
+the same as page 1 with hundreds of thousands of rows.
+"""
+
+import atexit
+import json
+import sqlite3
+import threading
+import time
+
+DB_PATH = "results.db"
+BATCH_SIZE = 64
+FLUSH_INTERVAL = 1.0
+MAX_PAGE = 500
+
+VERDICTS = ("pass", "fail", "error")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    duration_ms REAL,
+    serial TEXT,
+    fixture TEXT,
+    protocol TEXT,
+    device TEXT NOT NULL,
+    verdict TEXT NOT NULL,
+    measurements TEXT,
+    message TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_serial ON runs (serial, started);
+CREATE INDEX IF NOT EXISTS runs_started ON runs (started);
+CREATE INDEX IF NOT EXISTS runs_device ON runs (device, started);
+"""
+
+COLUMNS = ("started", "duration_ms", "serial", "fixture", "protocol", "device", "verdict", "measurements", "message")
+INSERT = f"INSERT INTO runs ({', '.join(COLUMNS)}) VALUES ({', '.join('?' * len(COLUMNS))})"
+
+# query parameter -> SQL condition
+FILTERS = {
+    "serial": "serial = ?",
+    "fixture": "fixture = ?",
+    "protocol": "protocol = ?",
+    "device": "device = ?",
+    "verdict": "verdict = ?",
+    "since": "started >= ?",
+    "until": "started < ?",
+}
+
+GROUPS = {
+    "device": "device",
+    "fixture": "fixture",
+    "protocol": "protocol",
+    "day": "date(started, 'unixepoch', 'localtime')",
+    "hour": "strftime('%Y-%m-%d %H:00', started, 'unixepoch', 'localtime')",
+}
+
+
+def judge(measurements: dict) -> str:
+    """Verdict from measurement limits: fail if any value is outside [low, high]"""
+    for measurement in measurements.values():
+        value = measurement.get("value")
+        if value is None:
+            return "error"
+        low, high = measurement.get("low"), measurement.get("high")
+        if (low is not None and value < low) or (high is not None and value > high):
+            return "fail"
+    return "pass"
+
+
+def _where(filters: dict):
+    conditions, params = [], []
+    for name, value in filters.items():
+        if value not in (None, "") and name in FILTERS:
+            conditions.append(FILTERS[name])
+            params.append(value)
+    return (" WHERE " + " AND ".join(conditions)) if conditions else "", params
+
+
+class ResultsDB:
+    """Batched writer and query helper for the results database"""
+
+    def __init__(self, path: str = DB_PATH):
+        self.path = path
+        self.lock = threading.Lock()
+        self.pending = []
+        self.last_flush = time.monotonic()
+        self._timer = None  # pending deferred flush
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("PRAGMA busy_timeout=5000")
+        self.connection.executescript(SCHEMA)
+        atexit.register(self.close)
+
+    def record(self, device: str, verdict: str = None, measurements: dict = None, serial: str = None,
+               fixture: str = None, protocol: str = None, duration_ms: float = None,
+               message: str = None, started: float = None):
+        """Queue one test run; the verdict is judged from the limits when not given"""
+        measurements = measurements or {}
+        verdict = (verdict or judge(measurements)).lower()
+        if verdict not in VERDICTS:
+            raise ValueError(f"Verdict must be one of {VERDICTS}, got '{verdict}'")
+        row = (time.time() if started is None else started, duration_ms, serial, fixture, protocol,
+               device, verdict, json.dumps(measurements) if measurements else None, message)
+        with self.lock:
+            self.pending.append(row)
+            if len(self.pending) >= BATCH_SIZE or time.monotonic() - self.last_flush >= FLUSH_INTERVAL:
+                self._flush()
+            elif self._timer is None:
+                self._timer = threading.Timer(FLUSH_INTERVAL, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return verdict
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self.pending:
+            with self.connection:
+                self.connection.executemany(INSERT, self.pending)
+            self.pending.clear()
+        self.last_flush = time.monotonic()
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def close(self):
+        with self.lock:
+            try:
+                self._flush()
+                self.connection.close()
+            except sqlite3.ProgrammingError:
+                pass  # already closed
+
+    def _query(self, sql: str, params) -> list:
+        with self.lock:
+            self._flush()
+            return self.connection.execute(sql, params).fetchall()
+
+    def history(self, limit: int = 50, cursor: str = "", **filters) -> dict:
+        """Newest runs first; pass the returned next_cursor to get the following page"""
+        where, params = _where(filters)
+        if cursor:
+            started, run_id = cursor.split(":")
+            where += (" AND " if where else " WHERE ") + "(started, id) < (?, ?)"
+            params += [float(started), int(run_id)]
+        limit = max(1, min(limit, MAX_PAGE))
+        rows = self._query(f"SELECT * FROM runs{where} ORDER BY started DESC, id DESC LIMIT ?", params + [limit])
+        runs = []
+        for row in rows:
+            run = dict(row)
+            run["measurements"] = json.loads(run["measurements"]) if run["measurements"] else {}
+            runs.append(run)
+        next_cursor = f"{runs[-1]['started']!r}:{runs[-1]['id']}" if len(runs) == limit else None
+        return {"runs": runs, "next_cursor": next_cursor}
+
+    def yield_stats(self, group_by: str = "device", **filters) -> dict:
+        """Run counts, yield and first-pass yield per group"""
+        if group_by not in GROUPS:
+            raise ValueError(f"group_by must be one of {list(GROUPS)}")
+        where, params = _where(filters)
+        group = GROUPS[group_by]
+        rows = self._query(f"""
+            SELECT {group} AS grp,
+                   COUNT(*) AS runs,
+                   SUM(verdict = 'pass') AS passed,
+                   SUM(verdict = 'fail') AS failed,
+                   SUM(verdict = 'error') AS errors,
+                   AVG(duration_ms) AS mean_duration_ms,
+                   MIN(started) AS first, MAX(started) AS last
+            FROM runs{where} GROUP BY grp ORDER BY grp""", params)
+        # first-pass yield: the verdict of each serial's first run in each group
+        first_pass = {r["grp"]: (r["units"], r["passed"]) for r in self._query(f"""
+            SELECT grp, COUNT(*) AS units, SUM(verdict = 'pass') AS passed FROM (
+                SELECT {group} AS grp, verdict,
+                       ROW_NUMBER() OVER (PARTITION BY serial, {group} ORDER BY started, id) AS attempt
+                FROM runs{where}{' AND' if where else ' WHERE'} serial IS NOT NULL
+            ) WHERE attempt = 1 GROUP BY grp""", params)}
+        groups = []
+        for row in rows:
+            entry = dict(row)
+            entry[group_by] = entry.pop("grp")
+            entry["yield_pct"] = round(100.0 * entry["passed"] / entry["runs"], 2) if entry["runs"] else None
+            units, passed = first_pass.get(entry[group_by], (0, 0))
+            entry["units"] = units
+            entry["first_pass_yield_pct"] = round(100.0 * passed / units, 2) if units else None
+            groups.append(entry)
+        total = sum(g["runs"] for g in groups)
+        passed = sum(g["passed"] for g in groups)
+        return {
+            "group_by": group_by,
+            "runs": total,
+            "passed": passed,
+            "yield_pct": round(100.0 * passed / total, 2) if total else None,
+            "groups": groups,
+        }
+
+
+_DB = None
+_DB_LOCK = threading.Lock()
+
+
+def get_db() -> ResultsDB:
+    """Shared ResultsDB, opened on first use"""
+    global _DB
+    with _DB_LOCK:
+        if _DB is None:
+            _DB = ResultsDB()
+        return _DB
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Jig power-on self-test
+
+Probes the jig's own buses (I2C bus 1 and the ADS1115 on it, the UARTs,
+spidev, the 1-Wire sysfs tree and a GPIO input line) concurrently, each
+in a daemon thread with its own time budget. A probe that hangs (a stuck
+I2C bus, a USB adapter that never answers) is reported as "timeout"
+when its budget runs out instead of holding up the rest.
+
+The report is kept in memory and written to READINESS_FILE, so the web
+UI (GET /readiness) and the CLI show it instantly without re-probing.
+
+    python -m lib.selftest            # run and cache the self-test
+    python -m lib.selftest --cached   # print the last cached report
+"""
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+READINESS_FILE = "readiness.json"
+EXPECTED_I2C = {0x23: "BH1750", 0x48: "ADS1115", 0x5A: "MLX90614"}
+ADS1115_ADDRESS = 0x48
+ADS1115_CONFIG = 0x01
+BUTTON_PIN = 6
+
+_REPORT = None
+_LOCK = threading.Lock()
+
+
+# ==================== PROBES ====================
+# Each probe returns a detail string on success and raises on failure.
+
+def probe_i2c():
+    from lib.hal import smbus2
+    with smbus2.SMBus(1) as bus:
+        found, missing = [], []
+        for address, name in EXPECTED_I2C.items():
+            try:
+                bus.read_byte(address)
+                found.append(f"{name} 0x{address:02X}")
+            except OSError:
+                missing.append(f"{name} 0x{address:02X}")
+    if not found:
+        raise RuntimeError("bus 1 opened but no expected device answered")
+    return "found " + ", ".join(found) + (f"; missing {', '.join(missing)}" if missing else "")
+
+
+def probe_ads1115():
+    from lib.hal import smbus2
+    with smbus2.SMBus(1) as bus:
+        config = bus.read_word_data(ADS1115_ADDRESS, ADS1115_CONFIG)
+    config = ((config & 0xFF) << 8) | (config >> 8)  # SMBus words are little-endian, the ADS1115 is not
+    return f"config register 0x{config:04X}"
+
+
+def serial_probe(port):
+    def probe():
+        from lib.hal import serial
+        with serial.Serial(port, baudrate=9600, timeout=0) as ser:
+            waiting = ser.in_waiting
+        return f"{port} open, {waiting} byte(s) waiting"
+    return probe
+
+
+def probe_spi():
+    from lib.hal import spidev
+    spi = spidev.SpiDev()
+    spi.open(0, 0)
+    try:
+        spi.max_speed_hz = 500000
+        spi.xfer2([0x00])
+    finally:
+        spi.close()
+    return "spidev0.0 open"
+
+
+def probe_w1():
+    from lib import hal
+    base_dir = hal.w1_base_dir()
+    sensors = [name for name in os.listdir(base_dir) if name.startswith("28")]
+    if not sensors:
+        raise RuntimeError(f"no DS18B20 under {base_dir}")
+    return f"{len(sensors)} sensor(s): {', '.join(sensors)}"
+
+
+def probe_gpio():
+    from lib.hal import GPIO
+    GPIO.setwarnings(False)
+    GPIO.setmode(GPIO.BCM)
+    GPIO.setup(BUTTON_PIN, GPIO.IN, pull_up_down=GPIO.PUD_UP)
+    level = GPIO.input(BUTTON_PIN)
+    return f"GPIO {BUTTON_PIN} reads {'high' if level else 'low'}"
+
+
+# (name, probe, budget in seconds, required for readiness)
+PROBES = [
+    ("i2c-1", probe_i2c, 1.0, True),
+    ("ads1115", probe_ads1115, 0.5, True),
+    ("uart-ttyS0", serial_probe("/dev/ttyS0"), 1.0, True),
+    ("uart-ttyUSB0", serial_probe("/dev/ttyUSB0"), 1.0, False),
+    ("spi-0.0", probe_spi, 0.5, True),
+    ("w1", probe_w1, 1.0, False),
+    ("gpio", probe_gpio, 0.5, True),
+]
+
+
+# ==================== RUNNER ====================
+
+def _run_probe(probe, result: dict):
+    start = time.perf_counter()
+    try:
+        result["detail"] = probe()
+        result["status"] = "ok"
+    except Exception as e:
+        result["detail"] = f"{type(e).__name__}: {e}"
+        result["status"] = "fail"
+    result["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+
+
+def run_selftest(probes=None) -> dict:
+    """Run every probe concurrently and return (and cache) the report"""
+    probes = PROBES if probes is None else probes
+    started_at = time.time()
+    start = time.perf_counter()
+    running = []
+    for name, probe, budget, required in probes:
+        result = {"name": name, "status": "running", "detail": "", "required": required,
+                  "budget_ms": budget * 1000, "duration_ms": None}
+        thread = threading.Thread(target=_run_probe, args=(probe, result), name=f"selftest-{name}", daemon=True)
+        thread.start()
+        running.append((thread, start + budget, result))
+
+    results = []
+    for thread, deadline, result in running:
+        thread.join(max(0.0, deadline - time.perf_counter()))
+        if thread.is_alive():
+            # the thread is abandoned; it is a daemon, so it cannot block shutdown
+            result = dict(result, status="timeout", detail=f"no answer within {result['budget_ms']:.0f} ms",
+                          duration_ms=result["budget_ms"])
+        results.append(result)
+
+    report = {
+        "started": started_at,
+        "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+        "ready": all(r["status"] == "ok" for r in results if r["required"]),
+        "probes": results,
+    }
+    save(report)
+    return report
+
+
+def save(report: dict, path: str = READINESS_FILE):
+    global _REPORT
+    with _LOCK:
+        _REPORT = report
+        try:
+            with open(path + ".tmp", "w") as f:
+                json.dump(report, f, indent=2)
+            os.replace(path + ".tmp", path)
+        except OSError:
+            pass  # read-only install: the in-memory copy still serves /readiness
+
+
+def cached(path: str = READINESS_FILE):
+    """Last report from this process, else from READINESS_FILE, else None"""
+    with _LOCK:
+        if _REPORT is not None:
+            return _REPORT
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def start_background():
+    """Run the self-test in a daemon thread (for application startup)"""
+    thread = threading.Thread(target=run_selftest, name="selftest", daemon=True)
+    thread.start()
+    return thread
+
+
+def format_report(report: dict) -> str:
+    if report is None:
+        return "Self-test has not run yet (python -m lib.selftest)"
+    age = time.time() - report["started"]
+    lines = [f"{'✅ Jig ready' if report['ready'] else '❌ Jig NOT ready'} "
+             f"(self-test {age:.0f} s ago, {report['duration_ms']:.0f} ms)"]
+    for probe in report["probes"]:
+        mark = "✅" if probe["status"] == "ok" else ("❌" if probe["required"] else "⚠️")
+        lines.append(f"  {mark} {probe['name']:13s} {probe['status']:8s} {probe['detail']}")
+    return "\n".join(lines)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test Jig power-on self-test")
+    parser.add_argument("--cached", action="store_true", help="Print the last cached report without probing")
+    parser.add_argument("--quiet", action="store_true", help="Only set the exit code")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    report = cached() if args.cached else run_selftest()
+    if not args.quiet:
+        print(format_report(report))
+    sys.exit(0 if report and report["ready"] else 1)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+"""
+Streaming statistics per channel
+
+Every channel (the same names as lib.timeseries, e.g.
+"adc/tds/TDS Value") gets a ChannelStats that is updated in O(1) per
+sample and never rescans raw history:
+
+    total    count, mean, std, min, max since the last reset (Welford)
+             and p50/p90/p99 from P² estimators
+    window   mean, std, min, max over the WINDOW_SECONDS up to the
+             newest sample (running sums plus monotonic min/max queues),
+             and percentiles from P² estimators restarted every window,
+             reported for the last complete window once there is one
+"""
+
+import math
+import threading
+import time
+from collections import deque
+
+WINDOW_SECONDS = 60.0
+QUANTILES = (0.5, 0.9, 0.99)
+
+
+class Welford:
+    """Running count, mean, variance, min and max"""
+
+    __slots__ = ("count", "mean", "m2", "min", "max")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, x: float):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+        if x < self.min:
+            self.min = x
+        if x > self.max:
+            self.max = x
+
+    def remove(self, x: float):
+        """Undo add(x) for mean and variance (min/max are not tracked on removal)"""
+        self.count -= 1
+        if self.count <= 0:
+            self.count, self.mean, self.m2 = 0, 0.0, 0.0
+            return
+        delta = x - self.mean
+        self.mean -= delta / self.count
+        self.m2 = max(0.0, self.m2 - delta * (x - self.mean))
+
+    @property
+    def std(self) -> float:
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+class P2Quantile:
+    """P² single-quantile estimator (Jain & Chlamtac): five markers, O(1) memory"""
+
+    __slots__ = ("p", "count", "heights", "positions", "desired", "increments")
+
+    def __init__(self, p: float):
+        self.p = p
+        self.count = 0
+        self.heights = []
+        self.positions = [1, 2, 3, 4, 5]
+        self.desired = [1, 1 + 2 * p, 1 + 4 * p, 3 + 2 * p, 5]
+        self.increments = [0, p / 2, p, (1 + p) / 2, 1]
+
+    def add(self, x: float):
+        q, n = self.heights, self.positions
+        self.count += 1
+        if self.count <= 5:
+            q.append(x)
+            if self.count == 5:
+                q.sort()
+            return
+        if x < q[0]:
+            q[0] = x
+            k = 0
+        elif x >= q[4]:
+            q[4] = x
+            k = 3
+        else:
+            k = 0
+            while x >= q[k + 1]:
+                k += 1
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increments[i]
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    def value(self):
+        if self.count == 0:
+            return None
+        if self.count < 5:
+            ordered = sorted(self.heights)
+            return ordered[min(len(ordered) - 1, int(round(self.p * (len(ordered) - 1))))]
+        return self.heights[2]
+
+
+def _quantiles(estimators) -> dict:
+    return {f"p{round(e.p * 100):g}": e.value() for e in estimators}
+
+
+class ChannelStats:
+    """Cumulative and rolling-window statistics for one channel"""
+
+    def __init__(self, window: float = WINDOW_SECONDS, quantiles=QUANTILES):
+        self.window = window
+        self.quantile_levels = quantiles
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.total = Welford()
+        self.total_quantiles = [P2Quantile(p) for p in self.quantile_levels]
+        self.recent = Welford()
+        self.samples = deque()   # (sequence, timestamp, value) inside the window
+        self.minimums = deque()  # (sequence, value), values increasing
+        self.maximums = deque()  # (sequence, value), values decreasing
+        self.sequence = 0
+        self.window_quantiles = [P2Quantile(p) for p in self.quantile_levels]
+        self.window_started = None
+        self.completed_quantiles = None
+        self.last = None
+
+    def add(self, value: float, timestamp: float = None):
+        timestamp = time.time() if timestamp is None else timestamp
+        with self.lock:
+            self.total.add(value)
+            for estimator in self.total_quantiles:
+                estimator.add(value)
+            self.last = (timestamp, value)
+
+            self.sequence += 1
+            self.samples.append((self.sequence, timestamp, value))
+            self.recent.add(value)
+            while self.minimums and self.minimums[-1][1] >= value:
+                self.minimums.pop()
+            self.minimums.append((self.sequence, value))
+            while self.maximums and self.maximums[-1][1] <= value:
+                self.maximums.pop()
+            self.maximums.append((self.sequence, value))
+            self._evict(timestamp)
+
+            if self.window_started is None:
+                self.window_started = timestamp
+            elif timestamp - self.window_started >= self.window:
+                self.completed_quantiles = _quantiles(self.window_quantiles)
+                self.window_quantiles = [P2Quantile(p) for p in self.quantile_levels]
+                self.window_started = timestamp
+            for estimator in self.window_quantiles:
+                estimator.add(value)
+
+    def _evict(self, now: float):
+        while self.samples and self.samples[0][1] < now - self.window:
+            sequence, _, value = self.samples.popleft()
+            self.recent.remove(value)
+            if self.minimums and self.minimums[0][0] <= sequence:
+                self.minimums.popleft()
+            if self.maximums and self.maximums[0][0] <= sequence:
+                self.maximums.popleft()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            total, recent = self.total, self.recent
+            return {
+                "last": None if self.last is None else {"t": self.last[0], "value": self.last[1]},
+                "total": {
+                    "count": total.count,
+                    "mean": total.mean if total.count else None,
+                    "std": total.std,
+                    "min": total.min if total.count else None,
+                    "max": total.max if total.count else None,
+                    **_quantiles(self.total_quantiles),
+                },
+                "window": {
+                    "seconds": self.window,
+                    "count": recent.count,
+                    "mean": recent.mean if recent.count else None,
+                    "std": recent.std,
+                    "min": self.minimums[0][1] if self.minimums else None,
+                    "max": self.maximums[0][1] if self.maximums else None,
+                    **(self.completed_quantiles or _quantiles(self.window_quantiles)),
+                },
+            }
+
+
+class StatsRegistry:
+    """ChannelStats by channel name, created on first sample"""
+
+    def __init__(self, window: float = WINDOW_SECONDS):
+        self.window = window
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def channel(self, name: str) -> ChannelStats:
+        stats = self.channels.get(name)
+        if stats is None:
+            with self.lock:
+                stats = self.channels.setdefault(name, ChannelStats(self.window))
+        return stats
+
+    def add(self, name: str, value: float, timestamp: float = None):
+        self.channel(name).add(value, timestamp)
+
+    def add_readings(self, prefix: str, readings: dict, timestamp: float = None):
+        """Update prefix/label for every {label: value} reading"""
+        for label, value in readings.items():
+            self.add(f"{prefix}/{label}", value, timestamp)
+
+    def names(self) -> list:
+        return sorted(self.channels)
+
+    def snapshot(self, name: str = None) -> dict:
+        if name is not None:
+            if name not in self.channels:
+                raise KeyError(name)
+            return {name: self.channels[name].snapshot()}
+        return {channel: self.channels[channel].snapshot() for channel in self.names()}
+
+    def reset(self, name: str = None):
+        for channel, stats in list(self.channels.items()):
+            if name is None or channel == name:
+                stats.reset()
+
+
+STATS = StatsRegistry()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+"""
+Declarative production test plans
+
+A plan (JSON, or YAML when PyYAML is installed) lists the devices to
+check on a board, how many samples to take and the limits each
+measurement must meet:
+
+    name: Sensor board rev B
+    fixture: F1
+    steps:
+      - device: bh1750
+        samples: 5
+        limits:
+          lux: {low: 10, high: 20000, unit: lx}
+      - device: sds011
+        samples: 3
+        limits:
+          pm25: {high: 500, unit: ug/m3}
+
+Steps are grouped by the physical bus they use (SAMPLERS gives each
+device its default bus; a step may override it with "bus"). Steps on
+one bus run in plan order, while different buses run concurrently, so a
+board's cycle time is that of its slowest bus instead of the sum of all
+steps. The report gives per-step timing, measurements against limits
+and an overall verdict, and can be stored in the results database.
+"""
+
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from lib.stats import Welford
+
+PLAN_DIR = "plans"
+CHECKS = ("mean", "all")
+
+
+# ==================== SAMPLERS ====================
+# Each factory opens the device once and returns a callable that takes
+# one sample as {measurement: value}.
+
+def bh1750_sampler(step):
+    from lib.I2C.BH1750 import BH1750
+    sensor = BH1750()
+    delay = step.get("conversion_delay", 0.2)
+    return lambda: {"lux": sensor.read_lux(delay=delay)}
+
+
+def mlx90614_sampler(step):
+    from lib.I2C.mlx90614 import MLX90614
+    sensor = MLX90614()
+    return lambda: {"object_temp": sensor.read_temperature()}
+
+
+def ads1115_sampler(step):
+    from lib.hal import ADS, AnalogIn, open_busio_i2c
+    ads = ADS.ADS1115(open_busio_i2c())
+    channel = AnalogIn(ads, getattr(ADS, f"P{step.get('channel', 0)}"))
+    return lambda: {"raw": channel.value, "voltage": channel.voltage}
+
+
+def tds_sampler(step):
+    from lib.ADC.tds import TDS_Sensor
+    sensor = TDS_Sensor(channel=step.get("channel", 0))
+    return lambda: {"tds": sensor.read_tds()}
+
+
+def sds011_sampler(step):
+    from lib.UART.PM_Sensor import SDS011
+    sensor = SDS011(port=step.get("port", "/dev/ttyS0"))
+
+    def sample():
+        pm25, pm10 = sensor.read()
+        return {"pm25": pm25, "pm10": pm10}
+    return sample
+
+
+def ds18b20_sampler(step):
+    from lib.GPIO.DS18B20 import DS18B20
+    sensor = DS18B20()
+    return lambda: {"temperature": sensor.read_temp()}
+
+
+def dht11_sampler(step):
+    from lib.hal import board
+    from lib.GPIO.dht import DHTSensor
+    sensor = DHTSensor(pin=getattr(board, f"D{step.get('pin', 13)}"))
+
+    def sample():
+        for _ in range(step.get("retries", 5)):
+            try:
+                temperature, humidity = sensor.dht_device.temperature, sensor.dht_device.humidity
+                if temperature is not None and humidity is not None:
+                    return {"temperature": temperature, "humidity": humidity}
+            except RuntimeError:
+                pass  # checksum or timing error, the sensor needs another try
+            time.sleep(step.get("retry_delay", 1.0))
+        return {"temperature": None, "humidity": None}
+    return sample
+
+
+def ultrasonic_sampler(step):
+    from lib.GPIO.ultrasonic import UltrasonicSensor
+    sensor = UltrasonicSensor(trigger_pin=step.get("trigger_pin", 26), echo_pin=step.get("echo_pin", 19))
+    return lambda: {"distance": sensor.measure_distance()}
+
+
+def button_sampler(step):
+    from lib.GPIO.button import ButtonController
+    button = ButtonController(step.get("pin", 6))
+    return lambda: {"pressed": 1.0 if button.button_pressed() else 0.0}
+
+
+# device -> (default bus, sampler factory)
+SAMPLERS = {
+    "bh1750": ("i2c-1", bh1750_sampler),
+    "mlx90614": ("i2c-1", mlx90614_sampler),
+    "pot": ("i2c-1", ads1115_sampler),
+    "ldr": ("i2c-1", ads1115_sampler),
+    "tds": ("i2c-1", tds_sampler),
+    "sds011": ("uart-ttyS0", sds011_sampler),
+    "pm sensor": ("uart-ttyS0", sds011_sampler),
+    "ds18b20": ("w1", ds18b20_sampler),
+    "dht11": ("gpio-13", dht11_sampler),
+    "ultrasonic sensor": ("gpio-26", ultrasonic_sampler),
+    "button": ("gpio-6", button_sampler),
+}
+
+
+# ==================== LOADING ====================
+
+def load_plan(source) -> dict:
+    """Load a plan from a dict, a JSON/YAML file, or a file name inside PLAN_DIR"""
+    if isinstance(source, dict):
+        plan = source
+    else:
+        path = source if os.path.exists(source) else os.path.join(PLAN_DIR, os.path.basename(source))
+        with open(path) as f:
+            if path.endswith((".yaml", ".yml")):
+                try:
+                    import yaml
+                except ImportError:
+                    raise ValueError("YAML plans need PyYAML (pip install pyyaml); use JSON instead")
+                plan = yaml.safe_load(f)
+            else:
+                plan = json.load(f)
+    validate(plan)
+    return plan
+
+
+def validate(plan: dict):
+    if not isinstance(plan, dict) or not isinstance(plan.get("steps"), list) or not plan["steps"]:
+        raise ValueError("A test plan needs a non-empty 'steps' list")
+    for number, step in enumerate(plan["steps"], 1):
+        device = str(step.get("device", "")).lower()
+        if device not in SAMPLERS:
+            raise ValueError(f"Step {number}: unknown device '{step.get('device')}'. Known: {', '.join(SAMPLERS)}")
+        if step.get("check", "mean") not in CHECKS:
+            raise ValueError(f"Step {number}: check must be one of {CHECKS}")
+        if int(step.get("samples", 1)) < 1:
+            raise ValueError(f"Step {number}: samples must be at least 1")
+        for name, limit in step.get("limits", {}).items():
+            if not isinstance(limit, dict):
+                raise ValueError(f"Step {number}: limit '{name}' must be a mapping with low/high")
+
+
+# ==================== EXECUTION ====================
+
+def _outside(value, limit) -> bool:
+    low, high = limit.get("low"), limit.get("high")
+    return (low is not None and value < low) or (high is not None and value > high)
+
+
+def run_step(step: dict, started: float) -> dict:
+    """Open the device, take the samples and judge them against the limits"""
+    device = step["device"].lower()
+    samples = int(step.get("samples", 1))
+    interval = float(step.get("interval", 0))
+    limits = step.get("limits", {})
+    t0 = time.perf_counter()
+    result = {
+        "name": step.get("name", device),
+        "device": device,
+        "bus": step.get("bus") or SAMPLERS[device][0],
+        "start_ms": round((t0 - started) * 1000, 1),
+        "samples": samples,
+        "verdict": "pass",
+        "measurements": {},
+        "message": "",
+    }
+    try:
+        sample = SAMPLERS[device][1](step)
+        values = {}
+        for i in range(samples):
+            if i and interval:
+                time.sleep(interval)
+            for name, value in sample().items():
+                values.setdefault(name, []).append(value)
+    except Exception as e:
+        result.update(verdict="error", message=f"{type(e).__name__}: {e}")
+        values = {}
+
+    for name, readings in values.items():
+        limit = limits.get(name, {})
+        valid = [v for v in readings if v is not None]
+        entry = {"value": None, "min": None, "max": None, "std": None, "low": limit.get("low"),
+                 "high": limit.get("high"), "unit": limit.get("unit")}
+        if valid:
+            summary = Welford()
+            for value in valid:
+                summary.add(value)
+            entry.update(value=summary.mean, min=summary.min, max=summary.max, std=summary.std)
+        result["measurements"][name] = entry
+        if not limit:
+            continue
+        if len(valid) < len(readings):
+            result["verdict"] = "error"
+            result["message"] = f"{len(readings) - len(valid)} of {len(readings)} '{name}' samples failed"
+        elif result["verdict"] == "pass":
+            checked = valid if step.get("check", "mean") == "all" else [entry["value"]]
+            if any(_outside(v, limit) for v in checked):
+                result["verdict"] = "fail"
+    missing = [name for name in limits if name not in values]
+    if missing and result["verdict"] == "pass":
+        result.update(verdict="error", message=f"No measurement named {', '.join(missing)}")
+    result["duration_ms"] = round((time.perf_counter() - t0) * 1000, 1)
+    return result
+
+
+def run_bus(steps: list, started: float) -> list:
+    return [run_step(step, started) for step in steps]
+
+
+def run_plan(plan: dict, serial: str = None, fixture: str = None, store: bool = False) -> dict:
+    """Execute a plan, one thread per bus, and return the report"""
+    validate(plan)
+    buses = {}
+    for index, step in enumerate(plan["steps"]):
+        bus = step.get("bus") or SAMPLERS[step["device"].lower()][0]
+        buses.setdefault(bus, []).append((index, step))
+
+    started_at = time.time()
+    started = time.perf_counter()
+    results = [None] * len(plan["steps"])
+    bus_times = {}
+    with ThreadPoolExecutor(max_workers=len(buses), thread_name_prefix="testplan") as executor:
+        futures = {bus: executor.submit(run_bus, [step for _, step in entries], started)
+                   for bus, entries in buses.items()}
+        for bus, future in futures.items():
+            for (index, _), result in zip(buses[bus], future.result()):
+                results[index] = result
+            bus_times[bus] = round(sum(r["duration_ms"] for r in future.result()), 1)
+
+    verdicts = {r["verdict"] for r in results}
+    report = {
+        "plan": plan.get("name", "unnamed plan"),
+        "serial": serial or plan.get("serial"),
+        "fixture": fixture or plan.get("fixture"),
+        "started": started_at,
+        "verdict": "error" if "error" in verdicts else "fail" if "fail" in verdicts else "pass",
+        "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+        "sequential_ms": round(sum(r["duration_ms"] for r in results), 1),
+        "buses": bus_times,
+        "steps": results,
+    }
+    if store:
+        store_report(report)
+    return report
+
+
+def store_report(report: dict):
+    """Save every step of a report as a run in the results database"""
+    from lib.results_db import get_db
+    db = get_db()
+    for step in report["steps"]:
+        db.record(device=step["device"], verdict=step["verdict"], serial=report["serial"],
+                  fixture=report["fixture"], protocol=step["bus"], duration_ms=step["duration_ms"],
+                  message=step["message"] or None, started=report["started"] + step["start_ms"] / 1000,
+                  measurements={name: {k: m[k] for k in ("value", "low", "high", "unit") if m[k] is not None}
+                                for name, m in step["measurements"].items()})
+    db.flush()
+
+
+def format_report(report: dict) -> str:
+    lines = [f"Plan: {report['plan']}  Serial: {report['serial'] or '-'}  Fixture: {report['fixture'] or '-'}"]
+    for step in report["steps"]:
+        mark = "✅" if step["verdict"] == "pass" else "❌"
+        values = ", ".join(f"{name}={m['value']:.3g}{' ' + m['unit'] if m['unit'] else ''}"
+                           for name, m in step["measurements"].items() if m["value"] is not None)
+        lines.append(f"{mark} {step['name']:18s} {step['bus']:11s} {step['duration_ms']:8.1f} ms  "
+                     f"{step['verdict'].upper():5s} {values} {step['message']}".rstrip())
+    lines.append(f"Verdict: {report['verdict'].upper()}  {report['duration_ms']:.1f} ms "
+                 f"({report['sequential_ms']:.1f} ms if run one step at a time)")
+    return "\n".join(lines)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+In-memory time series of the readings streamed by run_test
+
+Every channel (e.g. "i2c/bh1750/Light level") keeps its newest samples
+in a fixed-size ring of two array('d') columns, timestamps and values,
+so memory is allocated once per channel and never grows. Ranges are
+located by binary search on the timestamps and can be decimated to a
+requested number of min/max/mean buckets, which keeps chart responses
+small whatever the time span.
+"""
+
+import re
+import threading
+import time
+from array import array
+
+DEFAULT_CAPACITY = 43200  # 12 hours at one sample per second, ~690 KB per channel
+
+# "Label: number" pairs in a driver's result string, e.g.
+# "Temperature: 27.0°C<br>Humidity: 49.0%" or "Voltage : 2.07"
+READING = re.compile(r"([A-Za-z][A-Za-z0-9 .]*?)\s*:\s*(-?\d+(?:\.\d+)?)")
+
+
+def parse_readings(text: str) -> dict:
+    """Return the {label: value} readings in a result string"""
+    return {label.strip(): float(value) for label, value in READING.findall(text)}
+
+
+class RingBuffer:
+    """Fixed-capacity ring of (timestamp, value) samples in time order"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        if capacity < 1:
+            raise ValueError("Ring buffer capacity must be at least 1")
+        self.capacity = capacity
+        self.times = array("d", bytes(8 * capacity))
+        self.values = array("d", bytes(8 * capacity))
+        self.start = 0  # physical index of the oldest sample
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, timestamp: float, value: float):
+        with self.lock:
+            if self.count:
+                # keep the ring sorted for binary search even if the clock steps back
+                timestamp = max(timestamp, self.times[(self.start + self.count - 1) % self.capacity])
+            if self.count < self.capacity:
+                index = (self.start + self.count) % self.capacity
+                self.count += 1
+            else:
+                index = self.start
+                self.start = (self.start + 1) % self.capacity
+            self.times[index] = timestamp
+            self.values[index] = value
+
+    def _bisect(self, timestamp: float) -> int:
+        """Logical index of the first sample at or after timestamp"""
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[(self.start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _segments(self, first: int, last: int):
+        """Physical (from, to) slices covering logical indices [first, last)"""
+        begin = (self.start + first) % self.capacity
+        end = begin + (last - first)
+        if end <= self.capacity:
+            return [(begin, end)]
+        return [(begin, self.capacity), (0, end - self.capacity)]
+
+    def range(self, start: float, end: float):
+        """Return (timestamps, values) arrays for start <= t <= end"""
+        times, values = array("d"), array("d")
+        with self.lock:
+            first, last = self._bisect(start), self._bisect(end + 1e-9)
+            for begin, stop in self._segments(first, last):
+                times.extend(self.times[begin:stop])
+                values.extend(self.values[begin:stop])
+        return times, values
+
+    def latest(self):
+        with self.lock:
+            if not self.count:
+                return None
+            index = (self.start + self.count - 1) % self.capacity
+            return self.times[index], self.values[index]
+
+
+def decimate(times, values, start: float, end: float, points: int) -> list:
+    """Reduce samples to at most `points` [t, min, max, mean, count] buckets
+
+    Buckets are equal slices of [start, end]; t is the bucket's first
+    sample time. Returns one bucket per sample when there are few enough.
+    """
+    if len(times) <= points:
+        return [[t, v, v, v, 1] for t, v in zip(times, values)]
+    width = (end - start) / points or 1.0
+    buckets = []
+    current = None
+    for t, v in zip(times, values):
+        slot = int((t - start) / width)
+        if current is None or slot != current[5]:
+            current = [t, v, v, 0.0, 0, slot]
+            buckets.append(current)
+        if v < current[1]:
+            current[1] = v
+        elif v > current[2]:
+            current[2] = v
+        current[3] += v
+        current[4] += 1
+    for bucket in buckets:
+        bucket[3] = bucket[3] / bucket[4]
+        del bucket[5]
+    return buckets
+
+
+class TimeSeriesStore:
+    """Ring buffers by channel name, created on first sample"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.channels = {}
+        self.lock = threading.Lock()
+
+    def channel(self, name: str) -> RingBuffer:
+        buffer = self.channels.get(name)
+        if buffer is None:
+            with self.lock:
+                buffer = self.channels.setdefault(name, RingBuffer(self.capacity))
+        return buffer
+
+    def append(self, name: str, value: float, timestamp: float = None):
+        self.channel(name).append(time.time() if timestamp is None else timestamp, value)
+
+    def record_text(self, prefix: str, text: str, timestamp: float = None) -> dict:
+        """Store every "Label: number" reading in text under prefix/Label"""
+        timestamp = time.time() if timestamp is None else timestamp
+        readings = parse_readings(text)
+        for label, value in readings.items():
+            self.append(f"{prefix}/{label}", value, timestamp)
+        return readings
+
+    def names(self) -> list:
+        return sorted(self.channels)
+
+    def summary(self) -> list:
+        entries = []
+        for name in self.names():
+            buffer = self.channels[name]
+            latest = buffer.latest()
+            entries.append({
+                "channel": name,
+                "samples": len(buffer),
+                "capacity": buffer.capacity,
+                "latest": None if latest is None else {"t": latest[0], "value": latest[1]},
+            })
+        return entries
+
+    def history(self, name: str, start: float, end: float, points: int) -> dict:
+        buffer = self.channels.get(name)
+        if buffer is None:
+            raise KeyError(name)
+        times, values = buffer.range(start, end)
+        return {
+            "channel": name,
+            "start": start,
+            "end": end,
+            "samples": len(times),
+            "columns": ["t", "min", "max", "mean", "count"],
+            "points": decimate(times, values, start, end, max(1, points)),
+        }
+
+
+STORE = TimeSeriesStore()
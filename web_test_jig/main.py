@@ -1,30 +1,44 @@
 import argparse
-from cli import main
-from gui import MyGUI
-import tkinter as tk
-from tkinter import ttk
+import sys
 
+# Interfaces are imported when chosen, so --plan runs on a headless
+# station without Tk or the OLED libraries
 def run_gui():
+    from gui import MyGUI
+    import tkinter as tk
     print("Running GUI...")
     root = tk.Tk()
     my_gui = MyGUI(root)
     root.mainloop()  
    
 def run_cli():
+    from cli import main
     print("Running CLI...")
     main()
 
+def run_plan(path, serial, fixture, store):
+    from lib.testplan import format_report, load_plan, run_plan
+    report = run_plan(load_plan(path), serial=serial, fixture=fixture, store=store)
+    print(format_report(report))
+    return report["verdict"] == "pass"
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Run the application in GUI or CLI mode.")
     
-    # Define mutually exclusive group for --gui and --cli options
+    # Define mutually exclusive group for --gui, --cli and --plan options
     group = parser.add_mutually_exclusive_group(required=True)
     group.add_argument('--gui', action='store_true', help="Run the GUI interface.")
     group.add_argument('--cli', action='store_true', help="Run the CLI interface.")
+    group.add_argument('--plan', type=str, help="Run a test plan (JSON/YAML) and exit.")
+    parser.add_argument('--serial', type=str, default=None, help="DUT serial number for --plan.")
+    parser.add_argument('--fixture', type=str, default=None, help="Fixture name for --plan.")
+    parser.add_argument('--store', action='store_true', help="Save --plan results to the results database.")
     
     args = parser.parse_args()
     
     if args.gui:
         run_gui()
     elif args.cli:
-        run_cli()
\ No newline at end of file
+        run_cli()
+    elif args.plan:
+        sys.exit(0 if run_plan(args.plan, args.serial, args.fixture, args.store) else 1)
\ No newline at end of file
@@ -0,0 +1 @@
+# Performance and Load Testing Tools
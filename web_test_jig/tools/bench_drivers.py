@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Driver micro-benchmarks for the Test Jig
+
+Times each driver read/parse path and every Custom* operation against
+the simulated backend (TESTJIG_BACKEND=sim, the default here) and
+reports samples/second, p50/p99 latency and peak bytes allocated per
+sample. Results are written as JSON; --compare checks them against a
+saved baseline and exits non-zero on a regression.
+
+    cd web_test_jig
+    python -m tools.bench_drivers --output bench.json
+    python -m tools.bench_drivers --compare bench.json --threshold 0.15
+
+Set TESTJIG_I2C_DRIVER=rdwr to run the I2C driver cases on the I2C_RDWR
+backend instead of smbus.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault("TESTJIG_BACKEND", "sim")
+
+from lib import hal  # noqa: E402  (backend must be chosen before importing drivers)
+
+
+# ==================== BENCHMARK CASES ====================
+
+def bh1750():
+    from lib.I2C.BH1750 import BH1750
+    sensor = BH1750()
+    return lambda: sensor.read_lux(delay=0)
+
+
+def mlx90614():
+    from lib.I2C.mlx90614 import MLX90614
+    return MLX90614().read_temperature
+
+
+def adc_pot():
+    from lib.ADC.pot import Pot
+    from lib.hal import ADS, AnalogIn
+    pot = Pot()
+    return lambda: AnalogIn(pot.ads, ADS.P0).voltage
+
+
+def adc_ldr():
+    from lib.ADC.ldr import LDRSensor
+    channel = LDRSensor().channel
+    return lambda: (channel.value, channel.voltage)
+
+
+def adc_tds():
+    from lib.ADC.tds import TDS_Sensor
+    return TDS_Sensor(channel=0).read_tds
+
+
+def sds011():
+    from lib.UART.PM_Sensor import SDS011
+    return SDS011().read
+
+
+def ds18b20():
+    from lib.GPIO.DS18B20 import DS18B20
+    return DS18B20().read_temp
+
+
+def modbus_encode():
+    from lib.RS485.rsTransmitter import build_registers
+    return lambda: build_registers(2, "float", 0, 220.0)
+
+
+def modbus_decode():
+    from pymodbus.constants import Endian
+    from pymodbus.payload import BinaryPayloadDecoder
+    registers = [0x0000, 0x435C]  # 220.0, word-swapped as the energy meter sends it
+
+    def decode():
+        decoder = BinaryPayloadDecoder.fromRegisters(registers, byteorder=Endian.Big, wordorder=Endian.Little)
+        return decoder.decode_32bit_float()
+    return decode
+
+
+def i2c_rdwr(operation):
+    def setup():
+        bus = hal.i2c_rdwr.I2CRdwr(1)
+        register, result, block = b"\x07", bytearray(2), bytearray(64)
+        return {
+            "write_then_read": lambda: bus.write_then_read(0x5A, register, result),
+            "read_register": lambda: bus.read_register(0x5A, 0x07, 2),
+            "read_block_64": lambda: bus.write_then_read(0x48, b"\x00", block),
+        }[operation]
+    return setup
+
+
+def custom_i2c(operation):
+    def setup():
+        from lib.CUSTOM.custom_i2c import CustomI2C
+        i2c = CustomI2C(bus=1, device_address=0x48)
+        return {
+            "write_byte": lambda: i2c.write_byte(0x01),
+            "read_byte": i2c.read_byte,
+            "write_byte_data": lambda: i2c.write_byte_data(0x02, 0x80),
+            "read_byte_data": lambda: i2c.read_byte_data(0x01),
+            "write_block": lambda: i2c.write_block_data(0x02, [0x80, 0x00]),
+            "read_block": lambda: i2c.read_block_data(0x00, 2),
+            "scan": i2c.scan_bus,
+        }[operation]
+    return setup
+
+
+def custom_spi(operation):
+    def setup():
+        from lib.CUSTOM.custom_spi import CustomSPI
+        spi = CustomSPI(bus=0, device=0)
+        payload = list(range(16))
+        frame = bytes(range(256)) * 256  # 64 KiB, sixteen spidev chunks
+        return {
+            "transfer": lambda: spi.transfer(payload),
+            "write": lambda: spi.write(payload),
+            "read": lambda: spi.read(16),
+            "bulk_64k": lambda: spi.transfer_bytes(frame),
+            "set_mode": lambda: spi.set_mode(0),
+            "set_speed": lambda: spi.set_speed(500000),
+            "get_config": spi.get_config,
+        }[operation]
+    return setup
+
+
+def custom_uart(operation):
+    def setup():
+        from lib.CUSTOM.custom_uart import CustomUART
+        uart = CustomUART(port="/dev/ttyUSB0", timeout=0)
+        return {
+            "write_string": lambda: uart.write("AT\r\n"),
+            "write_bytes": lambda: uart.write([0xAA, 0x55, 0x01]),
+            "read": lambda: (uart.write("OK"), uart.read(2)),
+            "read_line": lambda: (uart.write("OK\n"), uart.read_line()),
+            "read_all": lambda: (uart.write("OK"), uart.read_all()),
+            "write_read": lambda: uart.write_read("AT", 2, 0),
+            "flush": uart.flush,
+            "in_waiting": uart.in_waiting,
+            "get_config": uart.get_config,
+        }[operation]
+    return setup
+
+
+def custom_pwm(operation):
+    def setup():
+        from lib.CUSTOM.custom_pwm import CustomPWM
+        pwm = CustomPWM(pin=18, frequency=1000)
+        pwm.start(0)
+        duty = iter(range(10 ** 9))
+        return {
+            "change_duty": lambda: pwm.change_duty_cycle(next(duty) % 101),
+            "change_frequency": lambda: pwm.change_frequency(1000),
+            "set_pulse_width": lambda: pwm.set_pulse_width(0.5),
+            "get_status": pwm.get_status,
+        }[operation]
+    return setup
+
+
+CASES = {
+    "driver.bh1750": bh1750,
+    "driver.mlx90614": mlx90614,
+    "driver.adc_pot": adc_pot,
+    "driver.adc_ldr": adc_ldr,
+    "driver.adc_tds": adc_tds,
+    "driver.sds011": sds011,
+    "driver.ds18b20": ds18b20,
+    "driver.modbus_encode": modbus_encode,
+    "driver.modbus_decode": modbus_decode,
+}
+for _op in ("write_then_read", "read_register", "read_block_64"):
+    CASES[f"i2c_rdwr.{_op}"] = i2c_rdwr(_op)
+for _op in ("write_byte", "read_byte", "write_byte_data", "read_byte_data", "write_block", "read_block", "scan"):
+    CASES[f"custom_i2c.{_op}"] = custom_i2c(_op)
+for _op in ("transfer", "write", "read", "bulk_64k", "set_mode", "set_speed", "get_config"):
+    CASES[f"custom_spi.{_op}"] = custom_spi(_op)
+for _op in ("write_string", "write_bytes", "read", "read_line", "read_all", "write_read", "flush", "in_waiting", "get_config"):
+    CASES[f"custom_uart.{_op}"] = custom_uart(_op)
+for _op in ("change_duty", "change_frequency", "set_pulse_width", "get_status"):
+    CASES[f"custom_pwm.{_op}"] = custom_pwm(_op)
+
+
+# ==================== MEASUREMENT ====================
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+def measure(func, iterations: int, warmup: int, alloc_samples: int) -> dict:
+    """Time func() per call, then measure its allocations in a separate pass"""
+    for _ in range(warmup):
+        func()
+
+    clock = time.perf_counter_ns
+    latencies = [0] * iterations
+    start = clock()
+    for i in range(iterations):
+        t0 = clock()
+        func()
+        latencies[i] = clock() - t0
+    elapsed = (clock() - start) / 1e9
+    latencies.sort()
+
+    # tracemalloc slows everything down, so allocations get their own pass
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(alloc_samples):
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            func()
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "iterations": iterations,
+        "samples_per_s": round(iterations / elapsed, 1) if elapsed else None,
+        "p50_us": round(percentile(latencies, 0.50) / 1000, 2),
+        "p99_us": round(percentile(latencies, 0.99) / 1000, 2),
+        "max_us": round(latencies[-1] / 1000, 2),
+        "alloc_bytes_per_sample": int(statistics.median(peaks)) if peaks else 0,
+    }
+
+
+def run(selected, iterations: int, warmup: int, alloc_samples: int, seed: int) -> dict:
+    results = {}
+    for name in selected:
+        random.seed(seed)  # simulated sensor noise is identical run to run
+        try:
+            func = CASES[name]()
+        except ImportError as e:
+            results[name] = {"skipped": f"missing dependency: {e.name or e}"}
+            print(f"{name:32s} skipped ({e})")
+            continue
+        except Exception as e:
+            results[name] = {"skipped": f"setup failed: {e}"}
+            print(f"{name:32s} skipped ({e})")
+            continue
+        result = measure(func, iterations, warmup, alloc_samples)
+        results[name] = result
+        print(f"{name:32s} {result['samples_per_s']:>12,.0f}/s  p50 {result['p50_us']:>9.2f} us  "
+              f"p99 {result['p99_us']:>9.2f} us  {result['alloc_bytes_per_sample']:>7d} B")
+    return results
+
+
+def environment(seed: int) -> dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "platform": platform.platform(),
+        "backend": hal.BACKEND,
+        "seed": seed,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+
+
+# ==================== BASELINE COMPARISON ====================
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Return (case, metric, baseline, current, change) for every regression"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or "skipped" in current or "skipped" in previous:
+            continue
+        if previous["samples_per_s"] and current["samples_per_s"] < previous["samples_per_s"] * (1 - threshold):
+            change = current["samples_per_s"] / previous["samples_per_s"] - 1
+            regressions.append((name, "samples_per_s", previous["samples_per_s"], current["samples_per_s"], change))
+        if previous["p99_us"] and current["p99_us"] > previous["p99_us"] * (1 + threshold):
+            change = current["p99_us"] / previous["p99_us"] - 1
+            regressions.append((name, "p99_us", previous["p99_us"], current["p99_us"], change))
+        if current["alloc_bytes_per_sample"] > previous["alloc_bytes_per_sample"] * (1 + threshold) + 64:
+            change = current["alloc_bytes_per_sample"] / max(previous["alloc_bytes_per_sample"], 1) - 1
+            regressions.append((name, "alloc_bytes_per_sample", previous["alloc_bytes_per_sample"],
+                                current["alloc_bytes_per_sample"], change))
+    return regressions
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test Jig driver micro-benchmarks")
+    parser.add_argument("--iterations", type=int, default=2000, help="Timed calls per case")
+    parser.add_argument("--warmup", type=int, default=200, help="Untimed calls before measuring")
+    parser.add_argument("--alloc_samples", type=int, default=200, help="Calls traced for allocations")
+    parser.add_argument("--seed", type=int, default=1234, help="Random seed for simulated sensor noise")
+    parser.add_argument("--filter", type=str, default="", help="Only run cases whose name contains this text")
+    parser.add_argument("--output", type=str, default="", help="Write results JSON to this file")
+    parser.add_argument("--compare", type=str, default="", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed fractional regression")
+    parser.add_argument("--list", action="store_true", help="List benchmark cases and exit")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.list:
+        print("\n".join(CASES))
+        return 0
+
+    selected = [name for name in CASES if args.filter in name]
+    results = run(selected, args.iterations, args.warmup, args.alloc_samples, args.seed)
+    report = {"environment": environment(args.seed), "results": results}
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print(f"\n❌ {len(regressions)} regression(s) against {args.compare}:")
+            for name, metric, before, after, change in regressions:
+                print(f"  {name:32s} {metric:24s} {before} -> {after} ({change:+.1%})")
+            return 1
+        print(f"\n✅ No regressions against {args.compare} (threshold {args.threshold:.0%})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,436 @@
+#!/usr/bin/env python3
+"""
+Concurrent-client load test for the Test Jig web server
+
+Opens many SSE dashboards and HTTP clients at once against a running
+server (or one it starts itself on the simulated backend with --spawn)
+and reports, per client group:
+
+- SSE streams: time-to-first-event, inter-arrival jitter, late and
+  dropped events, counting only events that carry a "Label: number"
+  reading (a stream's one-off preamble, such as the I2C scan result,
+  is not a sample)
+- HTTP requests: latency percentiles, throughput and errors
+
+while polling /metrics for server CPU, memory and threadpool saturation.
+
+Scenarios are JSON files (or a built-in name) listing client groups:
+
+    {
+      "duration": 30,
+      "ramp": 2,
+      "groups": [
+        {"name": "dashboards", "kind": "sse", "clients": 20,
+         "path": "/run-test/i2c/bh1750", "interval": 1.0},
+        {"name": "i2c consoles", "kind": "http", "clients": 5,
+         "path": "/run-custom-i2c?operation=read_byte_data&address=0x5A&register=0x07",
+         "interval": 0.5}
+      ]
+    }
+
+    cd web_test_jig
+    python -m tools.load_test --spawn --scenario dashboards
+    python -m tools.load_test --url http://rpi-ip:8000 --scenario my_scenario.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from urllib.parse import urlsplit
+
+from lib.timeseries import parse_readings
+
+SCENARIOS = {
+    "dashboards": {
+        "duration": 30,
+        "ramp": 2,
+        "groups": [
+            {"name": "bh1750 dashboards", "kind": "sse", "clients": 20,
+             "path": "/run-test/i2c/bh1750", "interval": 1.0},
+            {"name": "custom i2c consoles", "kind": "http", "clients": 5,
+             "path": "/run-custom-i2c?operation=read_byte_data&bus=1&address=0x5A&register=0x07",
+             "interval": 0.5},
+        ],
+    },
+    "mixed": {
+        "duration": 60,
+        "ramp": 5,
+        "groups": [
+            {"name": "i2c dashboards", "kind": "sse", "clients": 8, "path": "/run-test/i2c/mlx90614", "interval": 1.0},
+            {"name": "adc dashboards", "kind": "sse", "clients": 8, "path": "/run-test/adc/pot", "interval": 1.0},
+            {"name": "uart dashboards", "kind": "sse", "clients": 4, "path": "/run-test/uart/pm%20sensor", "interval": 1.0},
+            {"name": "custom spi", "kind": "http", "clients": 3,
+             "path": "/run-custom-spi?operation=transfer&data=0x01,0x02,0x03", "interval": 0.25},
+            {"name": "custom uart", "kind": "http", "clients": 3,
+             "path": "/run-custom-uart?operation=write_read&port=/dev/ttyUSB0&data=AT&size=2&delay=0", "interval": 0.25},
+            {"name": "pages", "kind": "http", "clients": 4, "path": "/devices-i2c.html", "interval": 2.0},
+        ],
+    },
+    "pages": {
+        "duration": 20,
+        "ramp": 1,
+        "groups": [
+            {"name": "homepage", "kind": "http", "clients": 20, "path": "/", "interval": 0.1},
+        ],
+    },
+}
+
+LATE_FACTOR = 1.5  # an SSE event later than 1.5x the expected interval counts as late
+
+
+# ==================== MINIMAL ASYNC HTTP CLIENT ====================
+
+async def open_request(host: str, port: int, path: str, method: str = "GET", accept: str = "*/*"):
+    """Send a request and return (reader, writer, status, headers)"""
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\nAccept: {accept}\r\n"
+                 f"Content-Length: 0\r\nConnection: close\r\n\r\n".encode())
+    await writer.drain()
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Server closed the connection")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return reader, writer, status, headers
+
+
+async def body_chunks(reader, headers):
+    """Yield the response body as it arrives (chunked, sized or until EOF)"""
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        while True:
+            size_line = await reader.readline()
+            if not size_line:
+                return
+            size = int(size_line.split(b";")[0], 16)
+            if size == 0:
+                return
+            chunk = await reader.readexactly(size + 2)
+            yield chunk[:-2]
+    elif "content-length" in headers:
+        yield await reader.readexactly(int(headers["content-length"]))
+    else:
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            yield chunk
+
+
+async def fetch_json(host: str, port: int, path: str, method: str = "GET"):
+    reader, writer, status, headers = await open_request(host, port, path, method, "application/json")
+    try:
+        body = b"".join([chunk async for chunk in body_chunks(reader, headers)])
+    finally:
+        writer.close()
+    return status, json.loads(body or b"null")
+
+
+# ==================== CLIENTS ====================
+
+class GroupStats:
+    """Everything measured for one client group"""
+
+    def __init__(self, group: dict):
+        self.group = group
+        self.latencies = []
+        self.first_event = []
+        self.gaps = []
+        self.events = 0
+        self.late = 0
+        self.expected_events = 0
+        self.errors = {}
+        self.requests = 0
+
+    def error(self, reason: str):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+async def sse_client(host, port, group, stats: GroupStats, deadline: float):
+    interval = group.get("interval", 1.0)
+    started = time.perf_counter()
+    try:
+        reader, writer, status, headers = await open_request(host, port, group["path"], accept="text/event-stream")
+    except (OSError, ConnectionError) as e:
+        stats.error(type(e).__name__)
+        return
+    if status != 200:
+        stats.error(f"HTTP {status}")
+        writer.close()
+        return
+    last = None
+    buffer = b""
+    try:
+        chunks = body_chunks(reader, headers)
+        while True:
+            remaining = deadline - time.perf_counter()
+            if remaining <= 0:
+                break
+            try:
+                chunk = await asyncio.wait_for(chunks.__anext__(), remaining)
+            except (asyncio.TimeoutError, StopAsyncIteration):
+                break
+            buffer += chunk
+            while b"\n\n" in buffer:
+                event, buffer = buffer.split(b"\n\n", 1)
+                if not event.startswith(b"data:") or not parse_readings(event[5:].decode("utf-8", "replace")):
+                    continue
+                now = time.perf_counter()
+                stats.events += 1
+                if last is None:
+                    stats.first_event.append(now - started)
+                    first = now
+                else:
+                    gap = now - last
+                    stats.gaps.append(gap)
+                    if gap > interval * LATE_FACTOR:
+                        stats.late += 1
+                last = now
+    except (OSError, asyncio.IncompleteReadError, ValueError) as e:
+        stats.error(type(e).__name__)
+    finally:
+        writer.close()
+        if last is not None:
+            stats.expected_events += 1 + int((deadline - first) / interval)  # counted from the first reading
+
+
+async def http_client(host, port, group, stats: GroupStats, deadline: float):
+    interval = group.get("interval", 1.0)
+    method = group.get("method", "GET")
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        try:
+            reader, writer, status, headers = await open_request(host, port, group["path"], method)
+            try:
+                async for _ in body_chunks(reader, headers):
+                    pass
+            finally:
+                writer.close()
+            stats.requests += 1
+            if status >= 400:
+                stats.error(f"HTTP {status}")
+            else:
+                stats.latencies.append(time.perf_counter() - started)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError) as e:
+            stats.requests += 1
+            stats.error(type(e).__name__)
+        await asyncio.sleep(max(0.0, interval - (time.perf_counter() - started)))
+
+
+async def poll_metrics(host, port, samples: list, stop: asyncio.Event, period: float = 1.0):
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            status, data = await asyncio.wait_for(fetch_json(host, port, "/metrics"), 10)
+            if status == 200:
+                data["poll_latency_s"] = time.perf_counter() - started
+                samples.append(data)
+        except (OSError, ConnectionError, asyncio.TimeoutError, ValueError):
+            pass
+        try:
+            await asyncio.wait_for(stop.wait(), period)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def run_scenario(host: str, port: int, scenario: dict):
+    duration = scenario.get("duration", 30)
+    ramp = scenario.get("ramp", 0)
+    groups = [GroupStats(group) for group in scenario["groups"]]
+    total_clients = sum(g.group.get("clients", 1) for g in groups)
+    samples = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(poll_metrics(host, port, samples, stop))
+
+    tasks = []
+    started = time.perf_counter()
+    index = 0
+    for stats in groups:
+        kind = stats.group.get("kind", "http")
+        for _ in range(stats.group.get("clients", 1)):
+            delay = ramp * index / max(total_clients - 1, 1)
+            index += 1
+            client = sse_client if kind == "sse" else http_client
+            tasks.append(asyncio.create_task(delayed(delay, client(host, port, stats.group, stats,
+                                                                   started + duration))))
+    await asyncio.gather(*tasks)
+    stop.set()
+    await monitor
+
+    # run_test loops stop on /stop-test even if a disconnect went unnoticed
+    try:
+        await fetch_json(host, port, "/stop-test", "POST")
+    except (OSError, ConnectionError, ValueError):
+        pass
+    return groups, samples, time.perf_counter() - started
+
+
+async def delayed(delay: float, coroutine):
+    await asyncio.sleep(delay)
+    return await coroutine
+
+
+# ==================== REPORT ====================
+
+def pct(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+
+def ms(value):
+    return None if value is None else round(value * 1000, 2)
+
+
+def summarize(groups, samples, elapsed) -> dict:
+    report = {"elapsed_s": round(elapsed, 2), "groups": [], "server": {}}
+    for stats in groups:
+        group = stats.group
+        entry = {"name": group.get("name", group["path"]), "kind": group.get("kind", "http"),
+                 "clients": group.get("clients", 1), "errors": stats.errors}
+        if entry["kind"] == "sse":
+            interval = group.get("interval", 1.0)
+            jitter = [abs(gap - interval) for gap in stats.gaps]
+            entry.update({
+                "events": stats.events,
+                "first_event_p50_ms": ms(pct(stats.first_event, 0.5)),
+                "first_event_p99_ms": ms(pct(stats.first_event, 0.99)),
+                "interval_mean_ms": ms(statistics.mean(stats.gaps)) if stats.gaps else None,
+                "jitter_p50_ms": ms(pct(jitter, 0.5)),
+                "jitter_p99_ms": ms(pct(jitter, 0.99)),
+                "late_events": stats.late,
+                "dropped_events": max(0, stats.expected_events - stats.events),
+                "streams_without_events": group.get("clients", 1) - len(stats.first_event),
+            })
+        else:
+            entry.update({
+                "requests": stats.requests,
+                "requests_per_s": round(stats.requests / elapsed, 2) if elapsed else None,
+                "latency_p50_ms": ms(pct(stats.latencies, 0.5)),
+                "latency_p99_ms": ms(pct(stats.latencies, 0.99)),
+                "latency_max_ms": ms(max(stats.latencies)) if stats.latencies else None,
+            })
+        report["groups"].append(entry)
+
+    if len(samples) >= 2:
+        cpu = []
+        for before, after in zip(samples, samples[1:]):
+            wall = after["timestamp"] - before["timestamp"]
+            used = (after["process"]["cpu_user_s"] + after["process"]["cpu_system_s"]
+                    - before["process"]["cpu_user_s"] - before["process"]["cpu_system_s"])
+            if wall > 0:
+                cpu.append(100.0 * used / wall)
+        pool = [s["threadpool"] for s in samples]
+        report["server"] = {
+            "cpu_percent_mean": round(statistics.mean(cpu), 1) if cpu else None,
+            "cpu_percent_max": round(max(cpu), 1) if cpu else None,
+            "rss_mb_max": round(max(s["process"]["rss_bytes"] for s in samples) / 1e6, 1),
+            "threads_max": max(s["process"]["threads"] for s in samples),
+            "threadpool_size": pool[-1]["total"],
+            "threadpool_busy_max": max(p["busy"] for p in pool),
+            "threadpool_waiting_max": max(p["waiting"] for p in pool),
+            "threadpool_saturated_samples": sum(1 for p in pool if p["busy"] >= p["total"]),
+            "streams_active_max": max(s["streams"]["active"] for s in samples),
+            "metrics_poll_p99_ms": ms(pct([s["poll_latency_s"] for s in samples], 0.99)),
+            "samples": len(samples),
+        }
+    return report
+
+
+def print_report(report: dict):
+    print(f"\nLoad test finished in {report['elapsed_s']} s\n")
+    for entry in report["groups"]:
+        errors = sum(entry["errors"].values())
+        if entry["kind"] == "sse":
+            print(f"  [SSE ] {entry['name']:24s} x{entry['clients']:<3d} events {entry['events']:<6d} "
+                  f"first p50/p99 {entry['first_event_p50_ms']}/{entry['first_event_p99_ms']} ms  "
+                  f"jitter p50/p99 {entry['jitter_p50_ms']}/{entry['jitter_p99_ms']} ms  "
+                  f"late {entry['late_events']}  dropped {entry['dropped_events']}  errors {errors}")
+        else:
+            print(f"  [HTTP] {entry['name']:24s} x{entry['clients']:<3d} requests {entry['requests']:<6d} "
+                  f"({entry['requests_per_s']}/s)  p50/p99 {entry['latency_p50_ms']}/{entry['latency_p99_ms']} ms  "
+                  f"errors {errors}")
+    server = report["server"]
+    if server:
+        print(f"\n  Server: CPU mean/max {server['cpu_percent_mean']}/{server['cpu_percent_max']}%  "
+              f"RSS max {server['rss_mb_max']} MB  threads max {server['threads_max']}")
+        print(f"  Threadpool: busy max {server['threadpool_busy_max']}/{server['threadpool_size']}  "
+              f"waiting max {server['threadpool_waiting_max']}  "
+              f"saturated in {server['threadpool_saturated_samples']}/{server['samples']} samples")
+
+
+# ==================== ENTRY POINT ====================
+
+def spawn_server(port: int) -> subprocess.Popen:
+    """Start uvicorn on the simulated backend and wait until it answers"""
+    env = dict(os.environ, TESTJIG_BACKEND=os.environ.get("TESTJIG_BACKEND", "sim"))
+    process = subprocess.Popen([sys.executable, "-m", "uvicorn", "fastapi_app.main:app",
+                                "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+                               env=env)
+    for _ in range(100):
+        try:
+            status, _ = asyncio.run(fetch_json("127.0.0.1", port, "/metrics"))
+            if status == 200:
+                return process
+        except (OSError, ConnectionError, ValueError):
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Server did not start")
+
+
+def load_scenario(name: str) -> dict:
+    if name in SCENARIOS:
+        return SCENARIOS[name]
+    with open(name) as f:
+        return json.load(f)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test Jig web server load test")
+    parser.add_argument("--url", type=str, default="http://127.0.0.1:8000", help="Server base URL")
+    parser.add_argument("--scenario", type=str, default="dashboards",
+                        help=f"Scenario JSON file or built-in name ({', '.join(SCENARIOS)})")
+    parser.add_argument("--duration", type=float, default=None, help="Override scenario duration (s)")
+    parser.add_argument("--spawn", action="store_true", help="Start a simulated-backend server for the test")
+    parser.add_argument("--output", type=str, default="", help="Write the report JSON to this file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    scenario = dict(load_scenario(args.scenario))
+    if args.duration:
+        scenario["duration"] = args.duration
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+
+    server = spawn_server(port) if args.spawn else None
+    try:
+        groups, samples, elapsed = asyncio.run(run_scenario(host, port, scenario))
+    finally:
+        if server:
+            server.terminate()
+            server.wait(timeout=10)
+
+    report = summarize(groups, samples, elapsed)
+    report["scenario"] = scenario
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()